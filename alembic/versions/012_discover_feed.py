@@ -0,0 +1,131 @@
+"""Add precomputed discover feed with invalidation triggers
+
+Revision ID: 012_discover_feed
+Revises: 011
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '012_discover_feed'
+down_revision = '011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Fila de candidatos pré-calculados por usuário
+    op.create_table('discover_feed',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('candidate_id', sa.Integer(), nullable=False),
+        sa.Column('fame_rating', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('distance', sa.Float(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.text('NOW()')),
+        sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['candidate_id'], ['users.user_id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'candidate_id')
+    )
+    op.execute("""
+        CREATE INDEX idx_discover_feed_rank
+        ON discover_feed (user_id, fame_rating DESC, distance ASC)
+    """)
+    op.create_index('idx_discover_feed_created', 'discover_feed', ['created_at'], unique=False)
+
+    # Swipe consome o candidato da fila do swiper
+    op.execute("""
+    CREATE OR REPLACE FUNCTION discover_feed_consume_swipe() RETURNS TRIGGER AS $$
+    BEGIN
+        DELETE FROM discover_feed
+        WHERE user_id = NEW.swiper_id AND candidate_id = NEW.swiped_id;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+    CREATE TRIGGER trg_discover_feed_swipe
+    AFTER INSERT ON swipes
+    FOR EACH ROW EXECUTE FUNCTION discover_feed_consume_swipe();
+    """)
+
+    # Visualização consome o candidato da fila do visualizador
+    op.execute("""
+    CREATE OR REPLACE FUNCTION discover_feed_consume_view() RETURNS TRIGGER AS $$
+    BEGIN
+        DELETE FROM discover_feed
+        WHERE user_id = NEW.viewer_id AND candidate_id = NEW.viewed_id;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+    CREATE TRIGGER trg_discover_feed_view
+    AFTER INSERT ON profile_views
+    FOR EACH ROW EXECUTE FUNCTION discover_feed_consume_view();
+    """)
+
+    # Bloqueio remove os dois usuários das filas um do outro
+    op.execute("""
+    CREATE OR REPLACE FUNCTION discover_feed_consume_block() RETURNS TRIGGER AS $$
+    BEGIN
+        DELETE FROM discover_feed
+        WHERE (user_id = NEW.blocker_id AND candidate_id = NEW.blocked_id)
+           OR (user_id = NEW.blocked_id AND candidate_id = NEW.blocker_id);
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+    CREATE TRIGGER trg_discover_feed_block
+    AFTER INSERT ON blocked_users
+    FOR EACH ROW EXECUTE FUNCTION discover_feed_consume_block();
+    """)
+
+    # Mudança de preferências ou de localização/idade/gênero invalida a fila do usuário
+    op.execute("""
+    CREATE OR REPLACE FUNCTION discover_feed_invalidate() RETURNS TRIGGER AS $$
+    BEGIN
+        DELETE FROM discover_feed WHERE user_id = NEW.user_id;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+    CREATE TRIGGER trg_discover_feed_preferences
+    AFTER INSERT OR UPDATE ON preferences
+    FOR EACH ROW EXECUTE FUNCTION discover_feed_invalidate();
+    """)
+    # Só quando o valor muda de fato; na localização, deslocamentos abaixo de
+    # ~500 m (0.005°, jitter de GPS e o flush do mapa) não invalidam a fila
+    op.execute("""
+    CREATE TRIGGER trg_discover_feed_profile
+    AFTER UPDATE OF latitude, longitude, age, gender ON profiles
+    FOR EACH ROW
+    WHEN (
+        OLD.age IS DISTINCT FROM NEW.age
+        OR OLD.gender IS DISTINCT FROM NEW.gender
+        OR (OLD.latitude IS NULL) <> (NEW.latitude IS NULL)
+        OR (OLD.longitude IS NULL) <> (NEW.longitude IS NULL)
+        OR ABS(NEW.latitude - OLD.latitude) > 0.005
+        OR ABS(NEW.longitude - OLD.longitude) * COS(RADIANS(NEW.latitude)) > 0.005
+    )
+    EXECUTE FUNCTION discover_feed_invalidate();
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_discover_feed_profile ON profiles;")
+    op.execute("DROP TRIGGER IF EXISTS trg_discover_feed_preferences ON preferences;")
+    op.execute("DROP TRIGGER IF EXISTS trg_discover_feed_block ON blocked_users;")
+    op.execute("DROP TRIGGER IF EXISTS trg_discover_feed_view ON profile_views;")
+    op.execute("DROP TRIGGER IF EXISTS trg_discover_feed_swipe ON swipes;")
+
+    op.execute("DROP FUNCTION IF EXISTS discover_feed_invalidate();")
+    op.execute("DROP FUNCTION IF EXISTS discover_feed_consume_block();")
+    op.execute("DROP FUNCTION IF EXISTS discover_feed_consume_view();")
+    op.execute("DROP FUNCTION IF EXISTS discover_feed_consume_swipe();")
+
+    op.drop_index('idx_discover_feed_created', table_name='discover_feed')
+    op.execute("DROP INDEX IF EXISTS idx_discover_feed_rank;")
+    op.drop_table('discover_feed')
@@ -0,0 +1,26 @@
+"""Add indexes for anti-join exclusion queries
+
+Revision ID: 013_exclusion_indexes
+Revises: 012_discover_feed
+Create Date: 2026-10-18 00:01:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '013_exclusion_indexes'
+down_revision = '012_discover_feed'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # "Quem me bloqueou": NOT EXISTS por blocked_id
+    # (blocker_id, blocked_id), swipes (swiper_id, swiped_id) e
+    # profile_views (viewer_id, viewed_id) já são cobertos pelas constraints únicas
+    op.create_index('idx_blocked_users_blocked', 'blocked_users', ['blocked_id', 'blocker_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_blocked_users_blocked', table_name='blocked_users')
@@ -0,0 +1,41 @@
+"""Add defaults and composite indexes for keyset pagination
+
+Revision ID: 014_keyset_pagination
+Revises: 013_exclusion_indexes
+Create Date: 2026-10-18 00:02:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '014_keyset_pagination'
+down_revision = '013_exclusion_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Timestamps nulos quebram a comparação (timestamp, id) do cursor
+    op.execute("UPDATE messages SET sent_at = NOW() WHERE sent_at IS NULL")
+    op.execute("UPDATE notifications SET created_at = NOW() WHERE created_at IS NULL")
+    op.execute("UPDATE profile_views SET created_at = NOW() WHERE created_at IS NULL")
+    op.alter_column('messages', 'sent_at', server_default=sa.text('NOW()'))
+    op.alter_column('notifications', 'created_at', server_default=sa.text('NOW()'))
+    op.alter_column('profile_views', 'created_at', server_default=sa.text('NOW()'))
+
+    # Índices compostos (lidos de trás para frente para ORDER BY ... DESC)
+    op.create_index('idx_messages_chat_sent', 'messages', ['chat_id', 'sent_at', 'message_id'], unique=False)
+    op.create_index('idx_notifications_user_created', 'notifications', ['user_id', 'created_at', 'notification_id'], unique=False)
+    op.create_index('idx_views_viewed_created', 'profile_views', ['viewed_id', 'created_at', 'view_id'], unique=False)
+    op.create_index('idx_views_viewer_created', 'profile_views', ['viewer_id', 'created_at', 'view_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_views_viewer_created', table_name='profile_views')
+    op.drop_index('idx_views_viewed_created', table_name='profile_views')
+    op.drop_index('idx_notifications_user_created', table_name='notifications')
+    op.drop_index('idx_messages_chat_sent', table_name='messages')
+    op.alter_column('profile_views', 'created_at', server_default=None)
+    op.alter_column('notifications', 'created_at', server_default=None)
+    op.alter_column('messages', 'sent_at', server_default=None)
@@ -0,0 +1,486 @@
+"""Incremental fame rating via user_stats counters
+
+Revision ID: 015_user_stats
+Revises: 014_keyset_pagination
+Create Date: 2026-10-18 00:03:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '015_user_stats'
+down_revision = '014_keyset_pagination'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Contadores mantidos por deltas (+1/-1) a cada evento
+    op.create_table('user_stats',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('likes_received', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('matches_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('views_received', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('reports_received', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('blocks_received', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.text('NOW()')),
+        sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+
+    # Fórmula de fame (mesma de 002/003) a partir dos contadores
+    op.execute("""
+    CREATE OR REPLACE FUNCTION compute_fame(
+        likes_count INT, matches_count INT, views_count INT,
+        reports_count INT, blocks_count INT, completion_bonus INT
+    ) RETURNS INT AS $$
+        SELECT GREATEST(
+            (likes_count * 1) + (matches_count * 3) + (views_count / 2)
+            - (reports_count * 5) - (blocks_count * 2)
+            + (completion_bonus * 5),
+            0
+        );
+    $$ LANGUAGE sql IMMUTABLE;
+    """)
+
+    # Recalcula users.fame_rating a partir de user_stats (sem COUNT)
+    op.execute("""
+    CREATE OR REPLACE FUNCTION refresh_fame_from_stats(p_user_id INT) RETURNS VOID AS $$
+    BEGIN
+        UPDATE users u
+        SET fame_rating = f.fame
+        FROM (
+            SELECT compute_fame(
+                s.likes_received, s.matches_count, s.views_received,
+                s.reports_received, s.blocks_received,
+                CASE WHEN p.avatar_url IS NOT NULL AND p.bio IS NOT NULL
+                          AND (p.photo1_url IS NOT NULL OR p.photo2_url IS NOT NULL)
+                     THEN 1 ELSE 0 END
+            ) AS fame
+            FROM user_stats s
+            LEFT JOIN profiles p ON p.user_id = s.user_id
+            WHERE s.user_id = p_user_id
+        ) f
+        WHERE u.user_id = p_user_id
+          AND u.fame_rating IS DISTINCT FROM f.fame;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+    # Aplica deltas aos contadores e atualiza fame
+    op.execute("""
+    CREATE OR REPLACE FUNCTION apply_user_stats_delta(
+        p_user_id INT, d_likes INT, d_matches INT, d_views INT, d_reports INT, d_blocks INT
+    ) RETURNS VOID AS $$
+    BEGIN
+        -- SELECT em users evita violar a FK durante deleções em cascata
+        INSERT INTO user_stats (
+            user_id, likes_received, matches_count, views_received,
+            reports_received, blocks_received, updated_at
+        )
+        SELECT p_user_id, GREATEST(d_likes, 0), GREATEST(d_matches, 0), GREATEST(d_views, 0),
+               GREATEST(d_reports, 0), GREATEST(d_blocks, 0), NOW()
+        FROM users WHERE user_id = p_user_id
+        ON CONFLICT (user_id) DO UPDATE SET
+            likes_received = GREATEST(user_stats.likes_received + d_likes, 0),
+            matches_count = GREATEST(user_stats.matches_count + d_matches, 0),
+            views_received = GREATEST(user_stats.views_received + d_views, 0),
+            reports_received = GREATEST(user_stats.reports_received + d_reports, 0),
+            blocks_received = GREATEST(user_stats.blocks_received + d_blocks, 0),
+            updated_at = NOW();
+
+        PERFORM refresh_fame_from_stats(p_user_id);
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+    # update_fame_rating passa a ser a reconciliação completa de um usuário
+    op.execute("""
+    CREATE OR REPLACE FUNCTION update_fame_rating(p_user_id INT) RETURNS VOID AS $$
+    BEGIN
+        INSERT INTO user_stats (
+            user_id, likes_received, matches_count, views_received,
+            reports_received, blocks_received, updated_at
+        )
+        SELECT p_user_id,
+            (SELECT COUNT(*) FROM swipes WHERE swiped_id = p_user_id AND direction = 'like'),
+            (SELECT COUNT(*) FROM matches WHERE user1_id = p_user_id OR user2_id = p_user_id),
+            (SELECT COUNT(*) FROM profile_views WHERE viewed_id = p_user_id),
+            (SELECT COUNT(*) FROM reports WHERE reported_id = p_user_id),
+            (SELECT COUNT(*) FROM blocked_users WHERE blocked_id = p_user_id),
+            NOW()
+        FROM users WHERE user_id = p_user_id
+        ON CONFLICT (user_id) DO UPDATE SET
+            likes_received = EXCLUDED.likes_received,
+            matches_count = EXCLUDED.matches_count,
+            views_received = EXCLUDED.views_received,
+            reports_received = EXCLUDED.reports_received,
+            blocks_received = EXCLUDED.blocks_received,
+            updated_at = NOW();
+
+        PERFORM refresh_fame_from_stats(p_user_id);
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+    # Reconciliação periódica de todos os contadores (conjunto, sem loop)
+    op.execute("""
+    CREATE OR REPLACE FUNCTION reconcile_user_stats() RETURNS INT AS $$
+    DECLARE
+        fixed INT;
+    BEGIN
+        WITH likes AS (
+            SELECT swiped_id AS user_id, COUNT(*) AS c
+            FROM swipes WHERE direction = 'like' GROUP BY swiped_id
+        ), match_counts AS (
+            SELECT user_id, COUNT(*) AS c FROM (
+                SELECT user1_id AS user_id FROM matches
+                UNION ALL
+                SELECT user2_id FROM matches
+            ) m GROUP BY user_id
+        ), views AS (
+            SELECT viewed_id AS user_id, COUNT(*) AS c
+            FROM profile_views GROUP BY viewed_id
+        ), report_counts AS (
+            SELECT reported_id AS user_id, COUNT(*) AS c
+            FROM reports GROUP BY reported_id
+        ), block_counts AS (
+            SELECT blocked_id AS user_id, COUNT(*) AS c
+            FROM blocked_users GROUP BY blocked_id
+        )
+        INSERT INTO user_stats (
+            user_id, likes_received, matches_count, views_received,
+            reports_received, blocks_received, updated_at
+        )
+        SELECT u.user_id,
+               COALESCE(l.c, 0), COALESCE(m.c, 0), COALESCE(v.c, 0),
+               COALESCE(r.c, 0), COALESCE(b.c, 0), NOW()
+        FROM users u
+        LEFT JOIN likes l ON l.user_id = u.user_id
+        LEFT JOIN match_counts m ON m.user_id = u.user_id
+        LEFT JOIN views v ON v.user_id = u.user_id
+        LEFT JOIN report_counts r ON r.user_id = u.user_id
+        LEFT JOIN block_counts b ON b.user_id = u.user_id
+        ON CONFLICT (user_id) DO UPDATE SET
+            likes_received = EXCLUDED.likes_received,
+            matches_count = EXCLUDED.matches_count,
+            views_received = EXCLUDED.views_received,
+            reports_received = EXCLUDED.reports_received,
+            blocks_received = EXCLUDED.blocks_received,
+            updated_at = NOW()
+        WHERE (user_stats.likes_received, user_stats.matches_count, user_stats.views_received,
+               user_stats.reports_received, user_stats.blocks_received)
+              IS DISTINCT FROM
+              (EXCLUDED.likes_received, EXCLUDED.matches_count, EXCLUDED.views_received,
+               EXCLUDED.reports_received, EXCLUDED.blocks_received);
+
+        GET DIAGNOSTICS fixed = ROW_COUNT;
+
+        UPDATE users u
+        SET fame_rating = f.fame
+        FROM (
+            SELECT s.user_id, compute_fame(
+                s.likes_received, s.matches_count, s.views_received,
+                s.reports_received, s.blocks_received,
+                CASE WHEN p.avatar_url IS NOT NULL AND p.bio IS NOT NULL
+                          AND (p.photo1_url IS NOT NULL OR p.photo2_url IS NOT NULL)
+                     THEN 1 ELSE 0 END
+            ) AS fame
+            FROM user_stats s
+            LEFT JOIN profiles p ON p.user_id = s.user_id
+        ) f
+        WHERE u.user_id = f.user_id
+          AND u.fame_rating IS DISTINCT FROM f.fame;
+
+        RETURN fixed;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+    # Popular contadores com os dados existentes
+    op.execute("SELECT reconcile_user_stats();")
+
+    # Remover triggers antigos de recontagem
+    op.execute("DROP TRIGGER IF EXISTS trg_match_update ON matches;")
+    op.execute("DROP TRIGGER IF EXISTS trg_view_update ON profile_views;")
+    op.execute("DROP TRIGGER IF EXISTS trg_report_update ON reports;")
+    op.execute("DROP TRIGGER IF EXISTS trg_block_update ON blocked_users;")
+
+    # Criação de match no swipe continua, mas sem recontagem de fame
+    op.execute("""
+    CREATE OR REPLACE FUNCTION create_match_if_mutual_like() RETURNS TRIGGER AS $$
+    BEGIN
+        -- Só processar se for um like
+        IF NEW.direction = 'like' THEN
+            -- Verificar se existe um like mútuo
+            IF EXISTS (
+                SELECT 1 FROM swipes
+                WHERE swiper_id = NEW.swiped_id
+                  AND swiped_id = NEW.swiper_id
+                  AND direction = 'like'
+            ) THEN
+                -- Criar match se não existir
+                INSERT INTO matches (user1_id, user2_id, created_at)
+                VALUES (
+                    LEAST(NEW.swiper_id, NEW.swiped_id),
+                    GREATEST(NEW.swiper_id, NEW.swiped_id),
+                    NOW()
+                )
+                ON CONFLICT (user1_id, user2_id) DO NOTHING;
+            END IF;
+        END IF;
+
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+    # Likes: insert, troca de direção e delete
+    op.execute("""
+    CREATE OR REPLACE FUNCTION user_stats_swipe() RETURNS TRIGGER AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            IF NEW.direction = 'like' THEN
+                PERFORM apply_user_stats_delta(NEW.swiped_id, 1, 0, 0, 0, 0);
+            END IF;
+            RETURN NEW;
+        ELSIF TG_OP = 'UPDATE' THEN
+            IF (OLD.direction, OLD.swiped_id) IS DISTINCT FROM (NEW.direction, NEW.swiped_id) THEN
+                IF OLD.direction = 'like' THEN
+                    PERFORM apply_user_stats_delta(OLD.swiped_id, -1, 0, 0, 0, 0);
+                END IF;
+                IF NEW.direction = 'like' THEN
+                    PERFORM apply_user_stats_delta(NEW.swiped_id, 1, 0, 0, 0, 0);
+                END IF;
+            END IF;
+            RETURN NEW;
+        ELSE
+            IF OLD.direction = 'like' THEN
+                PERFORM apply_user_stats_delta(OLD.swiped_id, -1, 0, 0, 0, 0);
+            END IF;
+            RETURN OLD;
+        END IF;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+    CREATE TRIGGER trg_user_stats_swipe
+    AFTER INSERT OR UPDATE OF direction, swiped_id OR DELETE ON swipes
+    FOR EACH ROW EXECUTE FUNCTION user_stats_swipe();
+    """)
+
+    # Matches
+    op.execute("""
+    CREATE OR REPLACE FUNCTION user_stats_match() RETURNS TRIGGER AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            PERFORM apply_user_stats_delta(NEW.user1_id, 0, 1, 0, 0, 0);
+            PERFORM apply_user_stats_delta(NEW.user2_id, 0, 1, 0, 0, 0);
+            RETURN NEW;
+        ELSE
+            PERFORM apply_user_stats_delta(OLD.user1_id, 0, -1, 0, 0, 0);
+            PERFORM apply_user_stats_delta(OLD.user2_id, 0, -1, 0, 0, 0);
+            RETURN OLD;
+        END IF;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+    CREATE TRIGGER trg_user_stats_match
+    AFTER INSERT OR DELETE ON matches
+    FOR EACH ROW EXECUTE FUNCTION user_stats_match();
+    """)
+
+    # Visualizações
+    op.execute("""
+    CREATE OR REPLACE FUNCTION user_stats_view() RETURNS TRIGGER AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            PERFORM apply_user_stats_delta(NEW.viewed_id, 0, 0, 1, 0, 0);
+            RETURN NEW;
+        ELSE
+            PERFORM apply_user_stats_delta(OLD.viewed_id, 0, 0, -1, 0, 0);
+            RETURN OLD;
+        END IF;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+    CREATE TRIGGER trg_user_stats_view
+    AFTER INSERT OR DELETE ON profile_views
+    FOR EACH ROW EXECUTE FUNCTION user_stats_view();
+    """)
+
+    # Reports
+    op.execute("""
+    CREATE OR REPLACE FUNCTION user_stats_report() RETURNS TRIGGER AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            PERFORM apply_user_stats_delta(NEW.reported_id, 0, 0, 0, 1, 0);
+            RETURN NEW;
+        ELSE
+            PERFORM apply_user_stats_delta(OLD.reported_id, 0, 0, 0, -1, 0);
+            RETURN OLD;
+        END IF;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+    CREATE TRIGGER trg_user_stats_report
+    AFTER INSERT OR DELETE ON reports
+    FOR EACH ROW EXECUTE FUNCTION user_stats_report();
+    """)
+
+    # Bloqueios
+    op.execute("""
+    CREATE OR REPLACE FUNCTION user_stats_block() RETURNS TRIGGER AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            PERFORM apply_user_stats_delta(NEW.blocked_id, 0, 0, 0, 0, 1);
+            RETURN NEW;
+        ELSE
+            PERFORM apply_user_stats_delta(OLD.blocked_id, 0, 0, 0, 0, -1);
+            RETURN OLD;
+        END IF;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+    CREATE TRIGGER trg_user_stats_block
+    AFTER INSERT OR DELETE ON blocked_users
+    FOR EACH ROW EXECUTE FUNCTION user_stats_block();
+    """)
+
+    # Bônus de perfil completo muda com o perfil
+    op.execute("""
+    CREATE OR REPLACE FUNCTION user_stats_profile() RETURNS TRIGGER AS $$
+    BEGIN
+        PERFORM refresh_fame_from_stats(NEW.user_id);
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+    CREATE TRIGGER trg_user_stats_profile
+    AFTER INSERT OR UPDATE OF avatar_url, bio, photo1_url, photo2_url ON profiles
+    FOR EACH ROW EXECUTE FUNCTION user_stats_profile();
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_user_stats_profile ON profiles;")
+    op.execute("DROP TRIGGER IF EXISTS trg_user_stats_block ON blocked_users;")
+    op.execute("DROP TRIGGER IF EXISTS trg_user_stats_report ON reports;")
+    op.execute("DROP TRIGGER IF EXISTS trg_user_stats_view ON profile_views;")
+    op.execute("DROP TRIGGER IF EXISTS trg_user_stats_match ON matches;")
+    op.execute("DROP TRIGGER IF EXISTS trg_user_stats_swipe ON swipes;")
+
+    op.execute("DROP FUNCTION IF EXISTS user_stats_profile();")
+    op.execute("DROP FUNCTION IF EXISTS user_stats_block();")
+    op.execute("DROP FUNCTION IF EXISTS user_stats_report();")
+    op.execute("DROP FUNCTION IF EXISTS user_stats_view();")
+    op.execute("DROP FUNCTION IF EXISTS user_stats_match();")
+    op.execute("DROP FUNCTION IF EXISTS user_stats_swipe();")
+
+    # Restaurar recontagem completa (versão de 003)
+    op.execute("""
+    CREATE OR REPLACE FUNCTION update_fame_rating(p_user_id INT) RETURNS VOID AS $$
+    DECLARE
+        likes_count INT;
+        matches_count INT;
+        views_count INT;
+        reports_count INT;
+        blocks_count INT;
+        completion_bonus INT := 0;
+        fame INT;
+    BEGIN
+        SELECT COUNT(*) INTO likes_count
+        FROM swipes WHERE swiped_id = p_user_id AND direction = 'like';
+
+        SELECT COUNT(*) INTO matches_count
+        FROM matches WHERE user1_id = p_user_id OR user2_id = p_user_id;
+
+        SELECT COUNT(*) INTO views_count
+        FROM profile_views WHERE viewed_id = p_user_id;
+
+        SELECT COUNT(*) INTO reports_count
+        FROM reports WHERE reported_id = p_user_id;
+
+        SELECT COUNT(*) INTO blocks_count
+        FROM blocked_users WHERE blocked_id = p_user_id;
+
+        SELECT CASE WHEN avatar_url IS NOT NULL AND bio IS NOT NULL
+                         AND (photo1_url IS NOT NULL OR photo2_url IS NOT NULL)
+                    THEN 1 ELSE 0 END
+        INTO completion_bonus
+        FROM profiles WHERE user_id = p_user_id;
+
+        fame := (likes_count * 1) + (matches_count * 3) + (views_count / 2)
+                - (reports_count * 5) - (blocks_count * 2)
+                + (completion_bonus * 5);
+
+        IF fame < 0 THEN
+            fame := 0;
+        END IF;
+
+        UPDATE users SET fame_rating = fame WHERE users.user_id = p_user_id;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+    # Restaurar trigger de swipe de 004 (com recontagem)
+    op.execute("""
+    CREATE OR REPLACE FUNCTION create_match_if_mutual_like() RETURNS TRIGGER AS $$
+    BEGIN
+        IF NEW.direction = 'like' THEN
+            IF EXISTS (
+                SELECT 1 FROM swipes
+                WHERE swiper_id = NEW.swiped_id
+                  AND swiped_id = NEW.swiper_id
+                  AND direction = 'like'
+            ) THEN
+                INSERT INTO matches (user1_id, user2_id, created_at)
+                VALUES (
+                    LEAST(NEW.swiper_id, NEW.swiped_id),
+                    GREATEST(NEW.swiper_id, NEW.swiped_id),
+                    NOW()
+                )
+                ON CONFLICT (user1_id, user2_id) DO NOTHING;
+            END IF;
+        END IF;
+
+        PERFORM update_fame_rating(NEW.swiped_id);
+
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+    # Restaurar triggers de recontagem de 002
+    op.execute("""
+    CREATE TRIGGER trg_match_update
+    AFTER INSERT ON matches
+    FOR EACH ROW EXECUTE FUNCTION trigger_match_update();
+    """)
+    op.execute("""
+    CREATE TRIGGER trg_view_update
+    AFTER INSERT ON profile_views
+    FOR EACH ROW EXECUTE FUNCTION trigger_view_update();
+    """)
+    op.execute("""
+    CREATE TRIGGER trg_report_update
+    AFTER INSERT ON reports
+    FOR EACH ROW EXECUTE FUNCTION trigger_report_update();
+    """)
+    op.execute("""
+    CREATE TRIGGER trg_block_update
+    AFTER INSERT ON blocked_users
+    FOR EACH ROW EXECUTE FUNCTION trigger_block_update();
+    """)
+
+    op.execute("DROP FUNCTION IF EXISTS reconcile_user_stats();")
+    op.execute("DROP FUNCTION IF EXISTS apply_user_stats_delta(INT, INT, INT, INT, INT, INT);")
+    op.execute("DROP FUNCTION IF EXISTS refresh_fame_from_stats(INT);")
+    op.execute("DROP FUNCTION IF EXISTS compute_fame(INT, INT, INT, INT, INT, INT);")
+    op.drop_table('user_stats')
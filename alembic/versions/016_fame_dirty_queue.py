@@ -0,0 +1,189 @@
+"""Deferred fame recomputation queue (fame_dirty)
+
+Revision ID: 016_fame_dirty
+Revises: 015_user_stats
+Create Date: 2026-10-18 00:04:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '016_fame_dirty'
+down_revision = '015_user_stats'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Log append-only de usuários com fame desatualizado.
+    # Sem chave única nem FK: o insert não disputa lock com outros writers.
+    op.create_table('fame_dirty',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.text('NOW()')),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    # Recontagem em conjunto para uma lista de usuários
+    op.execute("""
+    CREATE OR REPLACE FUNCTION refresh_user_stats(p_user_ids INT[]) RETURNS INT AS $$
+    DECLARE
+        refreshed INT;
+    BEGIN
+        WITH likes AS (
+            SELECT swiped_id AS user_id, COUNT(*) AS c
+            FROM swipes
+            WHERE direction = 'like' AND swiped_id = ANY(p_user_ids)
+            GROUP BY swiped_id
+        ), match_counts AS (
+            SELECT user_id, COUNT(*) AS c FROM (
+                SELECT user1_id AS user_id FROM matches WHERE user1_id = ANY(p_user_ids)
+                UNION ALL
+                SELECT user2_id FROM matches WHERE user2_id = ANY(p_user_ids)
+            ) m GROUP BY user_id
+        ), views AS (
+            SELECT viewed_id AS user_id, COUNT(*) AS c
+            FROM profile_views WHERE viewed_id = ANY(p_user_ids)
+            GROUP BY viewed_id
+        ), report_counts AS (
+            SELECT reported_id AS user_id, COUNT(*) AS c
+            FROM reports WHERE reported_id = ANY(p_user_ids)
+            GROUP BY reported_id
+        ), block_counts AS (
+            SELECT blocked_id AS user_id, COUNT(*) AS c
+            FROM blocked_users WHERE blocked_id = ANY(p_user_ids)
+            GROUP BY blocked_id
+        )
+        INSERT INTO user_stats (
+            user_id, likes_received, matches_count, views_received,
+            reports_received, blocks_received, updated_at
+        )
+        SELECT u.user_id,
+               COALESCE(l.c, 0), COALESCE(m.c, 0), COALESCE(v.c, 0),
+               COALESCE(r.c, 0), COALESCE(b.c, 0), NOW()
+        FROM users u
+        LEFT JOIN likes l ON l.user_id = u.user_id
+        LEFT JOIN match_counts m ON m.user_id = u.user_id
+        LEFT JOIN views v ON v.user_id = u.user_id
+        LEFT JOIN report_counts r ON r.user_id = u.user_id
+        LEFT JOIN block_counts b ON b.user_id = u.user_id
+        WHERE u.user_id = ANY(p_user_ids)
+        ON CONFLICT (user_id) DO UPDATE SET
+            likes_received = EXCLUDED.likes_received,
+            matches_count = EXCLUDED.matches_count,
+            views_received = EXCLUDED.views_received,
+            reports_received = EXCLUDED.reports_received,
+            blocks_received = EXCLUDED.blocks_received,
+            updated_at = NOW();
+
+        GET DIAGNOSTICS refreshed = ROW_COUNT;
+
+        UPDATE users u
+        SET fame_rating = f.fame
+        FROM (
+            SELECT s.user_id, compute_fame(
+                s.likes_received, s.matches_count, s.views_received,
+                s.reports_received, s.blocks_received,
+                CASE WHEN p.avatar_url IS NOT NULL AND p.bio IS NOT NULL
+                          AND (p.photo1_url IS NOT NULL OR p.photo2_url IS NOT NULL)
+                     THEN 1 ELSE 0 END
+            ) AS fame
+            FROM user_stats s
+            LEFT JOIN profiles p ON p.user_id = s.user_id
+            WHERE s.user_id = ANY(p_user_ids)
+        ) f
+        WHERE u.user_id = f.user_id
+          AND u.fame_rating IS DISTINCT FROM f.fame;
+
+        RETURN refreshed;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+    # Modo "deferred" (matcha.fame_mode da sessão): só enfileira o usuário
+    op.execute("""
+    CREATE OR REPLACE FUNCTION apply_user_stats_delta(
+        p_user_id INT, d_likes INT, d_matches INT, d_views INT, d_reports INT, d_blocks INT
+    ) RETURNS VOID AS $$
+    BEGIN
+        IF current_setting('matcha.fame_mode', true) = 'deferred' THEN
+            INSERT INTO fame_dirty (user_id) VALUES (p_user_id);
+            RETURN;
+        END IF;
+
+        -- SELECT em users evita violar a FK durante deleções em cascata
+        INSERT INTO user_stats (
+            user_id, likes_received, matches_count, views_received,
+            reports_received, blocks_received, updated_at
+        )
+        SELECT p_user_id, GREATEST(d_likes, 0), GREATEST(d_matches, 0), GREATEST(d_views, 0),
+               GREATEST(d_reports, 0), GREATEST(d_blocks, 0), NOW()
+        FROM users WHERE user_id = p_user_id
+        ON CONFLICT (user_id) DO UPDATE SET
+            likes_received = GREATEST(user_stats.likes_received + d_likes, 0),
+            matches_count = GREATEST(user_stats.matches_count + d_matches, 0),
+            views_received = GREATEST(user_stats.views_received + d_views, 0),
+            reports_received = GREATEST(user_stats.reports_received + d_reports, 0),
+            blocks_received = GREATEST(user_stats.blocks_received + d_blocks, 0),
+            updated_at = NOW();
+
+        PERFORM refresh_fame_from_stats(p_user_id);
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+    op.execute("""
+    CREATE OR REPLACE FUNCTION user_stats_profile() RETURNS TRIGGER AS $$
+    BEGIN
+        IF current_setting('matcha.fame_mode', true) = 'deferred' THEN
+            INSERT INTO fame_dirty (user_id) VALUES (NEW.user_id);
+        ELSE
+            PERFORM refresh_fame_from_stats(NEW.user_id);
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+
+def downgrade() -> None:
+    # Aplicar o que ainda estiver pendente antes de remover a fila
+    op.execute("SELECT refresh_user_stats(ARRAY(SELECT DISTINCT user_id FROM fame_dirty));")
+
+    op.execute("""
+    CREATE OR REPLACE FUNCTION user_stats_profile() RETURNS TRIGGER AS $$
+    BEGIN
+        PERFORM refresh_fame_from_stats(NEW.user_id);
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+    op.execute("""
+    CREATE OR REPLACE FUNCTION apply_user_stats_delta(
+        p_user_id INT, d_likes INT, d_matches INT, d_views INT, d_reports INT, d_blocks INT
+    ) RETURNS VOID AS $$
+    BEGIN
+        INSERT INTO user_stats (
+            user_id, likes_received, matches_count, views_received,
+            reports_received, blocks_received, updated_at
+        )
+        SELECT p_user_id, GREATEST(d_likes, 0), GREATEST(d_matches, 0), GREATEST(d_views, 0),
+               GREATEST(d_reports, 0), GREATEST(d_blocks, 0), NOW()
+        FROM users WHERE user_id = p_user_id
+        ON CONFLICT (user_id) DO UPDATE SET
+            likes_received = GREATEST(user_stats.likes_received + d_likes, 0),
+            matches_count = GREATEST(user_stats.matches_count + d_matches, 0),
+            views_received = GREATEST(user_stats.views_received + d_views, 0),
+            reports_received = GREATEST(user_stats.reports_received + d_reports, 0),
+            blocks_received = GREATEST(user_stats.blocks_received + d_blocks, 0),
+            updated_at = NOW();
+
+        PERFORM refresh_fame_from_stats(p_user_id);
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+    op.execute("DROP FUNCTION IF EXISTS refresh_user_stats(INT[]);")
+    op.drop_table('fame_dirty')
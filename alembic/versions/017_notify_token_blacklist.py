@@ -0,0 +1,45 @@
+"""Notify blacklisted JWTs via LISTEN/NOTIFY
+
+Revision ID: 017_notify_blacklist
+Revises: 016_fame_dirty
+Create Date: 2026-10-18 00:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '017_notify_blacklist'
+down_revision = '016_fame_dirty'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Avisa os processos da API (canal token_blacklist) com "jti|expiração epoch"
+    op.execute("""
+    CREATE OR REPLACE FUNCTION notify_token_blacklisted() RETURNS TRIGGER AS $$
+    BEGIN
+        PERFORM pg_notify(
+            'token_blacklist',
+            NEW.token_jti || '|' || EXTRACT(EPOCH FROM NEW.expires_at)::BIGINT
+        );
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+    op.execute("""
+    CREATE TRIGGER trg_notify_token_blacklisted
+    AFTER INSERT ON blacklisted_tokens
+    FOR EACH ROW EXECUTE FUNCTION notify_token_blacklisted();
+    """)
+
+    # Consulta de hidratação filtra por expiração
+    op.create_index('idx_blacklist_expires', 'blacklisted_tokens', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_blacklist_expires', table_name='blacklisted_tokens')
+    op.execute("DROP TRIGGER IF EXISTS trg_notify_token_blacklisted ON blacklisted_tokens;")
+    op.execute("DROP FUNCTION IF EXISTS notify_token_blacklisted();")
@@ -0,0 +1,27 @@
+"""Add users.last_seen persisted by the presence service
+
+Revision ID: 018_user_last_seen
+Revises: 017_notify_blacklist
+Create Date: 2026-10-18 00:06:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '018_user_last_seen'
+down_revision = '017_notify_blacklist'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Última atividade gravada em lote pelo serviço de presença
+    op.add_column('users', sa.Column('last_seen', sa.DateTime(timezone=True), nullable=True))
+    op.execute("UPDATE users SET last_seen = last_login WHERE last_login IS NOT NULL;")
+    op.create_index('idx_users_last_seen', 'users', ['last_seen'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_users_last_seen', table_name='users')
+    op.drop_column('users', 'last_seen')
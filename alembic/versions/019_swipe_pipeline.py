@@ -0,0 +1,98 @@
+"""Single-statement swipe pipeline (process_swipe)
+
+Revision ID: 019_swipe_pipeline
+Revises: 018_user_last_seen
+Create Date: 2026-10-18 00:07:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '019_swipe_pipeline'
+down_revision = '018_user_last_seen'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Swipe completo em uma chamada (e uma transação): upsert, reciprocidade,
+    # match, chat e notificações. Retorna o que precisa ser enviado via WebSocket.
+    op.execute("""
+    CREATE OR REPLACE FUNCTION process_swipe(
+        p_swiper_id INT, p_swiped_id INT, p_direction VARCHAR
+    ) RETURNS TABLE (new_match_id INT, new_chat_id INT, created_notifications JSONB) AS $$
+    DECLARE
+        v_match_id INT;
+        v_chat_id INT;
+        v_swiper_name TEXT;
+        v_swiped_name TEXT;
+        v_notifications JSONB;
+    BEGIN
+        INSERT INTO swipes (swiper_id, swiped_id, direction)
+        VALUES (p_swiper_id, p_swiped_id, p_direction)
+        ON CONFLICT (swiper_id, swiped_id) DO UPDATE
+        SET direction = EXCLUDED.direction;
+
+        SELECT u.name INTO v_swiper_name FROM users u WHERE u.user_id = p_swiper_id;
+
+        IF p_direction = 'like' THEN
+            IF EXISTS (
+                SELECT 1 FROM swipes s
+                WHERE s.swiper_id = p_swiped_id
+                  AND s.swiped_id = p_swiper_id
+                  AND s.direction = 'like'
+            ) THEN
+                INSERT INTO matches (user1_id, user2_id)
+                VALUES (LEAST(p_swiper_id, p_swiped_id), GREATEST(p_swiper_id, p_swiped_id))
+                ON CONFLICT (user1_id, user2_id) DO NOTHING
+                RETURNING match_id INTO v_match_id;
+            END IF;
+
+            IF v_match_id IS NOT NULL THEN
+                INSERT INTO chats (match_id) VALUES (v_match_id)
+                RETURNING chat_id INTO v_chat_id;
+
+                SELECT u.name INTO v_swiped_name FROM users u WHERE u.user_id = p_swiped_id;
+
+                WITH inserted AS (
+                    INSERT INTO notifications (user_id, type, content, related_user_id)
+                    VALUES
+                        (p_swiper_id, 'match',
+                         'Você tem um novo match com ' || COALESCE(v_swiped_name, 'alguém') || '! 💕',
+                         p_swiped_id),
+                        (p_swiped_id, 'match',
+                         'Você tem um novo match com ' || COALESCE(v_swiper_name, 'alguém') || '! 💕',
+                         p_swiper_id)
+                    RETURNING user_id, type, content, created_at
+                )
+                SELECT jsonb_agg(to_jsonb(inserted)) INTO v_notifications FROM inserted;
+            ELSE
+                WITH inserted AS (
+                    INSERT INTO notifications (user_id, type, content, related_user_id)
+                    VALUES (p_swiped_id, 'like',
+                            COALESCE(v_swiper_name, 'Alguém') || ' curtiu seu perfil! ❤️',
+                            p_swiper_id)
+                    RETURNING user_id, type, content, created_at
+                )
+                SELECT jsonb_agg(to_jsonb(inserted)) INTO v_notifications FROM inserted;
+            END IF;
+        ELSE
+            WITH inserted AS (
+                INSERT INTO notifications (user_id, type, content, related_user_id)
+                VALUES (p_swiped_id, 'unlike',
+                        COALESCE(v_swiper_name, 'Alguém') || ' descurtiu seu perfil 💔',
+                        p_swiper_id)
+                RETURNING user_id, type, content, created_at
+            )
+            SELECT jsonb_agg(to_jsonb(inserted)) INTO v_notifications FROM inserted;
+        END IF;
+
+        RETURN QUERY SELECT v_match_id, v_chat_id, COALESCE(v_notifications, '[]'::jsonb);
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP FUNCTION IF EXISTS process_swipe(INT, INT, VARCHAR);")
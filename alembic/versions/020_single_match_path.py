@@ -0,0 +1,219 @@
+"""Make process_swipe the only match-creation path
+
+Revision ID: 020_single_match_path
+Revises: 019_swipe_pipeline
+Create Date: 2026-10-18 00:08:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '020_single_match_path'
+down_revision = '019_swipe_pipeline'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # O trigger criava o match antes de process_swipe, que então não recebia
+    # o match_id e pulava chat e notificações
+    op.execute("DROP TRIGGER IF EXISTS trg_swipe_update ON swipes;")
+    op.execute("DROP FUNCTION IF EXISTS create_match_if_mutual_like();")
+
+    # Matches criados pelo trigger ficaram sem chat
+    op.execute("""
+    INSERT INTO chats (match_id)
+    SELECT m.match_id FROM matches m
+    WHERE NOT EXISTS (SELECT 1 FROM chats c WHERE c.match_id = m.match_id);
+    """)
+
+    op.execute("""
+    CREATE OR REPLACE FUNCTION process_swipe(
+        p_swiper_id INT, p_swiped_id INT, p_direction VARCHAR
+    ) RETURNS TABLE (new_match_id INT, new_chat_id INT, created_notifications JSONB) AS $$
+    DECLARE
+        v_match_id INT;
+        v_chat_id INT;
+        v_swiper_name TEXT;
+        v_swiped_name TEXT;
+        v_notifications JSONB;
+    BEGIN
+        -- Serializa swipes do mesmo par: likes simultâneos nos dois sentidos
+        -- sempre enxergam um ao outro e o match é criado uma única vez
+        PERFORM pg_advisory_xact_lock(
+            LEAST(p_swiper_id, p_swiped_id), GREATEST(p_swiper_id, p_swiped_id)
+        );
+
+        INSERT INTO swipes (swiper_id, swiped_id, direction)
+        VALUES (p_swiper_id, p_swiped_id, p_direction)
+        ON CONFLICT (swiper_id, swiped_id) DO UPDATE
+        SET direction = EXCLUDED.direction;
+
+        SELECT u.name INTO v_swiper_name FROM users u WHERE u.user_id = p_swiper_id;
+
+        IF p_direction = 'like' THEN
+            -- Reciprocidade (uma busca no índice único de swipes) e match no mesmo comando
+            INSERT INTO matches (user1_id, user2_id)
+            SELECT LEAST(p_swiper_id, p_swiped_id), GREATEST(p_swiper_id, p_swiped_id)
+            WHERE EXISTS (
+                SELECT 1 FROM swipes s
+                WHERE s.swiper_id = p_swiped_id
+                  AND s.swiped_id = p_swiper_id
+                  AND s.direction = 'like'
+            )
+            ON CONFLICT (user1_id, user2_id) DO NOTHING
+            RETURNING match_id INTO v_match_id;
+
+            IF v_match_id IS NOT NULL THEN
+                INSERT INTO chats (match_id) VALUES (v_match_id)
+                RETURNING chat_id INTO v_chat_id;
+
+                SELECT u.name INTO v_swiped_name FROM users u WHERE u.user_id = p_swiped_id;
+
+                WITH inserted AS (
+                    INSERT INTO notifications (user_id, type, content, related_user_id)
+                    VALUES
+                        (p_swiper_id, 'match',
+                         'Você tem um novo match com ' || COALESCE(v_swiped_name, 'alguém') || '! 💕',
+                         p_swiped_id),
+                        (p_swiped_id, 'match',
+                         'Você tem um novo match com ' || COALESCE(v_swiper_name, 'alguém') || '! 💕',
+                         p_swiper_id)
+                    RETURNING user_id, type, content, created_at
+                )
+                SELECT jsonb_agg(to_jsonb(inserted)) INTO v_notifications FROM inserted;
+            ELSE
+                WITH inserted AS (
+                    INSERT INTO notifications (user_id, type, content, related_user_id)
+                    VALUES (p_swiped_id, 'like',
+                            COALESCE(v_swiper_name, 'Alguém') || ' curtiu seu perfil! ❤️',
+                            p_swiper_id)
+                    RETURNING user_id, type, content, created_at
+                )
+                SELECT jsonb_agg(to_jsonb(inserted)) INTO v_notifications FROM inserted;
+            END IF;
+        ELSE
+            WITH inserted AS (
+                INSERT INTO notifications (user_id, type, content, related_user_id)
+                VALUES (p_swiped_id, 'unlike',
+                        COALESCE(v_swiper_name, 'Alguém') || ' descurtiu seu perfil 💔',
+                        p_swiper_id)
+                RETURNING user_id, type, content, created_at
+            )
+            SELECT jsonb_agg(to_jsonb(inserted)) INTO v_notifications FROM inserted;
+        END IF;
+
+        RETURN QUERY SELECT v_match_id, v_chat_id, COALESCE(v_notifications, '[]'::jsonb);
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+
+def downgrade() -> None:
+    op.execute("""
+    CREATE OR REPLACE FUNCTION process_swipe(
+        p_swiper_id INT, p_swiped_id INT, p_direction VARCHAR
+    ) RETURNS TABLE (new_match_id INT, new_chat_id INT, created_notifications JSONB) AS $$
+    DECLARE
+        v_match_id INT;
+        v_chat_id INT;
+        v_swiper_name TEXT;
+        v_swiped_name TEXT;
+        v_notifications JSONB;
+    BEGIN
+        INSERT INTO swipes (swiper_id, swiped_id, direction)
+        VALUES (p_swiper_id, p_swiped_id, p_direction)
+        ON CONFLICT (swiper_id, swiped_id) DO UPDATE
+        SET direction = EXCLUDED.direction;
+
+        SELECT u.name INTO v_swiper_name FROM users u WHERE u.user_id = p_swiper_id;
+
+        IF p_direction = 'like' THEN
+            IF EXISTS (
+                SELECT 1 FROM swipes s
+                WHERE s.swiper_id = p_swiped_id
+                  AND s.swiped_id = p_swiper_id
+                  AND s.direction = 'like'
+            ) THEN
+                INSERT INTO matches (user1_id, user2_id)
+                VALUES (LEAST(p_swiper_id, p_swiped_id), GREATEST(p_swiper_id, p_swiped_id))
+                ON CONFLICT (user1_id, user2_id) DO NOTHING
+                RETURNING match_id INTO v_match_id;
+            END IF;
+
+            IF v_match_id IS NOT NULL THEN
+                INSERT INTO chats (match_id) VALUES (v_match_id)
+                RETURNING chat_id INTO v_chat_id;
+
+                SELECT u.name INTO v_swiped_name FROM users u WHERE u.user_id = p_swiped_id;
+
+                WITH inserted AS (
+                    INSERT INTO notifications (user_id, type, content, related_user_id)
+                    VALUES
+                        (p_swiper_id, 'match',
+                         'Você tem um novo match com ' || COALESCE(v_swiped_name, 'alguém') || '! 💕',
+                         p_swiped_id),
+                        (p_swiped_id, 'match',
+                         'Você tem um novo match com ' || COALESCE(v_swiper_name, 'alguém') || '! 💕',
+                         p_swiper_id)
+                    RETURNING user_id, type, content, created_at
+                )
+                SELECT jsonb_agg(to_jsonb(inserted)) INTO v_notifications FROM inserted;
+            ELSE
+                WITH inserted AS (
+                    INSERT INTO notifications (user_id, type, content, related_user_id)
+                    VALUES (p_swiped_id, 'like',
+                            COALESCE(v_swiper_name, 'Alguém') || ' curtiu seu perfil! ❤️',
+                            p_swiper_id)
+                    RETURNING user_id, type, content, created_at
+                )
+                SELECT jsonb_agg(to_jsonb(inserted)) INTO v_notifications FROM inserted;
+            END IF;
+        ELSE
+            WITH inserted AS (
+                INSERT INTO notifications (user_id, type, content, related_user_id)
+                VALUES (p_swiped_id, 'unlike',
+                        COALESCE(v_swiper_name, 'Alguém') || ' descurtiu seu perfil 💔',
+                        p_swiper_id)
+                RETURNING user_id, type, content, created_at
+            )
+            SELECT jsonb_agg(to_jsonb(inserted)) INTO v_notifications FROM inserted;
+        END IF;
+
+        RETURN QUERY SELECT v_match_id, v_chat_id, COALESCE(v_notifications, '[]'::jsonb);
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+    # Restaurar trigger de criação de match (versão de 015)
+    op.execute("""
+    CREATE OR REPLACE FUNCTION create_match_if_mutual_like() RETURNS TRIGGER AS $$
+    BEGIN
+        IF NEW.direction = 'like' THEN
+            IF EXISTS (
+                SELECT 1 FROM swipes
+                WHERE swiper_id = NEW.swiped_id
+                  AND swiped_id = NEW.swiper_id
+                  AND direction = 'like'
+            ) THEN
+                INSERT INTO matches (user1_id, user2_id, created_at)
+                VALUES (
+                    LEAST(NEW.swiper_id, NEW.swiped_id),
+                    GREATEST(NEW.swiper_id, NEW.swiped_id),
+                    NOW()
+                )
+                ON CONFLICT (user1_id, user2_id) DO NOTHING;
+            END IF;
+        END IF;
+
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+    op.execute("""
+    CREATE TRIGGER trg_swipe_update
+    AFTER INSERT ON swipes
+    FOR EACH ROW EXECUTE FUNCTION create_match_if_mutual_like();
+    """)
@@ -0,0 +1,138 @@
+"""Add process_swipes_batch for bulk swipe ingestion
+
+Revision ID: 021_swipe_batch
+Revises: 020_single_match_path
+Create Date: 2026-10-18 00:09:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '021_swipe_batch'
+down_revision = '020_single_match_path'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Versão em lote de process_swipe: mesmas regras, aplicadas de forma set-based.
+    # Swipes repetidos do mesmo par no lote valem pelo último (ordem de replay).
+    op.execute("""
+    CREATE OR REPLACE FUNCTION process_swipes_batch(
+        p_swiper_ids INT[], p_swiped_ids INT[], p_directions VARCHAR[]
+    ) RETURNS TABLE (processed INT, created_matches JSONB, created_notifications JSONB) AS $$
+    DECLARE
+        v_swipers INT[];
+        v_swipeds INT[];
+        v_directions VARCHAR[];
+        v_ords INT[];
+        v_pair RECORD;
+        v_matches JSONB;
+        v_notifications JSONB;
+    BEGIN
+        SELECT array_agg(t.s ORDER BY t.ord), array_agg(t.d ORDER BY t.ord),
+               array_agg(t.dir ORDER BY t.ord), array_agg(t.ord ORDER BY t.ord)
+        INTO v_swipers, v_swipeds, v_directions, v_ords
+        FROM (
+            SELECT DISTINCT ON (b.s, b.d) b.s, b.d, b.dir, b.ord::INT AS ord
+            FROM UNNEST(p_swiper_ids, p_swiped_ids, p_directions)
+                 WITH ORDINALITY AS b(s, d, dir, ord)
+            ORDER BY b.s, b.d, b.ord DESC
+        ) t;
+
+        IF v_swipers IS NULL THEN
+            RETURN QUERY SELECT 0, '[]'::jsonb, '[]'::jsonb;
+            RETURN;
+        END IF;
+
+        -- Mesmo lock por par de process_swipe, em ordem fixa para não haver deadlock
+        FOR v_pair IN
+            SELECT DISTINCT LEAST(b.s, b.d) AS a, GREATEST(b.s, b.d) AS z
+            FROM UNNEST(v_swipers, v_swipeds) AS b(s, d)
+            ORDER BY 1, 2
+        LOOP
+            PERFORM pg_advisory_xact_lock(v_pair.a, v_pair.z);
+        END LOOP;
+
+        -- Ordem fixa (e não a do replay): os triggers de fame travam user_stats/users
+        -- dos usuários curtidos, e lotes concorrentes precisam travar na mesma ordem
+        INSERT INTO swipes (swiper_id, swiped_id, direction)
+        SELECT b.s, b.d, b.dir
+        FROM UNNEST(v_swipers, v_swipeds, v_directions) AS b(s, d, dir)
+        ORDER BY b.d, b.s
+        ON CONFLICT (swiper_id, swiped_id) DO UPDATE
+        SET direction = EXCLUDED.direction;
+
+        -- Todos os likes mútuos do lote em uma consulta (índice único de swipes)
+        WITH new_matches AS (
+            INSERT INTO matches (user1_id, user2_id)
+            SELECT DISTINCT LEAST(b.s, b.d), GREATEST(b.s, b.d)
+            FROM UNNEST(v_swipers, v_swipeds, v_directions) AS b(s, d, dir)
+            JOIN swipes r
+              ON r.swiper_id = b.d AND r.swiped_id = b.s AND r.direction = 'like'
+            WHERE b.dir = 'like'
+            ORDER BY 1, 2
+            ON CONFLICT (user1_id, user2_id) DO NOTHING
+            RETURNING match_id, user1_id, user2_id
+        ), new_chats AS (
+            INSERT INTO chats (match_id)
+            SELECT match_id FROM new_matches
+            RETURNING chat_id, match_id
+        )
+        SELECT jsonb_agg(jsonb_build_object(
+                   'match_id', m.match_id, 'chat_id', c.chat_id,
+                   'user1_id', m.user1_id, 'user2_id', m.user2_id))
+        INTO v_matches
+        FROM new_matches m JOIN new_chats c ON c.match_id = m.match_id;
+
+        WITH batch AS (
+            SELECT * FROM UNNEST(v_swipers, v_swipeds, v_directions, v_ords) AS b(s, d, dir, ord)
+        ), new_matches AS (
+            SELECT * FROM jsonb_to_recordset(COALESCE(v_matches, '[]'::jsonb))
+                AS m(match_id INT, chat_id INT, user1_id INT, user2_id INT)
+        ), creators AS (
+            -- O swipe que criou o match: o último like do par no lote
+            SELECT DISTINCT ON (m.match_id) b.s, b.d
+            FROM new_matches m
+            JOIN batch b
+              ON LEAST(b.s, b.d) = m.user1_id AND GREATEST(b.s, b.d) = m.user2_id
+             AND b.dir = 'like'
+            ORDER BY m.match_id, b.ord DESC
+        ), pending AS (
+            SELECT c.s AS user_id, 'match' AS type,
+                   'Você tem um novo match com ' || COALESCE(ud.name, 'alguém') || '! 💕' AS content,
+                   c.d AS related_user_id
+            FROM creators c LEFT JOIN users ud ON ud.user_id = c.d
+            UNION ALL
+            SELECT c.d, 'match',
+                   'Você tem um novo match com ' || COALESCE(us.name, 'alguém') || '! 💕',
+                   c.s
+            FROM creators c LEFT JOIN users us ON us.user_id = c.s
+            UNION ALL
+            SELECT b.d, 'like', COALESCE(us.name, 'Alguém') || ' curtiu seu perfil! ❤️', b.s
+            FROM batch b LEFT JOIN users us ON us.user_id = b.s
+            WHERE b.dir = 'like'
+              AND NOT EXISTS (SELECT 1 FROM creators c WHERE c.s = b.s AND c.d = b.d)
+            UNION ALL
+            SELECT b.d, 'unlike', COALESCE(us.name, 'Alguém') || ' descurtiu seu perfil 💔', b.s
+            FROM batch b LEFT JOIN users us ON us.user_id = b.s
+            WHERE b.dir = 'dislike'
+        ), inserted AS (
+            INSERT INTO notifications (user_id, type, content, related_user_id)
+            SELECT user_id, type, content, related_user_id FROM pending
+            RETURNING user_id, type, content, created_at
+        )
+        SELECT jsonb_agg(to_jsonb(inserted)) INTO v_notifications FROM inserted;
+
+        RETURN QUERY SELECT
+            array_length(v_swipers, 1),
+            COALESCE(v_matches, '[]'::jsonb),
+            COALESCE(v_notifications, '[]'::jsonb);
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP FUNCTION IF EXISTS process_swipes_batch(INT[], INT[], VARCHAR[]);")
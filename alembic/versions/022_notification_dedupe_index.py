@@ -0,0 +1,27 @@
+"""Add index for notification coalescing
+
+Revision ID: 022_notification_dedupe
+Revises: 021_swipe_batch
+Create Date: 2026-10-18 00:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '022_notification_dedupe'
+down_revision = '021_swipe_batch'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Busca de notificação recente por (usuário, tipo, usuário relacionado) no writer em lote
+    op.execute("""
+    CREATE INDEX IF NOT EXISTS idx_notifications_dedupe
+    ON notifications (user_id, type, related_user_id, created_at DESC);
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS idx_notifications_dedupe;")
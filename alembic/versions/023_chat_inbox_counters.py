@@ -0,0 +1,212 @@
+"""Denormalize last message and unread counters for the chat list
+
+Revision ID: 023_chat_inbox_counters
+Revises: 022_notification_dedupe
+Create Date: 2026-10-18 00:11:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '023_chat_inbox_counters'
+down_revision = '022_notification_dedupe'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Última mensagem do chat
+    op.execute("""
+    ALTER TABLE chats
+        ADD COLUMN IF NOT EXISTS last_message_id INT,
+        ADD COLUMN IF NOT EXISTS last_message_at TIMESTAMPTZ;
+    """)
+
+    # Participantes do chat com o contador de não lidas de cada um
+    op.execute("""
+    CREATE TABLE IF NOT EXISTS chat_members (
+        chat_id INT NOT NULL REFERENCES chats(chat_id) ON DELETE CASCADE,
+        user_id INT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+        unread_count INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, chat_id)
+    );
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS idx_chat_members_chat ON chat_members (chat_id);")
+
+    # Backfill
+    op.execute("""
+    INSERT INTO chat_members (chat_id, user_id)
+    SELECT c.chat_id, u.user_id
+    FROM chats c
+    JOIN matches m ON m.match_id = c.match_id
+    CROSS JOIN LATERAL (VALUES (m.user1_id), (m.user2_id)) AS u(user_id)
+    ON CONFLICT DO NOTHING;
+    """)
+    op.execute("""
+    UPDATE chat_members cm
+    SET unread_count = x.n
+    FROM (
+        SELECT cm2.chat_id, cm2.user_id, COUNT(*) AS n
+        FROM chat_members cm2
+        JOIN messages msg ON msg.chat_id = cm2.chat_id
+        WHERE msg.sender_id IS DISTINCT FROM cm2.user_id
+          AND msg.is_read IS NOT TRUE
+        GROUP BY cm2.chat_id, cm2.user_id
+    ) x
+    WHERE cm.chat_id = x.chat_id AND cm.user_id = x.user_id;
+    """)
+    op.execute("""
+    UPDATE chats c
+    SET last_message_id = x.message_id, last_message_at = x.sent_at
+    FROM (
+        SELECT DISTINCT ON (chat_id) chat_id, message_id, COALESCE(sent_at, NOW()) AS sent_at
+        FROM messages
+        ORDER BY chat_id, sent_at DESC NULLS LAST, message_id DESC
+    ) x
+    WHERE c.chat_id = x.chat_id;
+    """)
+
+    # Novo chat: cadastrar os dois participantes do match
+    op.execute("""
+    CREATE OR REPLACE FUNCTION chat_members_on_chat_insert() RETURNS TRIGGER AS $$
+    BEGIN
+        INSERT INTO chat_members (chat_id, user_id)
+        SELECT NEW.chat_id, u.user_id
+        FROM matches m
+        CROSS JOIN LATERAL (VALUES (m.user1_id), (m.user2_id)) AS u(user_id)
+        WHERE m.match_id = NEW.match_id
+        ON CONFLICT DO NOTHING;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+    CREATE TRIGGER trg_chat_members_insert
+    AFTER INSERT ON chats
+    FOR EACH ROW EXECUTE FUNCTION chat_members_on_chat_insert();
+    """)
+
+    # Mensagens novas: por comando (o COPY do buffer do chat grava um lote de uma vez)
+    op.execute("""
+    CREATE OR REPLACE FUNCTION chat_counters_on_message_insert() RETURNS TRIGGER AS $$
+    BEGIN
+        UPDATE chats c
+        SET last_message_id = x.message_id, last_message_at = x.sent_at
+        FROM (
+            SELECT DISTINCT ON (chat_id) chat_id, message_id, COALESCE(sent_at, NOW()) AS sent_at
+            FROM new_rows
+            ORDER BY chat_id, sent_at DESC NULLS LAST, message_id DESC
+        ) x
+        WHERE c.chat_id = x.chat_id
+          AND (c.last_message_at IS NULL
+               OR (x.sent_at, x.message_id) > (c.last_message_at, c.last_message_id));
+
+        UPDATE chat_members cm
+        SET unread_count = cm.unread_count + x.n
+        FROM (
+            SELECT cm2.chat_id, cm2.user_id, COUNT(*) AS n
+            FROM new_rows nr
+            JOIN chat_members cm2 ON cm2.chat_id = nr.chat_id
+            WHERE nr.sender_id IS DISTINCT FROM cm2.user_id
+              AND nr.is_read IS NOT TRUE
+            GROUP BY cm2.chat_id, cm2.user_id
+        ) x
+        WHERE cm.chat_id = x.chat_id AND cm.user_id = x.user_id;
+
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+    CREATE TRIGGER trg_chat_counters_insert
+    AFTER INSERT ON messages
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION chat_counters_on_message_insert();
+    """)
+
+    # Leitura (read e read-all): ajusta pelo saldo de mensagens que mudaram de estado
+    op.execute("""
+    CREATE OR REPLACE FUNCTION chat_counters_on_message_update() RETURNS TRIGGER AS $$
+    BEGIN
+        UPDATE chat_members cm
+        SET unread_count = GREATEST(cm.unread_count + x.delta, 0)
+        FROM (
+            SELECT cm2.chat_id, cm2.user_id,
+                   SUM(CASE WHEN o.is_read IS NOT TRUE THEN -1 ELSE 1 END) AS delta
+            FROM old_rows o
+            JOIN new_rows n ON n.message_id = o.message_id
+            JOIN chat_members cm2 ON cm2.chat_id = n.chat_id
+            WHERE (o.is_read IS NOT TRUE) <> (n.is_read IS NOT TRUE)
+              AND n.sender_id IS DISTINCT FROM cm2.user_id
+            GROUP BY cm2.chat_id, cm2.user_id
+        ) x
+        WHERE cm.chat_id = x.chat_id AND cm.user_id = x.user_id;
+
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+    CREATE TRIGGER trg_chat_counters_update
+    AFTER UPDATE ON messages
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION chat_counters_on_message_update();
+    """)
+
+    # Mensagem apagada: desconta não lidas e recalcula a última mensagem se preciso
+    op.execute("""
+    CREATE OR REPLACE FUNCTION chat_counters_on_message_delete() RETURNS TRIGGER AS $$
+    BEGIN
+        UPDATE chat_members cm
+        SET unread_count = GREATEST(cm.unread_count - x.n, 0)
+        FROM (
+            SELECT cm2.chat_id, cm2.user_id, COUNT(*) AS n
+            FROM old_rows o
+            JOIN chat_members cm2 ON cm2.chat_id = o.chat_id
+            WHERE o.sender_id IS DISTINCT FROM cm2.user_id
+              AND o.is_read IS NOT TRUE
+            GROUP BY cm2.chat_id, cm2.user_id
+        ) x
+        WHERE cm.chat_id = x.chat_id AND cm.user_id = x.user_id;
+
+        UPDATE chats c
+        SET last_message_id = lm.message_id, last_message_at = lm.sent_at
+        FROM (SELECT DISTINCT chat_id FROM old_rows) d
+        LEFT JOIN LATERAL (
+            SELECT message_id, COALESCE(sent_at, NOW()) AS sent_at
+            FROM messages
+            WHERE chat_id = d.chat_id
+            ORDER BY sent_at DESC NULLS LAST, message_id DESC
+            LIMIT 1
+        ) lm ON true
+        WHERE c.chat_id = d.chat_id
+          AND c.last_message_id IN (SELECT message_id FROM old_rows);
+
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+    CREATE TRIGGER trg_chat_counters_delete
+    AFTER DELETE ON messages
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION chat_counters_on_message_delete();
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_chat_counters_delete ON messages;")
+    op.execute("DROP TRIGGER IF EXISTS trg_chat_counters_update ON messages;")
+    op.execute("DROP TRIGGER IF EXISTS trg_chat_counters_insert ON messages;")
+    op.execute("DROP TRIGGER IF EXISTS trg_chat_members_insert ON chats;")
+    op.execute("DROP FUNCTION IF EXISTS chat_counters_on_message_delete();")
+    op.execute("DROP FUNCTION IF EXISTS chat_counters_on_message_update();")
+    op.execute("DROP FUNCTION IF EXISTS chat_counters_on_message_insert();")
+    op.execute("DROP FUNCTION IF EXISTS chat_members_on_chat_insert();")
+    op.execute("DROP TABLE IF EXISTS chat_members;")
+    op.execute("""
+    ALTER TABLE chats
+        DROP COLUMN IF EXISTS last_message_at,
+        DROP COLUMN IF EXISTS last_message_id;
+    """)
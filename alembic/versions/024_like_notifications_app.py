@@ -0,0 +1,426 @@
+"""Return like notifications from the swipe functions instead of inserting them
+
+Revision ID: 024_like_notifications_app
+Revises: 023_chat_inbox_counters
+Create Date: 2026-10-18 00:12:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '024_like_notifications_app'
+down_revision = '023_chat_inbox_counters'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Likes passam a ser gravados pela aplicação, pelo writer de notificações
+    # (coalescência e resumo de rajadas); match e unlike seguem na transação do swipe
+    op.execute("""
+    CREATE OR REPLACE FUNCTION process_swipe(
+        p_swiper_id INT, p_swiped_id INT, p_direction VARCHAR
+    ) RETURNS TABLE (new_match_id INT, new_chat_id INT, created_notifications JSONB) AS $$
+    DECLARE
+        v_match_id INT;
+        v_chat_id INT;
+        v_swiper_name TEXT;
+        v_swiped_name TEXT;
+        v_notifications JSONB;
+    BEGIN
+        -- Serializa swipes do mesmo par: likes simultâneos nos dois sentidos
+        -- sempre enxergam um ao outro e o match é criado uma única vez
+        PERFORM pg_advisory_xact_lock(
+            LEAST(p_swiper_id, p_swiped_id), GREATEST(p_swiper_id, p_swiped_id)
+        );
+
+        INSERT INTO swipes (swiper_id, swiped_id, direction)
+        VALUES (p_swiper_id, p_swiped_id, p_direction)
+        ON CONFLICT (swiper_id, swiped_id) DO UPDATE
+        SET direction = EXCLUDED.direction;
+
+        SELECT u.name INTO v_swiper_name FROM users u WHERE u.user_id = p_swiper_id;
+
+        IF p_direction = 'like' THEN
+            -- Reciprocidade (uma busca no índice único de swipes) e match no mesmo comando
+            INSERT INTO matches (user1_id, user2_id)
+            SELECT LEAST(p_swiper_id, p_swiped_id), GREATEST(p_swiper_id, p_swiped_id)
+            WHERE EXISTS (
+                SELECT 1 FROM swipes s
+                WHERE s.swiper_id = p_swiped_id
+                  AND s.swiped_id = p_swiper_id
+                  AND s.direction = 'like'
+            )
+            ON CONFLICT (user1_id, user2_id) DO NOTHING
+            RETURNING match_id INTO v_match_id;
+
+            IF v_match_id IS NOT NULL THEN
+                INSERT INTO chats (match_id) VALUES (v_match_id)
+                RETURNING chat_id INTO v_chat_id;
+
+                SELECT u.name INTO v_swiped_name FROM users u WHERE u.user_id = p_swiped_id;
+
+                WITH inserted AS (
+                    INSERT INTO notifications (user_id, type, content, related_user_id)
+                    VALUES
+                        (p_swiper_id, 'match',
+                         'Você tem um novo match com ' || COALESCE(v_swiped_name, 'alguém') || '! 💕',
+                         p_swiped_id),
+                        (p_swiped_id, 'match',
+                         'Você tem um novo match com ' || COALESCE(v_swiper_name, 'alguém') || '! 💕',
+                         p_swiper_id)
+                    RETURNING user_id, type, content, created_at
+                )
+                SELECT jsonb_agg(to_jsonb(inserted)) INTO v_notifications FROM inserted;
+            ELSE
+                -- Like: não é gravado aqui; a aplicação grava pelo writer de
+                -- notificações (coalescência e resumo de rajadas)
+                v_notifications := jsonb_build_array(jsonb_build_object(
+                    'user_id', p_swiped_id,
+                    'type', 'like',
+                    'content', COALESCE(v_swiper_name, 'Alguém') || ' curtiu seu perfil! ❤️',
+                    'related_user_id', p_swiper_id,
+                    'created_at', NOW()
+                ));
+            END IF;
+        ELSE
+            WITH inserted AS (
+                INSERT INTO notifications (user_id, type, content, related_user_id)
+                VALUES (p_swiped_id, 'unlike',
+                        COALESCE(v_swiper_name, 'Alguém') || ' descurtiu seu perfil 💔',
+                        p_swiper_id)
+                RETURNING user_id, type, content, created_at
+            )
+            SELECT jsonb_agg(to_jsonb(inserted)) INTO v_notifications FROM inserted;
+        END IF;
+
+        RETURN QUERY SELECT v_match_id, v_chat_id, COALESCE(v_notifications, '[]'::jsonb);
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+    op.execute("""
+    CREATE OR REPLACE FUNCTION process_swipes_batch(
+        p_swiper_ids INT[], p_swiped_ids INT[], p_directions VARCHAR[]
+    ) RETURNS TABLE (processed INT, created_matches JSONB, created_notifications JSONB) AS $$
+    DECLARE
+        v_swipers INT[];
+        v_swipeds INT[];
+        v_directions VARCHAR[];
+        v_ords INT[];
+        v_pair RECORD;
+        v_matches JSONB;
+        v_notifications JSONB;
+    BEGIN
+        SELECT array_agg(t.s ORDER BY t.ord), array_agg(t.d ORDER BY t.ord),
+               array_agg(t.dir ORDER BY t.ord), array_agg(t.ord ORDER BY t.ord)
+        INTO v_swipers, v_swipeds, v_directions, v_ords
+        FROM (
+            SELECT DISTINCT ON (b.s, b.d) b.s, b.d, b.dir, b.ord::INT AS ord
+            FROM UNNEST(p_swiper_ids, p_swiped_ids, p_directions)
+                 WITH ORDINALITY AS b(s, d, dir, ord)
+            ORDER BY b.s, b.d, b.ord DESC
+        ) t;
+
+        IF v_swipers IS NULL THEN
+            RETURN QUERY SELECT 0, '[]'::jsonb, '[]'::jsonb;
+            RETURN;
+        END IF;
+
+        -- Mesmo lock por par de process_swipe, em ordem fixa para não haver deadlock
+        FOR v_pair IN
+            SELECT DISTINCT LEAST(b.s, b.d) AS a, GREATEST(b.s, b.d) AS z
+            FROM UNNEST(v_swipers, v_swipeds) AS b(s, d)
+            ORDER BY 1, 2
+        LOOP
+            PERFORM pg_advisory_xact_lock(v_pair.a, v_pair.z);
+        END LOOP;
+
+        -- Ordem fixa (e não a do replay): os triggers de fame travam user_stats/users
+        -- dos usuários curtidos, e lotes concorrentes precisam travar na mesma ordem
+        INSERT INTO swipes (swiper_id, swiped_id, direction)
+        SELECT b.s, b.d, b.dir
+        FROM UNNEST(v_swipers, v_swipeds, v_directions) AS b(s, d, dir)
+        ORDER BY b.d, b.s
+        ON CONFLICT (swiper_id, swiped_id) DO UPDATE
+        SET direction = EXCLUDED.direction;
+
+        -- Todos os likes mútuos do lote em uma consulta (índice único de swipes)
+        WITH new_matches AS (
+            INSERT INTO matches (user1_id, user2_id)
+            SELECT DISTINCT LEAST(b.s, b.d), GREATEST(b.s, b.d)
+            FROM UNNEST(v_swipers, v_swipeds, v_directions) AS b(s, d, dir)
+            JOIN swipes r
+              ON r.swiper_id = b.d AND r.swiped_id = b.s AND r.direction = 'like'
+            WHERE b.dir = 'like'
+            ORDER BY 1, 2
+            ON CONFLICT (user1_id, user2_id) DO NOTHING
+            RETURNING match_id, user1_id, user2_id
+        ), new_chats AS (
+            INSERT INTO chats (match_id)
+            SELECT match_id FROM new_matches
+            RETURNING chat_id, match_id
+        )
+        SELECT jsonb_agg(jsonb_build_object(
+                   'match_id', m.match_id, 'chat_id', c.chat_id,
+                   'user1_id', m.user1_id, 'user2_id', m.user2_id))
+        INTO v_matches
+        FROM new_matches m JOIN new_chats c ON c.match_id = m.match_id;
+
+        WITH batch AS (
+            SELECT * FROM UNNEST(v_swipers, v_swipeds, v_directions, v_ords) AS b(s, d, dir, ord)
+        ), new_matches AS (
+            SELECT * FROM jsonb_to_recordset(COALESCE(v_matches, '[]'::jsonb))
+                AS m(match_id INT, chat_id INT, user1_id INT, user2_id INT)
+        ), creators AS (
+            -- O swipe que criou o match: o último like do par no lote
+            SELECT DISTINCT ON (m.match_id) b.s, b.d
+            FROM new_matches m
+            JOIN batch b
+              ON LEAST(b.s, b.d) = m.user1_id AND GREATEST(b.s, b.d) = m.user2_id
+             AND b.dir = 'like'
+            ORDER BY m.match_id, b.ord DESC
+        ), pending AS (
+            SELECT c.s AS user_id, 'match' AS type,
+                   'Você tem um novo match com ' || COALESCE(ud.name, 'alguém') || '! 💕' AS content,
+                   c.d AS related_user_id
+            FROM creators c LEFT JOIN users ud ON ud.user_id = c.d
+            UNION ALL
+            SELECT c.d, 'match',
+                   'Você tem um novo match com ' || COALESCE(us.name, 'alguém') || '! 💕',
+                   c.s
+            FROM creators c LEFT JOIN users us ON us.user_id = c.s
+            UNION ALL
+            SELECT b.d, 'like', COALESCE(us.name, 'Alguém') || ' curtiu seu perfil! ❤️', b.s
+            FROM batch b LEFT JOIN users us ON us.user_id = b.s
+            WHERE b.dir = 'like'
+              AND NOT EXISTS (SELECT 1 FROM creators c WHERE c.s = b.s AND c.d = b.d)
+            UNION ALL
+            SELECT b.d, 'unlike', COALESCE(us.name, 'Alguém') || ' descurtiu seu perfil 💔', b.s
+            FROM batch b LEFT JOIN users us ON us.user_id = b.s
+            WHERE b.dir = 'dislike'
+        ), inserted AS (
+            -- Likes não são gravados aqui (como em process_swipe): a aplicação
+            -- grava pelo writer de notificações (coalescência e resumo de rajadas)
+            INSERT INTO notifications (user_id, type, content, related_user_id)
+            SELECT user_id, type, content, related_user_id FROM pending
+            WHERE type <> 'like'
+            RETURNING user_id, type, content, created_at
+        )
+        SELECT COALESCE((SELECT jsonb_agg(to_jsonb(inserted)) FROM inserted), '[]'::jsonb)
+               || COALESCE((
+                   SELECT jsonb_agg(jsonb_build_object(
+                       'user_id', p.user_id, 'type', p.type, 'content', p.content,
+                       'related_user_id', p.related_user_id, 'created_at', NOW()))
+                   FROM pending p
+                   WHERE p.type = 'like'
+               ), '[]'::jsonb)
+        INTO v_notifications;
+
+        RETURN QUERY SELECT
+            array_length(v_swipers, 1),
+            COALESCE(v_matches, '[]'::jsonb),
+            COALESCE(v_notifications, '[]'::jsonb);
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+
+def downgrade() -> None:
+    # Restaurar as versões de 020 e 021 (likes gravados na função)
+    op.execute("""
+    CREATE OR REPLACE FUNCTION process_swipe(
+        p_swiper_id INT, p_swiped_id INT, p_direction VARCHAR
+    ) RETURNS TABLE (new_match_id INT, new_chat_id INT, created_notifications JSONB) AS $$
+    DECLARE
+        v_match_id INT;
+        v_chat_id INT;
+        v_swiper_name TEXT;
+        v_swiped_name TEXT;
+        v_notifications JSONB;
+    BEGIN
+        -- Serializa swipes do mesmo par: likes simultâneos nos dois sentidos
+        -- sempre enxergam um ao outro e o match é criado uma única vez
+        PERFORM pg_advisory_xact_lock(
+            LEAST(p_swiper_id, p_swiped_id), GREATEST(p_swiper_id, p_swiped_id)
+        );
+
+        INSERT INTO swipes (swiper_id, swiped_id, direction)
+        VALUES (p_swiper_id, p_swiped_id, p_direction)
+        ON CONFLICT (swiper_id, swiped_id) DO UPDATE
+        SET direction = EXCLUDED.direction;
+
+        SELECT u.name INTO v_swiper_name FROM users u WHERE u.user_id = p_swiper_id;
+
+        IF p_direction = 'like' THEN
+            -- Reciprocidade (uma busca no índice único de swipes) e match no mesmo comando
+            INSERT INTO matches (user1_id, user2_id)
+            SELECT LEAST(p_swiper_id, p_swiped_id), GREATEST(p_swiper_id, p_swiped_id)
+            WHERE EXISTS (
+                SELECT 1 FROM swipes s
+                WHERE s.swiper_id = p_swiped_id
+                  AND s.swiped_id = p_swiper_id
+                  AND s.direction = 'like'
+            )
+            ON CONFLICT (user1_id, user2_id) DO NOTHING
+            RETURNING match_id INTO v_match_id;
+
+            IF v_match_id IS NOT NULL THEN
+                INSERT INTO chats (match_id) VALUES (v_match_id)
+                RETURNING chat_id INTO v_chat_id;
+
+                SELECT u.name INTO v_swiped_name FROM users u WHERE u.user_id = p_swiped_id;
+
+                WITH inserted AS (
+                    INSERT INTO notifications (user_id, type, content, related_user_id)
+                    VALUES
+                        (p_swiper_id, 'match',
+                         'Você tem um novo match com ' || COALESCE(v_swiped_name, 'alguém') || '! 💕',
+                         p_swiped_id),
+                        (p_swiped_id, 'match',
+                         'Você tem um novo match com ' || COALESCE(v_swiper_name, 'alguém') || '! 💕',
+                         p_swiper_id)
+                    RETURNING user_id, type, content, created_at
+                )
+                SELECT jsonb_agg(to_jsonb(inserted)) INTO v_notifications FROM inserted;
+            ELSE
+                WITH inserted AS (
+                    INSERT INTO notifications (user_id, type, content, related_user_id)
+                    VALUES (p_swiped_id, 'like',
+                            COALESCE(v_swiper_name, 'Alguém') || ' curtiu seu perfil! ❤️',
+                            p_swiper_id)
+                    RETURNING user_id, type, content, created_at
+                )
+                SELECT jsonb_agg(to_jsonb(inserted)) INTO v_notifications FROM inserted;
+            END IF;
+        ELSE
+            WITH inserted AS (
+                INSERT INTO notifications (user_id, type, content, related_user_id)
+                VALUES (p_swiped_id, 'unlike',
+                        COALESCE(v_swiper_name, 'Alguém') || ' descurtiu seu perfil 💔',
+                        p_swiper_id)
+                RETURNING user_id, type, content, created_at
+            )
+            SELECT jsonb_agg(to_jsonb(inserted)) INTO v_notifications FROM inserted;
+        END IF;
+
+        RETURN QUERY SELECT v_match_id, v_chat_id, COALESCE(v_notifications, '[]'::jsonb);
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+    op.execute("""
+    CREATE OR REPLACE FUNCTION process_swipes_batch(
+        p_swiper_ids INT[], p_swiped_ids INT[], p_directions VARCHAR[]
+    ) RETURNS TABLE (processed INT, created_matches JSONB, created_notifications JSONB) AS $$
+    DECLARE
+        v_swipers INT[];
+        v_swipeds INT[];
+        v_directions VARCHAR[];
+        v_ords INT[];
+        v_pair RECORD;
+        v_matches JSONB;
+        v_notifications JSONB;
+    BEGIN
+        SELECT array_agg(t.s ORDER BY t.ord), array_agg(t.d ORDER BY t.ord),
+               array_agg(t.dir ORDER BY t.ord), array_agg(t.ord ORDER BY t.ord)
+        INTO v_swipers, v_swipeds, v_directions, v_ords
+        FROM (
+            SELECT DISTINCT ON (b.s, b.d) b.s, b.d, b.dir, b.ord::INT AS ord
+            FROM UNNEST(p_swiper_ids, p_swiped_ids, p_directions)
+                 WITH ORDINALITY AS b(s, d, dir, ord)
+            ORDER BY b.s, b.d, b.ord DESC
+        ) t;
+
+        IF v_swipers IS NULL THEN
+            RETURN QUERY SELECT 0, '[]'::jsonb, '[]'::jsonb;
+            RETURN;
+        END IF;
+
+        -- Mesmo lock por par de process_swipe, em ordem fixa para não haver deadlock
+        FOR v_pair IN
+            SELECT DISTINCT LEAST(b.s, b.d) AS a, GREATEST(b.s, b.d) AS z
+            FROM UNNEST(v_swipers, v_swipeds) AS b(s, d)
+            ORDER BY 1, 2
+        LOOP
+            PERFORM pg_advisory_xact_lock(v_pair.a, v_pair.z);
+        END LOOP;
+
+        -- Ordem fixa (e não a do replay): os triggers de fame travam user_stats/users
+        -- dos usuários curtidos, e lotes concorrentes precisam travar na mesma ordem
+        INSERT INTO swipes (swiper_id, swiped_id, direction)
+        SELECT b.s, b.d, b.dir
+        FROM UNNEST(v_swipers, v_swipeds, v_directions) AS b(s, d, dir)
+        ORDER BY b.d, b.s
+        ON CONFLICT (swiper_id, swiped_id) DO UPDATE
+        SET direction = EXCLUDED.direction;
+
+        -- Todos os likes mútuos do lote em uma consulta (índice único de swipes)
+        WITH new_matches AS (
+            INSERT INTO matches (user1_id, user2_id)
+            SELECT DISTINCT LEAST(b.s, b.d), GREATEST(b.s, b.d)
+            FROM UNNEST(v_swipers, v_swipeds, v_directions) AS b(s, d, dir)
+            JOIN swipes r
+              ON r.swiper_id = b.d AND r.swiped_id = b.s AND r.direction = 'like'
+            WHERE b.dir = 'like'
+            ORDER BY 1, 2
+            ON CONFLICT (user1_id, user2_id) DO NOTHING
+            RETURNING match_id, user1_id, user2_id
+        ), new_chats AS (
+            INSERT INTO chats (match_id)
+            SELECT match_id FROM new_matches
+            RETURNING chat_id, match_id
+        )
+        SELECT jsonb_agg(jsonb_build_object(
+                   'match_id', m.match_id, 'chat_id', c.chat_id,
+                   'user1_id', m.user1_id, 'user2_id', m.user2_id))
+        INTO v_matches
+        FROM new_matches m JOIN new_chats c ON c.match_id = m.match_id;
+
+        WITH batch AS (
+            SELECT * FROM UNNEST(v_swipers, v_swipeds, v_directions, v_ords) AS b(s, d, dir, ord)
+        ), new_matches AS (
+            SELECT * FROM jsonb_to_recordset(COALESCE(v_matches, '[]'::jsonb))
+                AS m(match_id INT, chat_id INT, user1_id INT, user2_id INT)
+        ), creators AS (
+            -- O swipe que criou o match: o último like do par no lote
+            SELECT DISTINCT ON (m.match_id) b.s, b.d
+            FROM new_matches m
+            JOIN batch b
+              ON LEAST(b.s, b.d) = m.user1_id AND GREATEST(b.s, b.d) = m.user2_id
+             AND b.dir = 'like'
+            ORDER BY m.match_id, b.ord DESC
+        ), pending AS (
+            SELECT c.s AS user_id, 'match' AS type,
+                   'Você tem um novo match com ' || COALESCE(ud.name, 'alguém') || '! 💕' AS content,
+                   c.d AS related_user_id
+            FROM creators c LEFT JOIN users ud ON ud.user_id = c.d
+            UNION ALL
+            SELECT c.d, 'match',
+                   'Você tem um novo match com ' || COALESCE(us.name, 'alguém') || '! 💕',
+                   c.s
+            FROM creators c LEFT JOIN users us ON us.user_id = c.s
+            UNION ALL
+            SELECT b.d, 'like', COALESCE(us.name, 'Alguém') || ' curtiu seu perfil! ❤️', b.s
+            FROM batch b LEFT JOIN users us ON us.user_id = b.s
+            WHERE b.dir = 'like'
+              AND NOT EXISTS (SELECT 1 FROM creators c WHERE c.s = b.s AND c.d = b.d)
+            UNION ALL
+            SELECT b.d, 'unlike', COALESCE(us.name, 'Alguém') || ' descurtiu seu perfil 💔', b.s
+            FROM batch b LEFT JOIN users us ON us.user_id = b.s
+            WHERE b.dir = 'dislike'
+        ), inserted AS (
+            INSERT INTO notifications (user_id, type, content, related_user_id)
+            SELECT user_id, type, content, related_user_id FROM pending
+            RETURNING user_id, type, content, created_at
+        )
+        SELECT jsonb_agg(to_jsonb(inserted)) INTO v_notifications FROM inserted;
+
+        RETURN QUERY SELECT
+            array_length(v_swipers, 1),
+            COALESCE(v_matches, '[]'::jsonb),
+            COALESCE(v_notifications, '[]'::jsonb);
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
@@ -1,17 +1,56 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from app.db import init_pool, close_pool
+from app.utils.auth_cache import run_blacklist_listener
+from app.utils.discover_feed import run_feed_maintenance
+from app.utils.fame import run_fame_reconciliation, run_fame_worker
+from app.utils.location_updates import run_location_flusher
+from app.utils.message_buffer import run_message_flusher
+from app.utils.notification_buffer import run_notification_flusher
+from app.utils.presence import run_presence_flusher
+from app.utils.pagination import NEXT_CURSOR_HEADER
+from app.utils.realtime import start_realtime, stop_realtime
+from app.utils.passwords import shutdown_password_executor
 from app.routers import (
     users, profiles, preferences, swipes, matches,
     chats, messages, notifications, views, tags,
     blocks, reports, auth, status, map, ws_chat, ws_notifications, ws_map
 )
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Inicializa e encerra recursos compartilhados da aplicação"""
+    await init_pool()
+    await start_realtime()
+    background_tasks = [
+        asyncio.create_task(run_feed_maintenance()),
+        asyncio.create_task(run_fame_reconciliation()),
+        asyncio.create_task(run_fame_worker()),
+        asyncio.create_task(run_blacklist_listener()),
+        asyncio.create_task(run_location_flusher()),
+        asyncio.create_task(run_message_flusher()),
+        asyncio.create_task(run_notification_flusher()),
+        asyncio.create_task(run_presence_flusher()),
+    ]
+    try:
+        yield
+    finally:
+        for task in background_tasks:
+            task.cancel()
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+        await stop_realtime()
+        shutdown_password_executor()
+        await close_pool()
+
 app = FastAPI(
     title="Matcha Clone API",
     description="API para aplicação de encontros estilo Tinder",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # Configurar CORS
@@ -21,6 +60,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Incluir routers REST
@@ -13,9 +13,14 @@ from pydantic import BaseModel
 class GoogleCodeIn(BaseModel):
     code: str
     redirect_uri: str
-from app.utils.passwords import validate_password, hash_password, verify_password
+from app.utils.passwords import validate_password, hash_password_async, verify_password_async
 from app.utils.email import send_email
+from app.utils import presence
 from app.utils.jwt import create_access_token, verify_token, get_jti_from_token
+from app.utils.auth_cache import (
+    decode_token_cached, is_token_blacklisted, add_to_blacklist,
+    get_cached_user, cache_user, invalidate_user, token_cache
+)
 from app.utils.google_oauth import (
     get_google_user_info, get_google_auth_url, 
     exchange_code_for_token, GoogleOAuthError
@@ -33,17 +38,19 @@ async def get_current_user(token: str = Depends(oauth2_scheme), conn=Depends(get
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    payload = verify_token(token)
+    payload = decode_token_cached(token)
     if payload is None:
         raise credentials_exception
     
-    # Verificar se token está na blacklist
+    # Verificar se token está na blacklist (em memória; banco se não sincronizada)
     jti = payload.get("jti")
     if jti:
-        blacklisted = await conn.fetchrow(
-            "SELECT token_id FROM blacklisted_tokens WHERE token_jti = $1", 
-            jti
-        )
+        blacklisted = is_token_blacklisted(jti)
+        if blacklisted is None:
+            blacklisted = await conn.fetchrow(
+                "SELECT token_id FROM blacklisted_tokens WHERE token_jti = $1", 
+                jti
+            ) is not None
         if blacklisted:
             raise credentials_exception
     
@@ -58,18 +65,22 @@ async def get_current_user(token: str = Depends(oauth2_scheme), conn=Depends(get
         raise credentials_exception
     
     # Verificar se usuário existe e está verificado
-    user = await conn.fetchrow(
-        "SELECT user_id, name, email, username, is_verified FROM users WHERE user_id = $1", 
-        user_id
-    )
+    user = get_cached_user(user_id)
     if user is None:
-        raise credentials_exception
+        row = await conn.fetchrow(
+            "SELECT user_id, name, email, username, is_verified FROM users WHERE user_id = $1", 
+            user_id
+        )
+        if row is None:
+            raise credentials_exception
+        user = dict(row)
+        cache_user(user)
     
     # Para testes, não exigir verificação
     # if not user["is_verified"]:
     #     raise credentials_exception
     
-    return dict(user)
+    return user
 
 @router.post("/login", response_model=LoginOut)
 async def login(form_data: OAuth2PasswordRequestForm = Depends(), conn=Depends(get_connection)):
@@ -80,7 +91,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), conn=Depends(g
         form_data.username
     )
     
-    if not user or not verify_password(form_data.password, user["password_hash"]):
+    if not user or not await verify_password_async(form_data.password, user["password_hash"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -94,11 +105,12 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), conn=Depends(g
     #         detail="Email not verified"
     #     )
     
-    # Atualizar last_login
+    # Atualizar last_login; o login também conta como atividade (online)
     await conn.execute(
-        "UPDATE users SET last_login = NOW() WHERE user_id = $1", 
+        "UPDATE users SET last_login = NOW(), last_seen = NOW() WHERE user_id = $1", 
         user["user_id"]
     )
+    await presence.heartbeat(user["user_id"])
     
     # Criar token JWT
     access_token, jti = create_access_token(data={"sub": user["user_id"]})
@@ -169,6 +181,7 @@ async def verify_email(token: str, conn=Depends(get_connection)):
         "UPDATE users SET is_verified = TRUE WHERE user_id = $1", 
         verification["user_id"]
     )
+    invalidate_user(verification["user_id"])
     
     # Remover token usado
     await conn.execute("DELETE FROM email_verifications WHERE token = $1", token)
@@ -238,7 +251,7 @@ async def reset_password(data: ResetPasswordIn, conn=Depends(get_connection)):
         raise HTTPException(status_code=400, detail=error)
     
     # Atualizar senha
-    hashed = hash_password(data.new_password)
+    hashed = await hash_password_async(data.new_password)
     await conn.execute(
         "UPDATE users SET password_hash = $1 WHERE user_id = $2", 
         hashed, reset["user_id"]
@@ -285,6 +298,10 @@ async def logout(token: str = Depends(oauth2_scheme), conn=Depends(get_connectio
         ON CONFLICT (token_jti) DO NOTHING
     """, jti, user_id, expires_at)
     
+    # Efeito imediato neste processo; os demais recebem via NOTIFY
+    add_to_blacklist(jti, expires_at)
+    token_cache.pop(token)
+    
     return {"message": "Logout successful"}
 
 @router.get("/me", response_model=dict)
@@ -347,6 +364,7 @@ async def google_callback_post(data: GoogleCodeIn, conn=Depends(get_connection))
                     "UPDATE users SET name = $1 WHERE user_id = $2",
                     google_user.name, user_id
                 )
+                invalidate_user(user_id)
             
             # Marcar como verificado se não estiver
             if not existing_user["is_verified"]:
@@ -354,6 +372,7 @@ async def google_callback_post(data: GoogleCodeIn, conn=Depends(get_connection))
                     "UPDATE users SET is_verified = TRUE WHERE user_id = $1",
                     user_id
                 )
+                invalidate_user(user_id)
         else:
             # Usuário não existe - criar novo
             is_new_user = True
@@ -381,11 +400,12 @@ async def google_callback_post(data: GoogleCodeIn, conn=Depends(get_connection))
             
             user_id = result["user_id"]
         
-        # Atualizar last_login
+        # Atualizar last_login; o login também conta como atividade (online)
         await conn.execute(
-            "UPDATE users SET last_login = NOW() WHERE user_id = $1",
+            "UPDATE users SET last_login = NOW(), last_seen = NOW() WHERE user_id = $1",
             user_id
         )
+        await presence.heartbeat(user_id)
         
         # Criar token JWT
         jwt_token, jti = create_access_token(data={"sub": user_id})
@@ -448,6 +468,7 @@ async def google_callback(code: str = Query(...), conn=Depends(get_connection)):
                     "UPDATE users SET name = $1 WHERE user_id = $2",
                     google_user.name, user_id
                 )
+                invalidate_user(user_id)
             
             # Marcar como verificado se não estiver
             if not existing_user["is_verified"]:
@@ -455,6 +476,7 @@ async def google_callback(code: str = Query(...), conn=Depends(get_connection)):
                     "UPDATE users SET is_verified = TRUE WHERE user_id = $1",
                     user_id
                 )
+                invalidate_user(user_id)
         else:
             # Usuário não existe - criar novo
             is_new_user = True
@@ -482,11 +504,12 @@ async def google_callback(code: str = Query(...), conn=Depends(get_connection)):
             
             user_id = result["user_id"]
         
-        # Atualizar last_login
+        # Atualizar last_login; o login também conta como atividade (online)
         await conn.execute(
-            "UPDATE users SET last_login = NOW() WHERE user_id = $1",
+            "UPDATE users SET last_login = NOW(), last_seen = NOW() WHERE user_id = $1",
             user_id
         )
+        await presence.heartbeat(user_id)
         
         # Criar token JWT
         jwt_token, jti = create_access_token(data={"sub": user_id})
@@ -539,6 +562,7 @@ async def google_token_login(data: GoogleOAuthIn, conn=Depends(get_connection)):
                     "UPDATE users SET name = $1 WHERE user_id = $2",
                     google_user.name, user_id
                 )
+                invalidate_user(user_id)
             
             # Marcar como verificado se não estiver
             if not existing_user["is_verified"]:
@@ -546,6 +570,7 @@ async def google_token_login(data: GoogleOAuthIn, conn=Depends(get_connection)):
                     "UPDATE users SET is_verified = TRUE WHERE user_id = $1",
                     user_id
                 )
+                invalidate_user(user_id)
         else:
             # Usuário não existe - criar novo
             is_new_user = True
@@ -573,11 +598,12 @@ async def google_token_login(data: GoogleOAuthIn, conn=Depends(get_connection)):
             
             user_id = result["user_id"]
         
-        # Atualizar last_login
+        # Atualizar last_login; o login também conta como atividade (online)
         await conn.execute(
-            "UPDATE users SET last_login = NOW() WHERE user_id = $1",
+            "UPDATE users SET last_login = NOW(), last_seen = NOW() WHERE user_id = $1",
             user_id
         )
+        await presence.heartbeat(user_id)
         
         # Criar token JWT
         jwt_token, jti = create_access_token(data={"sub": user_id})
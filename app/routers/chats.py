@@ -20,6 +20,8 @@ async def get_user_chats(user_id: int, conn=Depends(get_connection)):
 @router.get("/{user_id}/with-profiles", response_model=list)
 async def get_chats_with_profiles(user_id: int, conn=Depends(get_connection)):
     """Obter chats com informações dos perfis"""
+    # Última mensagem e não lidas vêm dos contadores mantidos por trigger
+    # (chats.last_message_* e chat_members.unread_count)
     rows = await conn.fetch("""
         SELECT c.chat_id, c.match_id,
                CASE 
@@ -28,9 +30,10 @@ async def get_chats_with_profiles(user_id: int, conn=Depends(get_connection)):
                END as user_id,
                u.name, p.avatar_url,
                COALESCE(last_msg.content, '') as last_message,
-               COALESCE(last_msg.sent_at, c.created_at) as last_message_time,
-               COALESCE(unread.count, 0) as unread_count
-        FROM chats c
+               COALESCE(c.last_message_at, c.created_at) as last_message_time,
+               cm.unread_count
+        FROM chat_members cm
+        JOIN chats c ON c.chat_id = cm.chat_id
         JOIN matches m ON c.match_id = m.match_id
         JOIN users u ON (
             CASE 
@@ -39,21 +42,8 @@ async def get_chats_with_profiles(user_id: int, conn=Depends(get_connection)):
             END = u.user_id
         )
         JOIN profiles p ON u.user_id = p.user_id
-        LEFT JOIN LATERAL (
-            SELECT content, sent_at
-            FROM messages
-            WHERE chat_id = c.chat_id
-            ORDER BY sent_at DESC
-            LIMIT 1
-        ) last_msg ON true
-        LEFT JOIN LATERAL (
-            SELECT COUNT(*) as count
-            FROM messages
-            WHERE chat_id = c.chat_id
-            AND sender_id != $1
-            AND is_read = false
-        ) unread ON true
-        WHERE m.user1_id = $1 OR m.user2_id = $1
+        LEFT JOIN messages last_msg ON last_msg.message_id = c.last_message_id
+        WHERE cm.user_id = $1
         ORDER BY last_message_time DESC
     """, user_id)
     
@@ -102,13 +92,9 @@ async def delete_chat(chat_id: int, conn=Depends(get_connection)):
 async def get_unread_count(user_id: int, conn=Depends(get_connection)):
     """Obter contagem de mensagens não lidas"""
     count = await conn.fetchval("""
-        SELECT COUNT(*)
-        FROM messages m
-        JOIN chats c ON m.chat_id = c.chat_id
-        JOIN matches mat ON c.match_id = mat.match_id
-        WHERE (mat.user1_id = $1 OR mat.user2_id = $1)
-        AND m.sender_id != $1
-        AND m.is_read = false
+        SELECT COALESCE(SUM(unread_count), 0)
+        FROM chat_members
+        WHERE user_id = $1
     """, user_id)
     
     return {"user_id": user_id, "unread_count": count}
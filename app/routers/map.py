@@ -2,8 +2,9 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import List, Optional
 from app.db import get_connection
 from app.schemas.map import MapUser, MapUsersResponse, MapFilters
-from app.utils.geo import calculate_distance
+from app.utils.geo import nearest_points, bounding_box
 from app.routers.auth import get_current_user
+from app.utils import presence
 
 router = APIRouter(prefix="/map", tags=["map"])
 
@@ -46,6 +47,7 @@ async def get_map_users(
     
     user_lat = user_data["latitude"]
     user_lon = user_data["longitude"]
+    min_lat, max_lat, min_lon, max_lon = bounding_box(user_lat, user_lon, max_distance_km)
     
     # Build the query
     query = """
@@ -61,10 +63,7 @@ async def get_map_users(
             p.location_visible,
             p.show_exact_location,
             p.location_precision,
-            CASE 
-                WHEN u.last_login > NOW() - INTERVAL '5 minutes' THEN true
-                ELSE false
-            END as is_online
+            u.last_seen
         FROM users u
         JOIN profiles p ON u.user_id = p.user_id
         WHERE u.user_id != $1
@@ -73,10 +72,12 @@ async def get_map_users(
         AND p.location_visible = true
         AND p.age >= $2
         AND p.age <= $3
+        AND p.latitude BETWEEN $4 AND $5
+        AND p.longitude BETWEEN $6 AND $7
     """
     
-    params = [current_user["user_id"], age_min, age_max]
-    param_count = 3
+    params = [current_user["user_id"], age_min, age_max, min_lat, max_lat, min_lon, max_lon]
+    param_count = 7
     
     # Add gender filter
     if gender != "both":
@@ -84,57 +85,62 @@ async def get_map_users(
         query += f" AND p.gender = ${param_count}"
         params.append(gender)
     
-    # Add online filter
+    # Add online filter (mesma regra do serviço de presença)
     if online_only:
-        query += " AND u.last_login > NOW() - INTERVAL '5 minutes'"
+        query += f" AND (u.last_seen > NOW() - make_interval(secs => ${param_count + 1})"
+        query += f" OR u.user_id = ANY(${param_count + 2}::int[]))"
+        params.extend([presence.PRESENCE_TIMEOUT_SECONDS, presence.local_online_ids()])
+        param_count += 2
     
     # Exclude blocked users
     query += """
-        AND u.user_id NOT IN (
-            SELECT blocked_id FROM blocked_users 
-            WHERE blocker_id = $1
+        AND NOT EXISTS (
+            SELECT 1 FROM blocked_users b
+            WHERE b.blocker_id = $1 AND b.blocked_id = u.user_id
         )
-        AND u.user_id NOT IN (
-            SELECT blocker_id FROM blocked_users 
-            WHERE blocked_id = $1
+        AND NOT EXISTS (
+            SELECT 1 FROM blocked_users b
+            WHERE b.blocker_id = u.user_id AND b.blocked_id = $1
         )
     """
     
     # Execute query
     users_data = await conn.fetch(query, *params)
     
-    # Calculate distances and filter by distance
+    # Calculate distances (vectorized) and filter by distance
+    indices, distances = nearest_points(
+        user_lat, user_lon,
+        [user["latitude"] for user in users_data],
+        [user["longitude"] for user in users_data],
+        radius_km=max_distance_km
+    )
+    
     map_users = []
-    for user in users_data:
-        distance = calculate_distance(
-            user_lat, user_lon, 
-            user["latitude"], user["longitude"]
-        )
+    for index, distance in zip(indices, distances):
+        user = users_data[index]
         
-        # Filter by distance
-        if distance <= max_distance_km:
-            # Apply location precision
-            lat, lon = user["latitude"], user["longitude"]
-            if not user["show_exact_location"] and user["location_precision"] > 1:
-                # Add random offset based on precision level
-                import random
-                offset_factor = user["location_precision"] * 0.001  # ~100m per level
-                lat += random.uniform(-offset_factor, offset_factor)
-                lon += random.uniform(-offset_factor, offset_factor)
-            
-            map_user = MapUser(
-                user_id=user["user_id"],
-                username=user["username"],
-                age=user["age"],
-                gender=user["gender"],
-                location=user["location"],
-                latitude=lat,
-                longitude=lon,
-                avatar_url=user["avatar_url"],
-                is_online=user["is_online"],
-                distance_km=round(distance, 1)
-            )
-            map_users.append(map_user)
+        # Apply location precision
+        lat, lon = user["latitude"], user["longitude"]
+        if not user["show_exact_location"] and user["location_precision"] > 1:
+            # Add random offset based on precision level
+            import random
+            offset_factor = user["location_precision"] * 0.001  # ~100m per level
+            lat += random.uniform(-offset_factor, offset_factor)
+            lon += random.uniform(-offset_factor, offset_factor)
+        
+        map_user = MapUser(
+            user_id=user["user_id"],
+            username=user["username"],
+            age=user["age"],
+            gender=user["gender"],
+            location=user["location"],
+            latitude=lat,
+            longitude=lon,
+            avatar_url=user["avatar_url"],
+            is_online=presence.is_online(user["user_id"], user["last_seen"]),
+            distance_km=round(float(distance), 1)
+        )
+        map_users.append(map_user)
     
     return MapUsersResponse(
         users=map_users,
@@ -168,8 +174,9 @@ async def get_nearby_users(
     
     user_lat = user_data["latitude"]
     user_lon = user_data["longitude"]
+    min_lat, max_lat, min_lon, max_lon = bounding_box(user_lat, user_lon, radius_km)
     
-    # Get all users with location data
+    # Get users inside the bounding box (exact distance is checked below)
     users_data = await conn.fetch("""
         SELECT DISTINCT
             u.user_id,
@@ -180,49 +187,49 @@ async def get_nearby_users(
             p.latitude,
             p.longitude,
             p.avatar_url,
-            CASE 
-                WHEN u.last_login > NOW() - INTERVAL '5 minutes' THEN true
-                ELSE false
-            END as is_online
+            u.last_seen
         FROM users u
         JOIN profiles p ON u.user_id = p.user_id
         WHERE u.user_id != $1
         AND p.latitude IS NOT NULL 
         AND p.longitude IS NOT NULL
         AND p.location_visible = true
-        AND u.user_id NOT IN (
-            SELECT blocked_id FROM blocked_users 
-            WHERE blocker_id = $1
+        AND p.latitude BETWEEN $2 AND $3
+        AND p.longitude BETWEEN $4 AND $5
+        AND NOT EXISTS (
+            SELECT 1 FROM blocked_users b
+            WHERE b.blocker_id = $1 AND b.blocked_id = u.user_id
         )
-        AND u.user_id NOT IN (
-            SELECT blocker_id FROM blocked_users 
-            WHERE blocked_id = $1
+        AND NOT EXISTS (
+            SELECT 1 FROM blocked_users b
+            WHERE b.blocker_id = u.user_id AND b.blocked_id = $1
         )
-    """, current_user["user_id"])
+    """, current_user["user_id"], min_lat, max_lat, min_lon, max_lon)
+    
+    # Calculate distances, filter by radius and keep the closest `limit` users
+    indices, distances = nearest_points(
+        user_lat, user_lon,
+        [user["latitude"] for user in users_data],
+        [user["longitude"] for user in users_data],
+        radius_km=radius_km,
+        top_k=limit
+    )
     
-    # Calculate distances and filter
     nearby_users = []
-    for user in users_data:
-        distance = calculate_distance(
-            user_lat, user_lon, 
-            user["latitude"], user["longitude"]
+    for index, distance in zip(indices, distances):
+        user = users_data[index]
+        map_user = MapUser(
+            user_id=user["user_id"],
+            username=user["username"],
+            age=user["age"],
+            gender=user["gender"],
+            location=user["location"],
+            latitude=user["latitude"],
+            longitude=user["longitude"],
+            avatar_url=user["avatar_url"],
+            is_online=presence.is_online(user["user_id"], user["last_seen"]),
+            distance_km=round(float(distance), 1)
         )
-        
-        if distance <= radius_km:
-            map_user = MapUser(
-                user_id=user["user_id"],
-                username=user["username"],
-                age=user["age"],
-                gender=user["gender"],
-                location=user["location"],
-                latitude=user["latitude"],
-                longitude=user["longitude"],
-                avatar_url=user["avatar_url"],
-                is_online=user["is_online"],
-                distance_km=round(distance, 1)
-            )
-            nearby_users.append(map_user)
-    
-    # Sort by distance and limit results
-    nearby_users.sort(key=lambda x: x.distance_km)
-    return nearby_users[:limit]
+        nearby_users.append(map_user)
+    
+    return nearby_users
@@ -1,7 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
+from typing import Optional
 from app.db import get_connection
 from app.schemas.messages import MessageIn, MessageOut, MessageWithSender
 from app.routers.ws_notifications import save_notification, push_notification
+from app.utils.pagination import decode_cursor, set_next_cursor
 from datetime import datetime
 
 router = APIRouter(prefix="/messages", tags=["messages"])
@@ -45,7 +47,7 @@ async def send_message(message: MessageIn, conn=Depends(get_connection)):
         # Criar notificação para o destinatário
         content = f"{recipient_info['sender_name']} enviou uma mensagem 💬"
         
-        # Salvar notificação no banco
+        # Salvar notificação (mensagens seguidas do mesmo remetente são gravadas uma vez só)
         await save_notification(conn, recipient_info['recipient_id'], "message", content, message.sender_id)
         
         # Enviar notificação em tempo real
@@ -60,32 +62,70 @@ async def send_message(message: MessageIn, conn=Depends(get_connection)):
     return {"message": "Message sent successfully"}
 
 @router.get("/{chat_id}", response_model=list)
-async def get_messages(chat_id: int, limit: int = 50, offset: int = 0, conn=Depends(get_connection)):
-    """Obter mensagens do chat"""
-    rows = await conn.fetch("""
+async def get_messages(
+    chat_id: int,
+    response: Response,
+    limit: int = 50,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    conn=Depends(get_connection)
+):
+    """Obter mensagens do chat (próxima página em X-Next-Cursor)"""
+    query = """
         SELECT m.message_id, m.chat_id, m.sender_id, m.content, m.sent_at, m.is_read
         FROM messages m
         WHERE m.chat_id = $1
-        ORDER BY m.sent_at DESC
-        LIMIT $2 OFFSET $3
-    """, chat_id, limit, offset)
+    """
+    params = [chat_id, limit]
     
-    return [dict(r) for r in rows]
+    if cursor:
+        sent_at, message_id = decode_cursor(cursor)
+        query += " AND (m.sent_at, m.message_id) < ($3, $4)"
+        params.extend([sent_at, message_id])
+    
+    query += " ORDER BY m.sent_at DESC, m.message_id DESC LIMIT $2"
+    
+    if not cursor:
+        query += " OFFSET $3"
+        params.append(offset)
+    
+    rows = [dict(r) for r in await conn.fetch(query, *params)]
+    set_next_cursor(response, rows, limit, "sent_at", "message_id")
+    return rows
 
 @router.get("/{chat_id}/with-senders", response_model=list)
-async def get_messages_with_senders(chat_id: int, limit: int = 50, offset: int = 0, conn=Depends(get_connection)):
-    """Obter mensagens com informações dos remetentes"""
-    rows = await conn.fetch("""
+async def get_messages_with_senders(
+    chat_id: int,
+    response: Response,
+    limit: int = 50,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    conn=Depends(get_connection)
+):
+    """Obter mensagens com informações dos remetentes (próxima página em X-Next-Cursor)"""
+    query = """
         SELECT m.message_id, m.chat_id, m.sender_id, u.name as sender_name,
                m.content, m.sent_at, m.is_read
         FROM messages m
         JOIN users u ON m.sender_id = u.user_id
         WHERE m.chat_id = $1
-        ORDER BY m.sent_at DESC
-        LIMIT $2 OFFSET $3
-    """, chat_id, limit, offset)
+    """
+    params = [chat_id, limit]
+    
+    if cursor:
+        sent_at, message_id = decode_cursor(cursor)
+        query += " AND (m.sent_at, m.message_id) < ($3, $4)"
+        params.extend([sent_at, message_id])
+    
+    query += " ORDER BY m.sent_at DESC, m.message_id DESC LIMIT $2"
+    
+    if not cursor:
+        query += " OFFSET $3"
+        params.append(offset)
     
-    return [dict(r) for r in rows]
+    rows = [dict(r) for r in await conn.fetch(query, *params)]
+    set_next_cursor(response, rows, limit, "sent_at", "message_id")
+    return rows
 
 @router.put("/{message_id}/read", response_model=dict)
 async def mark_message_read(message_id: int, conn=Depends(get_connection)):
@@ -118,7 +158,7 @@ async def mark_all_messages_read(chat_id: int, user_id: int, conn=Depends(get_co
     await conn.execute("""
         UPDATE messages 
         SET is_read = true 
-        WHERE chat_id = $1 AND sender_id != $2
+        WHERE chat_id = $1 AND sender_id != $2 AND is_read IS NOT TRUE
     """, chat_id, user_id)
     
     return {"message": "All messages marked as read"}
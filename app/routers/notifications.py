@@ -1,13 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
+from typing import Optional
 from app.db import get_connection
 from app.schemas.notifications import NotificationOut, NotificationCreate
+from app.utils.pagination import decode_cursor, set_next_cursor
 
 router = APIRouter(prefix="/notifications", tags=["notifications"])
 
 @router.get("/{user_id}", response_model=list)
-async def get_notifications(user_id: int, limit: int = 20, offset: int = 0, conn=Depends(get_connection)):
-    """Obter notificações do usuário"""
-    rows = await conn.fetch("""
+async def get_notifications(
+    user_id: int,
+    response: Response,
+    limit: int = 20,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    conn=Depends(get_connection)
+):
+    """Obter notificações do usuário (próxima página em X-Next-Cursor)"""
+    query = """
         SELECT 
             n.*,
             u.name as related_user_name,
@@ -17,11 +26,23 @@ async def get_notifications(user_id: int, limit: int = 20, offset: int = 0, conn
         LEFT JOIN users u ON n.related_user_id = u.user_id
         LEFT JOIN profiles p ON n.related_user_id = p.user_id
         WHERE n.user_id = $1
-        ORDER BY n.created_at DESC
-        LIMIT $2 OFFSET $3
-    """, user_id, limit, offset)
+    """
+    params = [user_id, limit]
     
-    return [dict(r) for r in rows]
+    if cursor:
+        created_at, notification_id = decode_cursor(cursor)
+        query += " AND (n.created_at, n.notification_id) < ($3, $4)"
+        params.extend([created_at, notification_id])
+    
+    query += " ORDER BY n.created_at DESC, n.notification_id DESC LIMIT $2"
+    
+    if not cursor:
+        query += " OFFSET $3"
+        params.append(offset)
+    
+    rows = [dict(r) for r in await conn.fetch(query, *params)]
+    set_next_cursor(response, rows, limit, "created_at", "notification_id")
+    return rows
 
 @router.get("/{user_id}/unread", response_model=list)
 async def get_unread_notifications(user_id: int, conn=Depends(get_connection)):
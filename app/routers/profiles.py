@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, Request
 from app.db import get_connection
 from app.schemas.profiles import ProfileCreate, ProfileOut, ProfileUpdate
 from app.utils.geo import get_geo_from_ip
+from app.utils.discover_feed import get_candidates
 
 router = APIRouter(prefix="/profiles", tags=["profiles"])
 
@@ -214,66 +215,8 @@ async def discover_profiles(user_id: int, limit: int = 10, conn=Depends(get_conn
     # Debug: imprimir preferências
     print(f"DEBUG: User {user_id} preferences: {dict(prefs)}")
     
-    # Obter usuários já visualizados
-    viewed_users = await conn.fetch("""
-        SELECT DISTINCT viewed_id FROM profile_views WHERE viewer_id = $1
-    """, user_id)
-    viewed_ids = [int(row["viewed_id"]) for row in viewed_users]
-    
-    # Obter usuários já com swipe
-    swiped_users = await conn.fetch("""
-        SELECT DISTINCT swiped_id FROM swipes WHERE swiper_id = $1
-    """, user_id)
-    swiped_ids = [int(row["swiped_id"]) for row in swiped_users]
-    
-    # Obter usuários bloqueados (que o usuário bloqueou)
-    blocked_users = await conn.fetch("""
-        SELECT DISTINCT blocked_id FROM blocked_users WHERE blocker_id = $1
-    """, user_id)
-    blocked_ids = [int(row["blocked_id"]) for row in blocked_users]
-    
-    # Obter usuários que bloquearam o usuário atual
-    blocked_by_users = await conn.fetch("""
-        SELECT DISTINCT blocker_id FROM blocked_users WHERE blocked_id = $1
-    """, user_id)
-    blocked_by_ids = [int(row["blocker_id"]) for row in blocked_by_users]
-    
-    # Combinar listas de exclusão
-    exclude_ids = list(set(viewed_ids + swiped_ids + blocked_ids + blocked_by_ids + [user_id]))
-    
-    # Se não há IDs para excluir, usar uma lista com o próprio usuário
-    if not exclude_ids:
-        exclude_ids = [user_id]
-    
-    # Debug: imprimir IDs de exclusão
-    print(f"DEBUG: Exclude IDs: {exclude_ids}")
-    
-    # Query para descobrir perfis
-    rows = await conn.fetch("""
-        SELECT u.user_id, u.name, u.fame_rating,
-               p.age, p.bio, p.gender, p.avatar_url,
-               (6371 * acos(
-                   cos(radians($1)) * cos(radians(p.latitude)) *
-                   cos(radians(p.longitude) - radians($2)) +
-                   sin(radians($1)) * sin(radians(p.latitude))
-               )) AS distance
-        FROM users u
-        JOIN profiles p ON u.user_id = p.user_id
-        WHERE u.user_id <> ALL($3)
-          AND p.age BETWEEN $4 AND $5
-          AND ($6 = 'both' OR p.gender = $6)
-          AND (6371 * acos(
-                   cos(radians($1)) * cos(radians(p.latitude)) *
-                   cos(radians(p.longitude) - radians($2)) +
-                   sin(radians($1)) * sin(radians(p.latitude))
-              )) <= $7
-        ORDER BY u.fame_rating DESC, distance ASC
-        LIMIT $8
-    """, prefs["latitude"], prefs["longitude"], exclude_ids,
-         prefs["age_min"], prefs["age_max"], prefs["preferred_gender"], 
-         prefs["max_distance_km"], limit)
-    
-    return [dict(r) for r in rows]
+    # Servir a partir da fila pré-calculada de candidatos
+    return await get_candidates(conn, user_id, prefs, limit)
 
 @router.delete("/{user_id}", response_model=dict)
 async def delete_profile(user_id: int, conn=Depends(get_connection)):
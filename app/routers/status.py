@@ -1,36 +1,28 @@
+import os
 from fastapi import APIRouter, Depends, HTTPException
-from datetime import datetime, timedelta
+from datetime import datetime
+from typing import List
 from app.db import get_connection
-from app.schemas.status import UserStatusOut, StatusUpdateIn, StatusUpdateOut
+from app.schemas.status import UserStatusOut, StatusUpdateIn, StatusUpdateOut, StatusBatchIn
 from app.routers.auth import get_current_user
-import pytz
+from app.utils import presence
 
 router = APIRouter(prefix="/status", tags=["status"])
 
 @router.put("/online", response_model=StatusUpdateOut)
 async def update_online_status(
     status_update: StatusUpdateIn,
-    current_user: dict = Depends(get_current_user),
-    conn=Depends(get_connection)
+    current_user: dict = Depends(get_current_user)
 ):
     """Atualizar status online do usuário"""
     user_id = current_user["user_id"]
     is_online = status_update.is_online
     
-    # Atualizar last_login se estiver ficando online
+    # Heartbeat vai só para o serviço de presença (last_seen é gravado em lote)
     if is_online:
-        await conn.execute("""
-            UPDATE users 
-            SET last_login = NOW(), updated_at = NOW()
-            WHERE user_id = $1
-        """, user_id)
+        await presence.heartbeat(user_id)
     else:
-        # Quando ficar offline, não atualizar last_login, apenas updated_at
-        await conn.execute("""
-            UPDATE users 
-            SET updated_at = NOW()
-            WHERE user_id = $1
-        """, user_id)
+        await presence.go_offline(user_id)
     
     return StatusUpdateOut(
         message="Status updated successfully",
@@ -38,45 +30,37 @@ async def update_online_status(
         last_seen=datetime.utcnow()
     )
 
-@router.get("/{user_id}", response_model=UserStatusOut)
-async def get_user_status(user_id: int, conn=Depends(get_connection)):
-    """Obter status de um usuário específico"""
-    user = await conn.fetchrow("""
-        SELECT user_id, last_login, updated_at
-        FROM users 
-        WHERE user_id = $1
-    """, user_id)
-    
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    # Considerar online se last_login foi nos últimos 3 minutos
-    last_login = user["last_login"]
-    is_online = False
-    last_seen = None
-    
-    if last_login:
-        # Converter para UTC se necessário e calcular diferença
-        if last_login.tzinfo is None:
-            # Se não tem timezone, assumir que é UTC
-            last_login_utc = last_login
-        else:
-            last_login_utc = last_login.astimezone(pytz.UTC).replace(tzinfo=None)
-        
-        now_utc = datetime.utcnow()
-        time_diff = now_utc - last_login_utc
-        is_online = time_diff <= timedelta(minutes=3)
-        
-        # last_seen é sempre o last_login, independente se está online ou não
-        last_seen = last_login
-    
+# Limite de IDs por consulta em lote
+STATUS_BATCH_MAX_IDS = int(os.getenv("STATUS_BATCH_MAX_IDS", "5000"))
+
+def _build_status(user) -> UserStatusOut:
+    """Monta o status a partir do serviço de presença"""
+    user_id = user["user_id"]
     return UserStatusOut(
         user_id=user_id,
-        is_online=is_online,
-        last_seen=last_seen,
-        last_login=last_login
+        is_online=presence.is_online(user_id, user["last_seen"]),
+        last_seen=presence.last_seen(user_id, user["last_seen"]),
+        last_login=user["last_login"]
     )
 
+async def _fetch_statuses(conn, ids: List[int]) -> List[UserStatusOut]:
+    """Status de vários usuários com uma única query (parâmetro array)"""
+    # Remover duplicados mantendo a ordem
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > STATUS_BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many user IDs (max {STATUS_BATCH_MAX_IDS})"
+        )
+    
+    users = await conn.fetch("""
+        SELECT user_id, last_login, last_seen
+        FROM users 
+        WHERE user_id = ANY($1::int[])
+    """, ids)
+    
+    return [_build_status(user) for user in users]
+
 @router.get("/batch", response_model=list[UserStatusOut])
 async def get_multiple_users_status(
     user_ids: str,  # Comma-separated list
@@ -88,67 +72,38 @@ async def get_multiple_users_status(
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid user IDs format")
     
-    if len(ids) > 50:  # Limite de segurança
-        raise HTTPException(status_code=400, detail="Too many user IDs (max 50)")
-    
-    # Criar placeholders para a query
-    placeholders = ",".join([f"${i+1}" for i in range(len(ids))])
-    
-    users = await conn.fetch(f"""
-        SELECT user_id, last_login, updated_at
+    return await _fetch_statuses(conn, ids)
+
+@router.post("/batch", response_model=list[UserStatusOut])
+async def post_multiple_users_status(batch: StatusBatchIn, conn=Depends(get_connection)):
+    """Obter status de múltiplos usuários (lista no corpo, para listas grandes)"""
+    return await _fetch_statuses(conn, batch.user_ids)
+
+@router.get("/{user_id}", response_model=UserStatusOut)
+async def get_user_status(user_id: int, conn=Depends(get_connection)):
+    """Obter status de um usuário específico"""
+    user = await conn.fetchrow("""
+        SELECT user_id, last_login, last_seen
         FROM users 
-        WHERE user_id IN ({placeholders})
-    """, *ids)
+        WHERE user_id = $1
+    """, user_id)
     
-    results = []
-    for user in users:
-        last_login = user["last_login"]
-        is_online = False
-        last_seen = None
-        
-        if last_login:
-            # Converter para UTC se necessário e calcular diferença
-            if last_login.tzinfo is None:
-                # Se não tem timezone, assumir que é UTC
-                last_login_utc = last_login
-            else:
-                last_login_utc = last_login.astimezone(pytz.UTC).replace(tzinfo=None)
-            
-            now_utc = datetime.utcnow()
-            time_diff = now_utc - last_login_utc
-            is_online = time_diff <= timedelta(minutes=3)
-            
-            # last_seen é sempre o last_login, independente se está online ou não
-            last_seen = last_login
-        
-        results.append(UserStatusOut(
-            user_id=user["user_id"],
-            is_online=is_online,
-            last_seen=last_seen,
-            last_login=last_login
-        ))
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
     
-    return results
+    return _build_status(user)
 
 @router.get("/online/users", response_model=list[UserStatusOut])
 async def get_online_users(conn=Depends(get_connection)):
-    """Obter lista de usuários online (últimos 3 minutos)"""
+    """Obter lista de usuários online"""
+    # last_seen gravado por qualquer processo + presença ainda não gravada deste processo
     users = await conn.fetch("""
-        SELECT user_id, last_login, updated_at
+        SELECT user_id, last_login, last_seen
         FROM users 
-        WHERE last_login IS NOT NULL 
-        AND last_login > NOW() - INTERVAL '3 minutes'
-        ORDER BY last_login DESC
+        WHERE last_seen > NOW() - make_interval(secs => $1)
+           OR user_id = ANY($2::int[])
+        ORDER BY last_seen DESC NULLS LAST
         LIMIT 100
-    """)
-    
-    results = []
-    for user in users:
-        results.append(UserStatusOut(
-            user_id=user["user_id"],
-            is_online=True,
-            last_seen=user["last_login"],
-            last_login=user["last_login"]
-        ))
+    """, presence.PRESENCE_TIMEOUT_SECONDS, presence.local_online_ids())
     
-    return results
+    return [_build_status(user) for user in users]
@@ -1,122 +1,93 @@
+import os
 from fastapi import APIRouter, Depends, HTTPException
 from app.db import get_connection
-from app.schemas.swipes import SwipeIn, SwipeOut
-from app.routers.ws_notifications import save_notification, push_notification
-from datetime import datetime
+from app.schemas.swipes import SwipeIn, SwipeOut, SwipeBatchIn
+from app.routers.ws_notifications import save_notification, push_notification, push_notifications
+import json
 
 router = APIRouter(prefix="/swipes", tags=["swipes"])
 
+# Limite de swipes por chamada em lote
+SWIPE_BATCH_MAX_SIZE = int(os.getenv("SWIPE_BATCH_MAX_SIZE", "500"))
+# Swipes por transação: cada par trava um advisory lock até o commit, e a
+# tabela de locks é compartilhada (max_locks_per_transaction * max_connections)
+SWIPE_BATCH_CHUNK_SIZE = int(os.getenv("SWIPE_BATCH_CHUNK_SIZE", "100"))
+
+async def _save_like_notifications(conn, notifications: list):
+    """Grava os likes devolvidos (não gravados) pelas funções de swipe pelo
+    writer de notificações, que coalesce repetidos e resume rajadas"""
+    for notif in notifications:
+        if notif["type"] == "like":
+            await save_notification(conn, notif["user_id"], "like", notif["content"], notif["related_user_id"])
+
 @router.post("/", response_model=dict)
 async def add_swipe(swipe: SwipeIn, conn=Depends(get_connection)):
     """Registrar swipe (like/dislike)"""
-    print(f"DEBUG: Swipe received - swiper_id: {swipe.swiper_id}, swiped_id: {swipe.swiped_id}, direction: {swipe.direction}")
-    
-    # Inserir ou atualizar swipe
-    await conn.execute("""
-        INSERT INTO swipes (swiper_id, swiped_id, direction)
-        VALUES ($1, $2, $3)
-        ON CONFLICT (swiper_id, swiped_id) DO UPDATE
-        SET direction = EXCLUDED.direction
+    # Upsert, reciprocidade, match, chat e notificações em uma única chamada.
+    # A função roda em uma transação só: ao retornar, tudo já foi commitado.
+    result = await conn.fetchrow("""
+        SELECT new_match_id, new_chat_id, created_notifications
+        FROM process_swipe($1, $2, $3)
     """, int(swipe.swiper_id), int(swipe.swiped_id), swipe.direction)
     
-    # Se for like, verificar se há reciprocidade
-    if swipe.direction == "like":
-        print(f"DEBUG: Checking for reciprocal like - looking for swiper_id: {swipe.swiped_id}, swiped_id: {swipe.swiper_id}")
-        
-        # Verificar se o outro usuário já deu like
-        reciprocal = await conn.fetchrow("""
-            SELECT * FROM swipes 
-            WHERE swiper_id = $1 AND swiped_id = $2 AND direction = 'like'
-        """, int(swipe.swiped_id), int(swipe.swiper_id))
-        
-        print(f"DEBUG: Reciprocal swipe found: {reciprocal is not None}")
-        if reciprocal:
-            print(f"DEBUG: Reciprocal swipe details: {dict(reciprocal) if reciprocal else 'None'}")
-        
-        if reciprocal:
-            print(f"DEBUG: Creating match between {swipe.swiper_id} and {swipe.swiped_id}")
-            
-            # Criar match se ainda não existir (usando LEAST/GREATEST para evitar duplicatas)
-            match = await conn.fetchrow("""
-                INSERT INTO matches (user1_id, user2_id)
-                VALUES (LEAST($1::int, $2::int), GREATEST($1::int, $2::int))
-                ON CONFLICT (user1_id, user2_id) DO NOTHING
-                RETURNING match_id
-            """, int(swipe.swiper_id), int(swipe.swiped_id))
-            
-            print(f"DEBUG: Match creation result: {match}")
-            
-            if match:
-                # Criar chat para o match
-                await conn.execute("""
-                    INSERT INTO chats (match_id)
-                    VALUES ($1)
-                """, match["match_id"])
-                
-                # Buscar nomes dos usuários para notificações mais amigáveis
-                user1 = await conn.fetchrow("SELECT name FROM users WHERE user_id = $1", int(swipe.swiper_id))
-                user2 = await conn.fetchrow("SELECT name FROM users WHERE user_id = $1", int(swipe.swiped_id))
-                
-                # Criar notificações para ambos os usuários
-                content1 = f"Você tem um novo match com {user2['name'] if user2 else 'alguém'}! 💕"
-                content2 = f"Você tem um novo match com {user1['name'] if user1 else 'alguém'}! 💕"
-                
-                # Salvar notificações no banco
-                await save_notification(conn, int(swipe.swiper_id), "match", content1, int(swipe.swiped_id))
-                await save_notification(conn, int(swipe.swiped_id), "match", content2, int(swipe.swiper_id))
-                
-                # Enviar notificações em tempo real
-                notif1 = {
-                    "user_id": int(swipe.swiper_id),
-                    "type": "match",
-                    "content": content1,
-                    "created_at": datetime.utcnow().isoformat() + "Z"
-                }
-                notif2 = {
-                    "user_id": int(swipe.swiped_id),
-                    "type": "match",
-                    "content": content2,
-                    "created_at": datetime.utcnow().isoformat() + "Z"
-                }
-                
-                await push_notification(int(swipe.swiper_id), notif1)
-                await push_notification(int(swipe.swiped_id), notif2)
-                
-                print(f"DEBUG: Match created successfully! Match ID: {match['match_id']}")
-                return {"message": "Match created!", "match_id": match["match_id"]}
-        
-        # Buscar nome do usuário que deu like
-        liker = await conn.fetchrow("SELECT name FROM users WHERE user_id = $1", int(swipe.swiper_id))
-        
-        # Se não há match, criar notificação de like
-        content = f"{liker['name'] if liker else 'Alguém'} curtiu seu perfil! ❤️"
-        await save_notification(conn, int(swipe.swiped_id), "like", content, int(swipe.swiper_id))
-        
-        notif = {
-            "user_id": int(swipe.swiped_id),
-            "type": "like",
-            "content": content,
-            "created_at": datetime.utcnow().isoformat() + "Z"
+    notifications = json.loads(result["created_notifications"])
+    await _save_like_notifications(conn, notifications)
+    
+    # Enviar notificações em tempo real (após o commit)
+    for notif in notifications:
+        await push_notification(notif["user_id"], notif)
+    
+    if result["new_match_id"]:
+        return {
+            "message": "Match created!",
+            "match_id": result["new_match_id"],
+            "chat_id": result["new_chat_id"]
         }
-        await push_notification(int(swipe.swiped_id), notif)
     
-    elif swipe.direction == "dislike":
-        # Buscar nome do usuário que deu dislike
-        disliker = await conn.fetchrow("SELECT name FROM users WHERE user_id = $1", int(swipe.swiper_id))
+    return {"message": "Swipe registered"}
+
+@router.post("/batch", response_model=dict)
+async def add_swipes_batch(batch: SwipeBatchIn, conn=Depends(get_connection)):
+    """Registrar vários swipes de uma vez (replay de fila offline)"""
+    if len(batch.swipes) > SWIPE_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many swipes (max {SWIPE_BATCH_MAX_SIZE})"
+        )
+    if not batch.swipes:
+        return {"message": "Swipes registered", "processed": 0, "matches": []}
+    
+    # Mesmas regras de process_swipe, com um upsert, uma detecção de likes
+    # mútuos e inserts em lote de matches, chats e notificações por bloco.
+    # Blocos em ordem, cada um na sua transação: likes mútuos entre blocos
+    # são detectados porque o bloco anterior já foi commitado.
+    processed = 0
+    matches = []
+    for i in range(0, len(batch.swipes), SWIPE_BATCH_CHUNK_SIZE):
+        chunk = batch.swipes[i:i + SWIPE_BATCH_CHUNK_SIZE]
+        result = await conn.fetchrow("""
+            SELECT processed, created_matches, created_notifications
+            FROM process_swipes_batch($1::int[], $2::int[], $3::varchar[])
+        """,
+            [s.swiper_id for s in chunk],
+            [s.swiped_id for s in chunk],
+            [s.direction for s in chunk]
+        )
         
-        # Criar notificação de unlike
-        content = f"{disliker['name'] if disliker else 'Alguém'} descurtiu seu perfil 💔"
-        await save_notification(conn, int(swipe.swiped_id), "unlike", content, int(swipe.swiper_id))
+        notifications = json.loads(result["created_notifications"])
+        await _save_like_notifications(conn, notifications)
         
-        notif = {
-            "user_id": int(swipe.swiped_id),
-            "type": "unlike",
-            "content": content,
-            "created_at": datetime.utcnow().isoformat() + "Z"
-        }
-        await push_notification(int(swipe.swiped_id), notif)
+        # Notificações do bloco em tempo real de uma vez (após o commit)
+        await push_notifications(notifications)
+        
+        processed += result["processed"]
+        matches.extend(json.loads(result["created_matches"]))
     
-    return {"message": "Swipe registered"}
+    return {
+        "message": "Swipes registered",
+        "processed": processed,
+        "matches": matches
+    }
 
 @router.get("/{user_id}/likes", response_model=list)
 async def get_likes_received(user_id: int, conn=Depends(get_connection)):
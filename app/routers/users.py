@@ -4,8 +4,9 @@ import asyncpg
 from app.db import get_connection
 from app.schemas.users import UserCreate, UserOut, UserUpdate
 from app.schemas.search import SearchResult
-from app.utils.passwords import validate_password, hash_password
-from app.utils.geo import calculate_distance
+from app.utils.passwords import validate_password, hash_password_async
+from app.utils.geo import bounding_box
+from app.utils.auth_cache import invalidate_user
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -18,7 +19,7 @@ async def create_user(user: UserCreate, conn=Depends(get_connection)):
         raise HTTPException(status_code=400, detail=error)
 
     # Hash da senha
-    hashed = hash_password(user.password)
+    hashed = await hash_password_async(user.password)
 
     try:
         result = await conn.fetchrow("""
@@ -91,21 +92,6 @@ async def advanced_search(
     lat, lon = prefs["latitude"], prefs["longitude"]
     preferred_gender = prefs["preferred_gender"]
 
-    # Obter usuários bloqueados (que o usuário bloqueou)
-    blocked_users = await conn.fetch("""
-        SELECT DISTINCT blocked_id FROM blocked_users WHERE blocker_id = $1
-    """, current_user_id)
-    blocked_ids = [int(row["blocked_id"]) for row in blocked_users]
-    
-    # Obter usuários que bloquearam o usuário atual
-    blocked_by_users = await conn.fetch("""
-        SELECT DISTINCT blocker_id FROM blocked_users WHERE blocked_id = $1
-    """, current_user_id)
-    blocked_by_ids = [int(row["blocker_id"]) for row in blocked_by_users]
-    
-    # Combinar listas de exclusão
-    exclude_ids = list(set(blocked_ids + blocked_by_ids + [current_user_id]))
-
     # Normalizar tags
     tags_list = []
     if tags:
@@ -121,11 +107,19 @@ async def advanced_search(
                0 AS distance, 0 AS common_tags
         FROM users u
         JOIN profiles p ON u.user_id = p.user_id
-        WHERE u.user_id <> ALL($1::int[])
+        WHERE u.user_id <> $1
           AND ($2 = 'both' OR p.gender = $2)
+          AND NOT EXISTS (
+              SELECT 1 FROM blocked_users b
+              WHERE b.blocker_id = $1 AND b.blocked_id = u.user_id
+          )
+          AND NOT EXISTS (
+              SELECT 1 FROM blocked_users b
+              WHERE b.blocker_id = u.user_id AND b.blocked_id = $1
+          )
     """
     
-    params = [exclude_ids, preferred_gender]
+    params = [current_user_id, preferred_gender]
     param_count = 3
     
     # Filtros dinâmicos
@@ -227,6 +221,7 @@ async def update_user(user_id: int, user_update: UserUpdate, conn=Depends(get_co
     
     try:
         await conn.execute(query, *params)
+        invalidate_user(user_id)
         return {"message": "User updated successfully"}
     except asyncpg.UniqueViolationError:
         raise HTTPException(status_code=400, detail="Email already exists")
@@ -276,28 +271,32 @@ async def top_fame_nearby(user_id: int, conn=Depends(get_connection)):
     age_min, age_max = prefs["age_min"], prefs["age_max"]
     max_distance = prefs["max_distance_km"]
     
+    # Retângulo de busca (indexável) a partir da distância máxima
+    min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, max_distance)
+    
     # Query para usuários próximos e famosos
     rows = await conn.fetch("""
-        SELECT u.user_id, u.name, u.fame_rating,
-               p.age, p.gender, p.latitude, p.longitude, p.avatar_url,
-               (6371 * acos(
-                   cos(radians($1)) * cos(radians(p.latitude)) *
-                   cos(radians(p.longitude) - radians($2)) +
-                   sin(radians($1)) * sin(radians(p.latitude))
-               )) AS distance
-        FROM users u
-        JOIN profiles p ON u.user_id = p.user_id
-        WHERE u.user_id <> $3
-          AND p.age BETWEEN $4 AND $5
-          AND ($6 = 'both' OR p.gender = $6)
-          AND (6371 * acos(
-                   cos(radians($1)) * cos(radians(p.latitude)) *
-                   cos(radians(p.longitude) - radians($2)) +
-                   sin(radians($1)) * sin(radians(p.latitude))
-              )) <= $7
-        ORDER BY u.fame_rating DESC
+        SELECT * FROM (
+            SELECT u.user_id, u.name, u.fame_rating,
+                   p.age, p.gender, p.latitude, p.longitude, p.avatar_url,
+                   (6371 * acos(LEAST(1.0,
+                       cos(radians($1)) * cos(radians(p.latitude)) *
+                       cos(radians(p.longitude) - radians($2)) +
+                       sin(radians($1)) * sin(radians(p.latitude))
+                   ))) AS distance
+            FROM users u
+            JOIN profiles p ON u.user_id = p.user_id
+            WHERE u.user_id <> $3
+              AND p.age BETWEEN $4 AND $5
+              AND ($6 = 'both' OR p.gender = $6)
+              AND p.latitude BETWEEN $8 AND $9
+              AND p.longitude BETWEEN $10 AND $11
+        ) candidates
+        WHERE distance <= $7
+        ORDER BY fame_rating DESC
         LIMIT 20
-    """, lat, lon, user_id, age_min, age_max, preferred_gender, max_distance)
+    """, lat, lon, user_id, age_min, age_max, preferred_gender, max_distance,
+         min_lat, max_lat, min_lon, max_lon)
     
     return [dict(r) for r in rows]
 
@@ -311,5 +310,6 @@ async def delete_user(user_id: int, conn=Depends(get_connection)):
     
     # Marcar como deletado (ou realmente deletar se preferir)
     await conn.execute("DELETE FROM users WHERE user_id = $1", user_id)
+    invalidate_user(user_id)
     
     return {"message": "User deleted successfully"}
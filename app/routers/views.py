@@ -1,7 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
+from typing import Optional
 from app.db import get_connection
 from app.schemas.views import ViewIn, ViewOut, ViewWithProfile
 from app.routers.ws_notifications import save_notification, push_notification
+from app.utils.pagination import decode_cursor, set_next_cursor
 from datetime import datetime
 
 router = APIRouter(prefix="/views", tags=["views"])
@@ -30,7 +32,7 @@ async def add_view(view: ViewIn, conn=Depends(get_connection)):
         # Criar notificação para o usuário visualizado
         content = f"{viewer_info['name']} visualizou seu perfil 👁️"
         
-        # Salvar notificação no banco
+        # Salvar notificação (visualizações repetidas na janela são gravadas uma vez só)
         await save_notification(conn, view.viewed_id, "view", content, view.viewer_id)
         
         # Enviar notificação em tempo real
@@ -45,36 +47,74 @@ async def add_view(view: ViewIn, conn=Depends(get_connection)):
     return {"message": "View recorded successfully"}
 
 @router.get("/{user_id}/received", response_model=list)
-async def get_views_received(user_id: int, limit: int = 20, offset: int = 0, conn=Depends(get_connection)):
-    """Obter visualizações recebidas pelo usuário"""
-    rows = await conn.fetch("""
+async def get_views_received(
+    user_id: int,
+    response: Response,
+    limit: int = 20,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    conn=Depends(get_connection)
+):
+    """Obter visualizações recebidas pelo usuário (próxima página em X-Next-Cursor)"""
+    query = """
         SELECT v.view_id, v.viewer_id, v.created_at,
                u.name as viewer_name, p.avatar_url as viewer_avatar
         FROM profile_views v
         JOIN users u ON v.viewer_id = u.user_id
         JOIN profiles p ON v.viewer_id = p.user_id
         WHERE v.viewed_id = $1
-        ORDER BY v.created_at DESC
-        LIMIT $2 OFFSET $3
-    """, user_id, limit, offset)
+    """
+    params = [user_id, limit]
     
-    return [dict(r) for r in rows]
+    if cursor:
+        created_at, view_id = decode_cursor(cursor)
+        query += " AND (v.created_at, v.view_id) < ($3, $4)"
+        params.extend([created_at, view_id])
+    
+    query += " ORDER BY v.created_at DESC, v.view_id DESC LIMIT $2"
+    
+    if not cursor:
+        query += " OFFSET $3"
+        params.append(offset)
+    
+    rows = [dict(r) for r in await conn.fetch(query, *params)]
+    set_next_cursor(response, rows, limit, "created_at", "view_id")
+    return rows
 
 @router.get("/{user_id}/given", response_model=list)
-async def get_views_given(user_id: int, limit: int = 20, offset: int = 0, conn=Depends(get_connection)):
-    """Obter visualizações dadas pelo usuário"""
-    rows = await conn.fetch("""
+async def get_views_given(
+    user_id: int,
+    response: Response,
+    limit: int = 20,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    conn=Depends(get_connection)
+):
+    """Obter visualizações dadas pelo usuário (próxima página em X-Next-Cursor)"""
+    query = """
         SELECT v.view_id, v.viewed_id, v.created_at,
                u.name as viewed_name, p.avatar_url as viewed_avatar
         FROM profile_views v
         JOIN users u ON v.viewed_id = u.user_id
         JOIN profiles p ON v.viewed_id = p.user_id
         WHERE v.viewer_id = $1
-        ORDER BY v.created_at DESC
-        LIMIT $2 OFFSET $3
-    """, user_id, limit, offset)
+    """
+    params = [user_id, limit]
     
-    return [dict(r) for r in rows]
+    if cursor:
+        created_at, view_id = decode_cursor(cursor)
+        query += " AND (v.created_at, v.view_id) < ($3, $4)"
+        params.extend([created_at, view_id])
+    
+    query += " ORDER BY v.created_at DESC, v.view_id DESC LIMIT $2"
+    
+    if not cursor:
+        query += " OFFSET $3"
+        params.append(offset)
+    
+    rows = [dict(r) for r in await conn.fetch(query, *params)]
+    set_next_cursor(response, rows, limit, "created_at", "view_id")
+    return rows
 
 @router.get("/{user_id}/count", response_model=dict)
 async def get_view_count(user_id: int, conn=Depends(get_connection)):
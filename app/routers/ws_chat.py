@@ -1,38 +1,58 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from typing import Dict, List
-from app.db import get_connection
+from app.db import acquire_connection
+from app.utils import presence
+from app.utils.realtime import publish, register_handler, subscribe, unsubscribe
+from app.utils.ws_sender import SocketSender
+from app.utils.serialization import dumps
+from app.utils.message_buffer import CHAT_PERSIST_MODE, is_buffered, enqueue_message, on_save_failure
 import json
-from datetime import datetime
+from datetime import datetime, timezone
 
 router = APIRouter(prefix="/ws", tags=["chat"])
 
 # Armazena conexões ativas por chat_id
-active_connections: Dict[int, List[WebSocket]] = {}
+active_connections: Dict[int, List[SocketSender]] = {}
 
-async def save_message(conn, chat_id: int, sender_id: int, content: str):
+def _remove_connection(chat_id: int, sender: SocketSender):
+    senders = active_connections.get(chat_id)
+    if senders and sender in senders:
+        senders.remove(sender)
+        if not senders:
+            del active_connections[chat_id]
+
+async def save_message(conn, chat_id: int, sender_id: int, content: str) -> int:
     """Insere mensagem no banco"""
-    await conn.execute("""
+    return await conn.fetchval("""
         INSERT INTO messages (chat_id, sender_id, content)
         VALUES ($1, $2, $3)
+        RETURNING message_id
     """, chat_id, sender_id, content)
 
+async def _deliver_local(chat_id: int, text: str):
+    """Enfileira mensagem para os sockets do chat conectados neste processo"""
+    senders = active_connections.get(chat_id)
+    if not senders:
+        return
+    for sender in list(senders):
+        sender.send(text)
+
+register_handler("chat", _deliver_local)
+
 async def broadcast(chat_id: int, message: dict):
-    """Envia mensagem para todos conectados no mesmo chat"""
-    if chat_id in active_connections:
-        for connection in active_connections[chat_id]:
-            try:
-                await connection.send_text(json.dumps(message))
-            except Exception as e:
-                print(f"[WARN] Falha ao enviar mensagem: {e}")
+    """Envia mensagem para todos conectados no mesmo chat (em qualquer processo)"""
+    await publish("chat", chat_id, message)
 
 @router.websocket("/chat/{chat_id}")
-async def chat_socket(websocket: WebSocket, chat_id: int, conn=Depends(get_connection)):
+async def chat_socket(websocket: WebSocket, chat_id: int):
     await websocket.accept()
+    sender = SocketSender(websocket, on_evict=lambda s: _remove_connection(chat_id, s))
 
     # registra conexão
     if chat_id not in active_connections:
         active_connections[chat_id] = []
-    active_connections[chat_id].append(websocket)
+    active_connections[chat_id].append(sender)
+    await subscribe("chat", chat_id)
 
     try:
         while True:
@@ -43,32 +63,58 @@ async def chat_socket(websocket: WebSocket, chat_id: int, conn=Depends(get_conne
                 content = data.get("content")
 
                 if not sender_id or not content:
-                    await websocket.send_text(json.dumps({
+                    sender.send(dumps({
                         "error": "Invalid payload. Expected {sender_id, content}"
                     }))
                     continue
 
-                # salvar no banco
-                await save_message(conn, chat_id, sender_id, content)
+                # O socket do chat é aberto por chat_id, sem o usuário: não conta como
+                # sessão de presença (isso fica com /ws/notifications e /ws/map), mas
+                # cada mensagem enviada é atividade do remetente
+                if isinstance(sender_id, int):
+                    await presence.heartbeat(sender_id)
+
+                sent_at = datetime.now(timezone.utc)
+
+                if is_buffered():
+                    # Gravação em lote pelo buffer (ver CHAT_PERSIST_MODE)
+                    message_id, saved = await enqueue_message(chat_id, sender_id, content, sent_at)
+                    if CHAT_PERSIST_MODE == "batched":
+                        try:
+                            await saved
+                        except Exception:
+                            sender.send(dumps({"error": "Message could not be saved"}))
+                            continue
+                    else:
+                        on_save_failure(saved, lambda exc, mid=message_id: sender.send(dumps({
+                            "error": "Message could not be saved",
+                            "message_id": mid
+                        })))
+                else:
+                    # salvar no banco (conexão do pool só durante a escrita)
+                    async with acquire_connection() as conn:
+                        message_id = await save_message(conn, chat_id, sender_id, content)
 
                 # criar resposta
                 message = {
+                    "message_id": message_id,
                     "chat_id": chat_id,
                     "sender_id": sender_id,
                     "content": content,
-                    "sent_at": datetime.utcnow().isoformat() + "Z"
+                    "sent_at": sent_at.replace(tzinfo=None).isoformat() + "Z"
                 }
 
                 # broadcast p/ todos no mesmo chat
                 await broadcast(chat_id, message)
 
             except json.JSONDecodeError:
-                await websocket.send_text(json.dumps({
+                sender.send(dumps({
                     "error": "Invalid JSON"
                 }))
 
     except WebSocketDisconnect:
         print(f"[INFO] Cliente desconectado do chat {chat_id}")
-        active_connections[chat_id].remove(websocket)
-        if not active_connections[chat_id]:
-            del active_connections[chat_id]
+    finally:
+        _remove_connection(chat_id, sender)
+        await sender.close()
+        await unsubscribe("chat", chat_id)
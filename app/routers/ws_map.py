@@ -1,18 +1,59 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from typing import Dict, List, Set
-from app.db import get_connection
 from app.utils.jwt import get_current_user_ws
+from app.utils.realtime import publish, register_handler, subscribe, unsubscribe
+from app.utils.ws_sender import SocketSender
+from app.utils import presence
+from app.utils.serialization import dumps, loads
+from app.utils.geo_grid import ViewportIndex, region_from_bounds, region_from_radius
+from app.utils.location_updates import record_location, forget_user, set_broadcaster
 import json
 from datetime import datetime
 
 router = APIRouter(prefix="/ws", tags=["map"])
 
 # Conexões ativas do mapa: user_id -> lista de websockets
-active_map_connections: Dict[int, List[WebSocket]] = {}
+active_map_connections: Dict[int, List[SocketSender]] = {}
 
 # Usuários que estão visualizando o mapa
 map_viewers: Set[int] = set()
 
+# Regiões de interesse dos sockets do mapa (sem região: recebe tudo)
+viewport_index = ViewportIndex()
+
+def _remove_connection(user_id: int, sender: SocketSender):
+    senders = active_map_connections.get(user_id)
+    if senders and sender in senders:
+        senders.remove(sender)
+        if not senders:
+            del active_map_connections[user_id]
+            map_viewers.discard(user_id)
+            forget_user(user_id)
+    viewport_index.remove(sender)
+
+async def _deliver_local(_key, text: str):
+    """Enfileira evento do mapa para os visualizadores conectados neste processo.
+
+    Atualizações de localização só vão para sockets cuja região contém o ponto.
+    """
+    event = loads(text)
+    latitude = event.get("latitude")
+    longitude = event.get("longitude")
+    if event.get("type") == "location_update" and latitude is not None and longitude is not None:
+        targets = viewport_index.matching(latitude, longitude)
+    else:
+        targets = viewport_index.all()
+    for sender in targets:
+        sender.send(text)
+
+def _parse_region(data: dict):
+    """Região pedida pelo cliente: viewport (north/south/east/west) ou raio"""
+    if data.get("radius_km") is not None:
+        return region_from_radius(data.get("latitude"), data.get("longitude"), data.get("radius_km"))
+    return region_from_bounds(data.get("north"), data.get("south"), data.get("east"), data.get("west"))
+
+register_handler("map", _deliver_local)
+
 async def broadcast_user_location_update(user_id: int, latitude: float, longitude: float, is_online: bool):
     """Broadcast location update to all map viewers"""
     message = {
@@ -24,14 +65,8 @@ async def broadcast_user_location_update(user_id: int, latitude: float, longitud
         "timestamp": datetime.now().isoformat()
     }
     
-    # Send to all map viewers
-    for viewer_id in map_viewers:
-        if viewer_id in active_map_connections:
-            for ws in active_map_connections[viewer_id]:
-                try:
-                    await ws.send_text(json.dumps(message))
-                except Exception as e:
-                    print(f"[WARN] Falha ao enviar atualização de localização: {e}")
+    # Send to all map viewers (every process)
+    await publish("map", None, message)
 
 async def broadcast_user_online_status(user_id: int, is_online: bool):
     """Broadcast online status update to all map viewers"""
@@ -42,17 +77,11 @@ async def broadcast_user_online_status(user_id: int, is_online: bool):
         "timestamp": datetime.now().isoformat()
     }
     
-    # Send to all map viewers
-    for viewer_id in map_viewers:
-        if viewer_id in active_map_connections:
-            for ws in active_map_connections[viewer_id]:
-                try:
-                    await ws.send_text(json.dumps(message))
-                except Exception as e:
-                    print(f"[WARN] Falha ao enviar atualização de status: {e}")
+    # Send to all map viewers (every process)
+    await publish("map", None, message)
 
 @router.websocket("/map/{user_id}")
-async def map_socket(websocket: WebSocket, user_id: int, conn=Depends(get_connection)):
+async def map_socket(websocket: WebSocket, user_id: int):
     """WebSocket para atualizações em tempo real do mapa"""
     print(f"[INFO] Tentando conectar WebSocket do mapa para usuário {user_id}")
     
@@ -70,19 +99,28 @@ async def map_socket(websocket: WebSocket, user_id: int, conn=Depends(get_connec
     await websocket.accept()
     print(f"[INFO] WebSocket do mapa conectado para usuário {user_id}")
 
+    # Posições antigas são descartadas se o cliente não acompanhar
+    sender = SocketSender(
+        websocket, drop_oldest=True,
+        on_evict=lambda s: _remove_connection(user_id, s)
+    )
+
     # Adicionar à lista de conexões ativas
     if user_id not in active_map_connections:
         active_map_connections[user_id] = []
-    active_map_connections[user_id].append(websocket)
+    active_map_connections[user_id].append(sender)
+    await presence.connect(user_id)
+    viewport_index.add(sender)
     
     # Adicionar aos visualizadores do mapa
     map_viewers.add(user_id)
+    await subscribe("map")
     
     print(f"[INFO] Usuário {user_id} adicionado às conexões do mapa. Total: {len(active_map_connections[user_id])}")
 
     try:
         # Enviar mensagem de confirmação
-        await websocket.send_text(json.dumps({
+        sender.send(dumps({
             "type": "connected",
             "message": "Conectado ao mapa em tempo real",
             "timestamp": datetime.now().isoformat()
@@ -96,40 +134,56 @@ async def map_socket(websocket: WebSocket, user_id: int, conn=Depends(get_connec
 
                 if message_type == "ping":
                     # Responder ao ping
-                    await websocket.send_text(json.dumps({
+                    sender.send(dumps({
                         "type": "pong",
                         "timestamp": datetime.now().isoformat()
                     }))
                 
+                elif message_type == "subscribe_viewport":
+                    # Restringir eventos de localização à região informada
+                    region = _parse_region(data)
+                    if region is None:
+                        sender.send(dumps({
+                            "error": "Invalid viewport. Expected {north, south, east, west} or {latitude, longitude, radius_km}"
+                        }))
+                        continue
+                    viewport_index.set_region(sender, region)
+                    sender.send(dumps({
+                        "type": "viewport_subscribed",
+                        "region": region.to_dict(),
+                        "timestamp": datetime.now().isoformat()
+                    }))
+
+                elif message_type == "unsubscribe_viewport":
+                    # Voltar a receber eventos do mapa inteiro
+                    viewport_index.add(sender)
+                    sender.send(dumps({
+                        "type": "viewport_unsubscribed",
+                        "timestamp": datetime.now().isoformat()
+                    }))
+
                 elif message_type == "location_update":
                     # Atualizar localização do usuário
                     latitude = data.get("latitude")
                     longitude = data.get("longitude")
                     
                     if latitude and longitude:
-                        # Atualizar no banco de dados
-                        await conn.execute("""
-                            UPDATE profiles 
-                            SET latitude = $1, longitude = $2, updated_at = NOW()
-                            WHERE user_id = $3
-                        """, latitude, longitude, user_id)
+                        # Gravação em lote e broadcast com limite de taxa/movimento mínimo
+                        await record_location(user_id, latitude, longitude)
                         
-                        # Broadcast para outros usuários
-                        await broadcast_user_location_update(user_id, latitude, longitude, True)
-                        
-                        await websocket.send_text(json.dumps({
+                        sender.send(dumps({
                             "type": "location_updated",
                             "message": "Localização atualizada com sucesso",
                             "timestamp": datetime.now().isoformat()
                         }))
 
             except json.JSONDecodeError:
-                await websocket.send_text(json.dumps({
+                sender.send(dumps({
                     "error": "Invalid JSON format"
                 }))
             except Exception as e:
                 print(f"[ERROR] Erro no WebSocket do mapa: {e}")
-                await websocket.send_text(json.dumps({
+                sender.send(dumps({
                     "error": "Internal server error"
                 }))
 
@@ -138,19 +192,19 @@ async def map_socket(websocket: WebSocket, user_id: int, conn=Depends(get_connec
     except Exception as e:
         print(f"[ERROR] Erro no WebSocket do mapa: {e}")
     finally:
-        # Remover das conexões ativas
-        if user_id in active_map_connections:
-            if websocket in active_map_connections[user_id]:
-                active_map_connections[user_id].remove(websocket)
-            if not active_map_connections[user_id]:
-                del active_map_connections[user_id]
-        
-        # Remover dos visualizadores do mapa
-        map_viewers.discard(user_id)
+        # Remover das conexões ativas (e dos visualizadores, se era o último socket)
+        _remove_connection(user_id, sender)
+        await presence.disconnect(user_id)
+        await sender.close()
+        await unsubscribe("map")
         
         print(f"[INFO] Usuário {user_id} removido das conexões do mapa")
 
+set_broadcaster(broadcast_user_location_update)
+
 # Função para notificar mudanças de status online/offline
 async def notify_status_change(user_id: int, is_online: bool):
     """Notificar mudança de status online/offline para visualizadores do mapa"""
     await broadcast_user_online_status(user_id, is_online)
+
+presence.set_transition_listener(notify_status_change)
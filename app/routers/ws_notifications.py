@@ -1,39 +1,64 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from typing import Dict, List
-from app.db import get_connection
+from app.db import acquire_connection
+from app.utils.realtime import publish, publish_many, register_handler, subscribe, unsubscribe
+from app.utils.ws_sender import SocketSender
+from app.utils import presence
+from app.utils.serialization import dumps
+from app.utils.notification_buffer import enqueue_notification
 import json
 from datetime import datetime
 
 router = APIRouter(prefix="/ws", tags=["notifications"])
 
 # Conexões ativas: user_id -> lista de websockets
-active_notifications: Dict[int, List[WebSocket]] = {}
+active_notifications: Dict[int, List[SocketSender]] = {}
 
-async def save_notification(conn, user_id: int, notif_type: str, content: str, related_user_id: int = None):
-    """Insere notificação no banco"""
-    await conn.execute("""
-        INSERT INTO notifications (user_id, type, content, related_user_id)
-        VALUES ($1, $2, $3, $4)
-    """, user_id, notif_type, content, related_user_id)
+def _remove_connection(user_id: int, sender: SocketSender):
+    senders = active_notifications.get(user_id)
+    if senders and sender in senders:
+        senders.remove(sender)
+        if not senders:
+            del active_notifications[user_id]
+
+async def save_notification(conn, user_id: int, notif_type: str, content: str, related_user_id: int = None) -> bool:
+    """Insere notificação no banco (via writer em lote); False se coalescida com uma recente.
+
+    O push em tempo real não depende do retorno: só a linha gravada é coalescida.
+    """
+    return await enqueue_notification(conn, user_id, notif_type, content, related_user_id)
+
+async def _deliver_local(user_id: int, text: str):
+    """Enfileira notificação para os sockets do usuário conectados neste processo"""
+    senders = active_notifications.get(user_id)
+    if not senders:
+        return
+    for sender in list(senders):
+        sender.send(text)
+
+register_handler("user", _deliver_local)
 
 async def push_notification(user_id: int, message: dict):
-    """Envia notificação para todos os sockets do usuário"""
-    if user_id in active_notifications:
-        for ws in active_notifications[user_id]:
-            try:
-                await ws.send_text(json.dumps(message))
-            except Exception as e:
-                print(f"[WARN] Falha ao enviar notificação: {e}")
+    """Envia notificação para todos os sockets do usuário (em qualquer processo)"""
+    await publish("user", user_id, message)
+
+async def push_notifications(notifications: List[dict]):
+    """Envia um lote de notificações (cada uma para o seu user_id)"""
+    await publish_many([("user", n["user_id"], n) for n in notifications])
 
 @router.websocket("/notifications/{user_id}")
-async def notifications_socket(websocket: WebSocket, user_id: int, conn=Depends(get_connection)):
+async def notifications_socket(websocket: WebSocket, user_id: int):
     print(f"[INFO] Tentando conectar WebSocket de notificações para usuário {user_id}")
     await websocket.accept()
     print(f"[INFO] WebSocket de notificações conectado para usuário {user_id}")
 
+    sender = SocketSender(websocket, on_evict=lambda s: _remove_connection(user_id, s))
+
     if user_id not in active_notifications:
         active_notifications[user_id] = []
-    active_notifications[user_id].append(websocket)
+    active_notifications[user_id].append(sender)
+    await presence.connect(user_id)
+    await subscribe("user", user_id)
     print(f"[INFO] Usuário {user_id} adicionado às conexões ativas. Total: {len(active_notifications[user_id])}")
 
     try:
@@ -45,13 +70,14 @@ async def notifications_socket(websocket: WebSocket, user_id: int, conn=Depends(
                 content = data.get("content")
 
                 if not notif_type or not content:
-                    await websocket.send_text(json.dumps({
+                    sender.send(dumps({
                         "error": "Invalid payload. Expected {type, content}"
                     }))
                     continue
 
-                # salvar no banco
-                await save_notification(conn, user_id, notif_type, content)
+                # salvar no banco (conexão do pool só durante a escrita)
+                async with acquire_connection() as conn:
+                    await save_notification(conn, user_id, notif_type, content)
 
                 # criar payload
                 message = {
@@ -65,15 +91,17 @@ async def notifications_socket(websocket: WebSocket, user_id: int, conn=Depends(
                 await push_notification(user_id, message)
 
             except json.JSONDecodeError:
-                await websocket.send_text(json.dumps({
+                sender.send(dumps({
                     "error": "Invalid JSON"
                 }))
 
     except WebSocketDisconnect:
         print(f"[INFO] Notificação WS desconectada: {user_id}")
-        active_notifications[user_id].remove(websocket)
-        if not active_notifications[user_id]:
-            del active_notifications[user_id]
+    finally:
+        _remove_connection(user_id, sender)
+        await presence.disconnect(user_id)
+        await sender.close()
+        await unsubscribe("user", user_id)
 
 # Exportar funções para uso em outros módulos
-__all__ = ["save_notification", "push_notification"]
+__all__ = ["save_notification", "push_notification", "push_notifications"]
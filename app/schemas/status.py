@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class UserStatusOut(BaseModel):
@@ -15,3 +15,6 @@ class StatusUpdateOut(BaseModel):
     message: str
     is_online: bool
     last_seen: datetime
+
+class StatusBatchIn(BaseModel):
+    user_ids: List[int]
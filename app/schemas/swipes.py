@@ -1,6 +1,6 @@
 from pydantic import BaseModel, validator, ConfigDict
 from datetime import datetime
-from typing import Literal
+from typing import List, Literal
 
 class SwipeIn(BaseModel):
     swiper_id: int
@@ -17,6 +17,20 @@ class SwipeIn(BaseModel):
         }
     )
 
+class SwipeBatchIn(BaseModel):
+    swipes: List[SwipeIn]
+
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {
+                "swipes": [
+                    {"swiper_id": 1, "swiped_id": 2, "direction": "like"},
+                    {"swiper_id": 1, "swiped_id": 3, "direction": "dislike"}
+                ]
+            }
+        }
+    )
+
 class SwipeOut(BaseModel):
     swipe_id: int
     swiper_id: int
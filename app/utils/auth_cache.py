@@ -0,0 +1,149 @@
+import asyncio
+import asyncpg
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Hashable, Optional
+from app.db import DATABASE_URL
+from app.utils.jwt import verify_token
+
+# Configuração dos caches de autenticação
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_TTL_SECONDS = int(os.getenv("TOKEN_CACHE_TTL_SECONDS", "300"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", "30"))
+BLACKLIST_RESYNC_SECONDS = int(os.getenv("BLACKLIST_RESYNC_SECONDS", "300"))
+
+# Canal NOTIFY disparado pelo trigger de blacklisted_tokens
+BLACKLIST_CHANNEL = "token_blacklist"
+
+class TTLCache:
+    """Cache LRU com expiração por entrada"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        self._data[key] = (value, time.monotonic() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+# token -> payload decodificado
+token_cache = TTLCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL_SECONDS)
+# user_id -> linha de users usada por get_current_user
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS)
+
+# Blacklist em memória: jti -> expiração (epoch)
+_blacklist: Dict[str, float] = {}
+# Só é autoritativa enquanto o listener estiver conectado
+_blacklist_synced = False
+
+def decode_token_cached(token: str) -> Optional[dict]:
+    """verify_token com cache (respeitando o exp do token)"""
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
+    payload = verify_token(token)
+    if payload is None:
+        return None
+    ttl = TOKEN_CACHE_TTL_SECONDS
+    if payload.get("exp"):
+        ttl = min(ttl, payload["exp"] - time.time())
+    token_cache.set(token, payload, ttl)
+    return payload
+
+def is_token_blacklisted(jti: str) -> Optional[bool]:
+    """Consulta a blacklist em memória (None se ela não estiver sincronizada)"""
+    if not _blacklist_synced:
+        return None
+    expires = _blacklist.get(jti)
+    return expires is not None and expires > time.time()
+
+def add_to_blacklist(jti: str, expires_at: datetime):
+    """Registra JTI invalidado localmente (o NOTIFY avisa os outros processos)"""
+    _blacklist[jti] = expires_at.timestamp()
+
+def get_cached_user(user_id: int) -> Optional[dict]:
+    user = user_cache.get(user_id)
+    return dict(user) if user is not None else None
+
+def cache_user(user: dict):
+    user_cache.set(user["user_id"], dict(user))
+
+def invalidate_user(user_id: int):
+    user_cache.pop(user_id)
+
+def _purge_expired_blacklist():
+    now = time.time()
+    for jti in [jti for jti, expires in _blacklist.items() if expires <= now]:
+        del _blacklist[jti]
+
+async def hydrate_blacklist(conn):
+    """Carrega JTIs ainda válidos de blacklisted_tokens"""
+    rows = await conn.fetch("""
+        SELECT token_jti, expires_at FROM blacklisted_tokens
+        WHERE expires_at > NOW()
+    """)
+    for row in rows:
+        _blacklist[row["token_jti"]] = row["expires_at"].timestamp()
+    _purge_expired_blacklist()
+
+def _on_blacklist_notify(connection, pid, channel, payload):
+    try:
+        jti, expires = payload.rsplit("|", 1)
+        _blacklist[jti] = float(expires)
+    except ValueError:
+        print(f"[WARN] Payload inválido no canal {channel}: {payload}")
+
+async def run_blacklist_listener():
+    """Mantém a blacklist em memória sincronizada via LISTEN/NOTIFY"""
+    global _blacklist_synced
+    while True:
+        conn = None
+        try:
+            conn = await asyncpg.connect(DATABASE_URL)
+            lost = asyncio.Event()
+            conn.add_termination_listener(lambda _conn: lost.set())
+            await conn.add_listener(BLACKLIST_CHANNEL, _on_blacklist_notify)
+            await hydrate_blacklist(conn)
+            _blacklist_synced = True
+
+            # Ressincronizar periodicamente até a conexão cair
+            while not lost.is_set():
+                try:
+                    await asyncio.wait_for(lost.wait(), timeout=BLACKLIST_RESYNC_SECONDS)
+                except asyncio.TimeoutError:
+                    await hydrate_blacklist(conn)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[WARN] Listener da blacklist de tokens falhou: {e}")
+        finally:
+            _blacklist_synced = False
+            if conn is not None and not conn.is_closed():
+                await conn.close()
+        await asyncio.sleep(5)
@@ -0,0 +1,177 @@
+import asyncio
+import os
+from typing import List, Set
+from app.db import acquire_connection
+from app.utils.geo import bounding_box
+
+# Configuração da fila de candidatos do discover
+FEED_BATCH_SIZE = int(os.getenv("DISCOVER_FEED_BATCH_SIZE", "200"))
+FEED_LOW_WATERMARK = int(os.getenv("DISCOVER_FEED_LOW_WATERMARK", "40"))
+FEED_TTL_SECONDS = int(os.getenv("DISCOVER_FEED_TTL_SECONDS", "3600"))
+FEED_PURGE_INTERVAL_SECONDS = int(os.getenv("DISCOVER_FEED_PURGE_INTERVAL_SECONDS", "300"))
+
+# Referências para tarefas em background (evita coleta pelo GC)
+_background_tasks: Set[asyncio.Task] = set()
+# Usuários com reabastecimento em andamento
+_refilling: Set[int] = set()
+
+async def refill_feed(conn, user_id: int, prefs) -> int:
+    """Calcula os próximos candidatos do usuário e os adiciona à fila.
+
+    Respeita preferências (idade, gênero, distância), swipes, visualizações e
+    bloqueios nos dois sentidos. Retorna o número de candidatos inseridos.
+    """
+    min_lat, max_lat, min_lon, max_lon = bounding_box(
+        prefs["latitude"], prefs["longitude"], prefs["max_distance_km"]
+    )
+
+    # Descartar entradas expiradas antes de recalcular
+    await conn.execute("""
+        DELETE FROM discover_feed
+        WHERE user_id = $1 AND created_at < NOW() - make_interval(secs => $2)
+    """, user_id, FEED_TTL_SECONDS)
+
+    result = await conn.execute("""
+        INSERT INTO discover_feed (user_id, candidate_id, fame_rating, distance)
+        SELECT $3, candidate_id, fame_rating, distance FROM (
+            SELECT u.user_id AS candidate_id,
+                   COALESCE(u.fame_rating, 0) AS fame_rating,
+                   (6371 * acos(LEAST(1.0,
+                       cos(radians($1)) * cos(radians(p.latitude)) *
+                       cos(radians(p.longitude) - radians($2)) +
+                       sin(radians($1)) * sin(radians(p.latitude))
+                   ))) AS distance
+            FROM users u
+            JOIN profiles p ON u.user_id = p.user_id
+            WHERE u.user_id <> $3
+              AND p.age BETWEEN $4 AND $5
+              AND ($6 = 'both' OR p.gender = $6)
+              AND p.latitude BETWEEN $9 AND $10
+              AND p.longitude BETWEEN $11 AND $12
+              AND NOT EXISTS (
+                  SELECT 1 FROM profile_views v
+                  WHERE v.viewer_id = $3 AND v.viewed_id = u.user_id
+              )
+              AND NOT EXISTS (
+                  SELECT 1 FROM swipes s
+                  WHERE s.swiper_id = $3 AND s.swiped_id = u.user_id
+              )
+              AND NOT EXISTS (
+                  SELECT 1 FROM blocked_users b
+                  WHERE b.blocker_id = $3 AND b.blocked_id = u.user_id
+              )
+              AND NOT EXISTS (
+                  SELECT 1 FROM blocked_users b
+                  WHERE b.blocker_id = u.user_id AND b.blocked_id = $3
+              )
+              AND NOT EXISTS (
+                  SELECT 1 FROM discover_feed f
+                  WHERE f.user_id = $3 AND f.candidate_id = u.user_id
+              )
+        ) candidates
+        WHERE distance <= $7
+        ORDER BY fame_rating DESC, distance ASC
+        LIMIT $8
+        ON CONFLICT (user_id, candidate_id) DO NOTHING
+    """, prefs["latitude"], prefs["longitude"], user_id,
+         prefs["age_min"], prefs["age_max"], prefs["preferred_gender"],
+         prefs["max_distance_km"], FEED_BATCH_SIZE,
+         min_lat, max_lat, min_lon, max_lon)
+
+    # "INSERT 0 <n>"
+    return int(result.split()[-1])
+
+async def read_feed(conn, user_id: int, limit: int) -> List[dict]:
+    """Lê o topo da fila de candidatos do usuário.
+
+    Os filtros de swipe, visualização e bloqueio são aplicados de novo na
+    leitura: um reabastecimento concorrente pode ter calculado a fila antes
+    de um swipe ser gravado e reinserido o candidato depois que os triggers
+    já limparam a fila.
+    """
+    rows = await conn.fetch("""
+        SELECT u.user_id, u.name, u.fame_rating,
+               p.age, p.bio, p.gender, p.avatar_url,
+               f.distance,
+               COUNT(*) OVER () AS feed_size
+        FROM discover_feed f
+        JOIN users u ON f.candidate_id = u.user_id
+        JOIN profiles p ON f.candidate_id = p.user_id
+        WHERE f.user_id = $1
+          AND f.created_at > NOW() - make_interval(secs => $3)
+          AND NOT EXISTS (
+              SELECT 1 FROM profile_views v
+              WHERE v.viewer_id = $1 AND v.viewed_id = f.candidate_id
+          )
+          AND NOT EXISTS (
+              SELECT 1 FROM swipes s
+              WHERE s.swiper_id = $1 AND s.swiped_id = f.candidate_id
+          )
+          AND NOT EXISTS (
+              SELECT 1 FROM blocked_users b
+              WHERE (b.blocker_id = $1 AND b.blocked_id = f.candidate_id)
+                 OR (b.blocker_id = f.candidate_id AND b.blocked_id = $1)
+          )
+        ORDER BY f.fame_rating DESC, f.distance ASC
+        LIMIT $2
+    """, user_id, limit, FEED_TTL_SECONDS)
+
+    return [dict(r) for r in rows]
+
+async def _refill_in_background(user_id: int, prefs: dict):
+    """Reabastece a fila do usuário usando uma conexão própria"""
+    try:
+        async with acquire_connection() as conn:
+            await refill_feed(conn, user_id, prefs)
+    except Exception as e:
+        print(f"[WARN] Falha ao reabastecer fila do discover do usuário {user_id}: {e}")
+    finally:
+        _refilling.discard(user_id)
+
+def schedule_refill(user_id: int, prefs: dict):
+    """Agenda reabastecimento assíncrono da fila (no máximo um por usuário)"""
+    if user_id in _refilling:
+        return
+    _refilling.add(user_id)
+    task = asyncio.create_task(_refill_in_background(user_id, dict(prefs)))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+async def get_candidates(conn, user_id: int, prefs, limit: int) -> List[dict]:
+    """Serve o discover a partir da fila pré-calculada.
+
+    Se a fila não tem candidatos suficientes, ela é reabastecida na hora;
+    abaixo do limite mínimo, o reabastecimento é feito em background.
+    """
+    rows = await read_feed(conn, user_id, limit)
+
+    if len(rows) < limit:
+        await refill_feed(conn, user_id, prefs)
+        rows = await read_feed(conn, user_id, limit)
+    elif rows and rows[0]["feed_size"] - limit < FEED_LOW_WATERMARK:
+        schedule_refill(user_id, prefs)
+
+    for row in rows:
+        row.pop("feed_size", None)
+
+    return rows
+
+async def purge_expired_entries(conn) -> int:
+    """Remove entradas expiradas de todas as filas"""
+    result = await conn.execute("""
+        DELETE FROM discover_feed
+        WHERE created_at < NOW() - make_interval(secs => $1)
+    """, FEED_TTL_SECONDS)
+    return int(result.split()[-1])
+
+async def run_feed_maintenance():
+    """Job periódico de limpeza das filas do discover"""
+    while True:
+        await asyncio.sleep(FEED_PURGE_INTERVAL_SECONDS)
+        try:
+            async with acquire_connection() as conn:
+                removed = await purge_expired_entries(conn)
+            if removed:
+                print(f"[INFO] {removed} entradas expiradas removidas da fila do discover")
+        except Exception as e:
+            print(f"[WARN] Falha na manutenção da fila do discover: {e}")
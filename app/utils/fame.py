@@ -0,0 +1,62 @@
+import asyncio
+import os
+from app.db import acquire_connection
+
+# Intervalo da reconciliação dos contadores de fame (user_stats)
+FAME_RECONCILE_INTERVAL_SECONDS = int(os.getenv("FAME_RECONCILE_INTERVAL_SECONDS", "3600"))
+
+# Modo deferred (FAME_MODE=deferred): intervalo e tamanho do lote da fila fame_dirty
+FAME_FLUSH_INTERVAL_SECONDS = float(os.getenv("FAME_FLUSH_INTERVAL_SECONDS", "5"))
+FAME_FLUSH_BATCH_SIZE = int(os.getenv("FAME_FLUSH_BATCH_SIZE", "5000"))
+
+async def reconcile_fame(conn) -> int:
+    """Recalcula user_stats a partir das tabelas de origem e corrige fame_rating.
+
+    Retorna o número de usuários cujos contadores estavam divergentes.
+    """
+    return await conn.fetchval("SELECT reconcile_user_stats()")
+
+async def run_fame_reconciliation():
+    """Job periódico de reconciliação dos contadores de fame"""
+    while True:
+        await asyncio.sleep(FAME_RECONCILE_INTERVAL_SECONDS)
+        try:
+            async with acquire_connection() as conn:
+                fixed = await reconcile_fame(conn)
+            if fixed:
+                print(f"[INFO] Reconciliação de fame corrigiu {fixed} usuários")
+        except Exception as e:
+            print(f"[WARN] Falha na reconciliação de fame: {e}")
+
+async def flush_fame_dirty(conn, batch_size: int = FAME_FLUSH_BATCH_SIZE) -> int:
+    """Consome um lote da fila fame_dirty e recalcula os usuários (sem repetição).
+
+    Retorna o número de entradas consumidas da fila.
+    """
+    row = await conn.fetchrow("""
+        WITH drained AS (
+            DELETE FROM fame_dirty
+            WHERE id IN (
+                SELECT id FROM fame_dirty
+                ORDER BY id
+                LIMIT $1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING user_id
+        )
+        SELECT COUNT(*) AS drained,
+               refresh_user_stats(ARRAY(SELECT DISTINCT user_id FROM drained)) AS refreshed
+        FROM drained
+    """, batch_size)
+    return row["drained"]
+
+async def run_fame_worker():
+    """Worker do modo deferred: agrupa usuários marcados e recalcula em lotes"""
+    while True:
+        await asyncio.sleep(FAME_FLUSH_INTERVAL_SECONDS)
+        try:
+            async with acquire_connection() as conn:
+                while await flush_fame_dirty(conn) >= FAME_FLUSH_BATCH_SIZE:
+                    pass
+        except Exception as e:
+            print(f"[WARN] Falha ao processar fila de fame: {e}")
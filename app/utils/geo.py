@@ -1,5 +1,10 @@
+import math
 import httpx
-from typing import Tuple, Optional
+import numpy as np
+from typing import Tuple, Optional, Sequence
+
+# Raio da Terra em km
+EARTH_RADIUS_KM = 6371
 
 async def get_geo_from_ip(ip: str) -> Tuple[float, float, str]:
     """Obtém localização geográfica baseada no IP"""
@@ -23,10 +28,7 @@ async def get_geo_from_ip(ip: str) -> Tuple[float, float, str]:
 
 def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """Calcula distância entre dois pontos usando fórmula de Haversine"""
-    import math
-    
-    # Raio da Terra em km
-    R = 6371
+    R = EARTH_RADIUS_KM
     
     # Converter para radianos
     lat1_rad = math.radians(lat1)
@@ -44,3 +46,75 @@ def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     c = 2 * math.asin(math.sqrt(a))
     
     return R * c
+
+def calculate_distances(lat: float, lon: float, lats: Sequence[float], lons: Sequence[float]) -> np.ndarray:
+    """Calcula (Haversine) a distância de uma origem até N pontos de uma só vez"""
+    lat1_rad = math.radians(lat)
+    lon1_rad = math.radians(lon)
+    lats_rad = np.radians(np.asarray(lats, dtype=np.float64))
+    lons_rad = np.radians(np.asarray(lons, dtype=np.float64))
+
+    dlat = lats_rad - lat1_rad
+    dlon = lons_rad - lon1_rad
+
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1_rad) * np.cos(lats_rad) * np.sin(dlon / 2) ** 2
+    c = 2 * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    return EARTH_RADIUS_KM * c
+
+def nearest_points(
+    lat: float,
+    lon: float,
+    lats: Sequence[float],
+    lons: Sequence[float],
+    radius_km: Optional[float] = None,
+    top_k: Optional[int] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Seleciona pontos por distância a partir de uma origem.
+
+    Retorna (índices, distâncias) dos pontos dentro de radius_km (se informado).
+    Com top_k, retorna apenas os k mais próximos, ordenados por distância.
+    """
+    distances = calculate_distances(lat, lon, lats, lons)
+
+    if radius_km is not None:
+        indices = np.flatnonzero(distances <= radius_km)
+    else:
+        indices = np.arange(distances.size)
+
+    if top_k is not None:
+        if top_k <= 0:
+            indices = indices[:0]
+        elif top_k < indices.size:
+            nearest = np.argpartition(distances[indices], top_k - 1)[:top_k]
+            indices = indices[nearest]
+        indices = indices[np.argsort(distances[indices], kind="stable")]
+
+    return indices, distances[indices]
+
+def bounding_box(lat: float, lon: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """Retângulo (min_lat, max_lat, min_lon, max_lon) que contém o círculo de raio radius_km.
+
+    Usado como pré-filtro indexável (idx_profiles_location) antes do cálculo exato
+    da distância. Perto dos polos ou do antimeridiano a longitude não é restringida.
+    """
+    angular = radius_km / EARTH_RADIUS_KM
+    lat_delta = math.degrees(angular)
+    min_lat = lat - lat_delta
+    max_lat = lat + lat_delta
+
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), min(max_lat, 90.0), -180.0, 180.0
+
+    ratio = math.sin(angular) / math.cos(math.radians(lat))
+    if ratio >= 1:
+        return min_lat, max_lat, -180.0, 180.0
+
+    lon_delta = math.degrees(math.asin(ratio))
+    min_lon = lon - lon_delta
+    max_lon = lon + lon_delta
+
+    if min_lon < -180 or max_lon > 180:
+        return min_lat, max_lat, -180.0, 180.0
+
+    return min_lat, max_lat, min_lon, max_lon
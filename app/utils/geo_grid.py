@@ -0,0 +1,159 @@
+import math
+import os
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+from app.utils.geo import bounding_box, calculate_distance
+
+# Tamanho da célula da grade (graus) e limite de células por região
+MAP_GRID_CELL_DEGREES = float(os.getenv("MAP_GRID_CELL_DEGREES", "0.5"))
+MAP_GRID_MAX_CELLS = int(os.getenv("MAP_GRID_MAX_CELLS", "400"))
+
+class Region:
+    """Área de interesse de um visualizador do mapa (retângulo, opcionalmente com raio)"""
+
+    def __init__(
+        self,
+        min_lat: float,
+        max_lat: float,
+        min_lon: float,
+        max_lon: float,
+        center: Optional[Tuple[float, float]] = None,
+        radius_km: Optional[float] = None,
+    ):
+        self.min_lat = min_lat
+        self.max_lat = max_lat
+        # min_lon > max_lon indica que a região cruza o antimeridiano
+        self.min_lon = min_lon
+        self.max_lon = max_lon
+        self.center = center
+        self.radius_km = radius_km
+
+    def lon_ranges(self) -> List[Tuple[float, float]]:
+        if self.min_lon <= self.max_lon:
+            return [(self.min_lon, self.max_lon)]
+        return [(self.min_lon, 180.0), (-180.0, self.max_lon)]
+
+    def contains(self, lat: float, lon: float) -> bool:
+        if not self.min_lat <= lat <= self.max_lat:
+            return False
+        if not any(lo <= lon <= hi for lo, hi in self.lon_ranges()):
+            return False
+        if self.radius_km is not None:
+            return calculate_distance(self.center[0], self.center[1], lat, lon) <= self.radius_km
+        return True
+
+    def to_dict(self) -> dict:
+        if self.radius_km is not None:
+            return {
+                "latitude": self.center[0],
+                "longitude": self.center[1],
+                "radius_km": self.radius_km,
+            }
+        return {
+            "north": self.max_lat,
+            "south": self.min_lat,
+            "east": self.max_lon,
+            "west": self.min_lon,
+        }
+
+def _valid_lat(value) -> bool:
+    return isinstance(value, (int, float)) and -90 <= value <= 90
+
+def _valid_lon(value) -> bool:
+    return isinstance(value, (int, float)) and -180 <= value <= 180
+
+def region_from_bounds(north, south, east, west) -> Optional[Region]:
+    """Região a partir do viewport do cliente (None se inválido)"""
+    if not (_valid_lat(north) and _valid_lat(south) and _valid_lon(east) and _valid_lon(west)):
+        return None
+    if south > north:
+        return None
+    return Region(south, north, west, east)
+
+def region_from_radius(latitude, longitude, radius_km) -> Optional[Region]:
+    """Região circular ao redor de um ponto (None se inválido)"""
+    if not (_valid_lat(latitude) and _valid_lon(longitude)):
+        return None
+    if not isinstance(radius_km, (int, float)) or radius_km <= 0:
+        return None
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_km)
+    return Region(
+        min_lat, max_lat, min_lon, max_lon,
+        center=(latitude, longitude), radius_km=radius_km
+    )
+
+class ViewportIndex:
+    """Índice em grade dos visualizadores do mapa.
+
+    Cada membro fica nas células cobertas pela sua região; regiões grandes
+    demais (mapa muito afastado) ficam numa lista à parte. Membros sem região
+    recebem todos os eventos.
+    """
+
+    def __init__(self, cell_degrees: float = MAP_GRID_CELL_DEGREES, max_cells: int = MAP_GRID_MAX_CELLS):
+        self.cell_degrees = cell_degrees
+        self.max_cells = max_cells
+        self._rows = math.ceil(180 / cell_degrees)
+        self._cols = math.ceil(360 / cell_degrees)
+        self._cells: Dict[Tuple[int, int], Set[Hashable]] = {}
+        self._wide: Set[Hashable] = set()
+        self._unscoped: Set[Hashable] = set()
+        self._regions: Dict[Hashable, Region] = {}
+        self._member_cells: Dict[Hashable, List[Tuple[int, int]]] = {}
+
+    def _row(self, lat: float) -> int:
+        return min(int((lat + 90) // self.cell_degrees), self._rows - 1)
+
+    def _col(self, lon: float) -> int:
+        return min(int((lon + 180) // self.cell_degrees), self._cols - 1)
+
+    def _cells_for(self, region: Region) -> Optional[List[Tuple[int, int]]]:
+        rows = range(self._row(region.min_lat), self._row(region.max_lat) + 1)
+        cols: List[int] = []
+        for lo, hi in region.lon_ranges():
+            cols.extend(range(self._col(lo), self._col(hi) + 1))
+        if len(rows) * len(cols) > self.max_cells:
+            return None
+        return [(r, c) for r in rows for c in cols]
+
+    def add(self, member: Hashable):
+        """Registra um membro sem região (recebe tudo)"""
+        self.remove(member)
+        self._unscoped.add(member)
+
+    def set_region(self, member: Hashable, region: Region):
+        self.remove(member)
+        self._regions[member] = region
+        cells = self._cells_for(region)
+        if cells is None:
+            self._wide.add(member)
+            return
+        self._member_cells[member] = cells
+        for cell in cells:
+            self._cells.setdefault(cell, set()).add(member)
+
+    def get_region(self, member: Hashable) -> Optional[Region]:
+        return self._regions.get(member)
+
+    def remove(self, member: Hashable):
+        self._unscoped.discard(member)
+        self._wide.discard(member)
+        self._regions.pop(member, None)
+        for cell in self._member_cells.pop(member, ()):
+            members = self._cells.get(cell)
+            if members is not None:
+                members.discard(member)
+                if not members:
+                    del self._cells[cell]
+
+    def matching(self, lat: float, lon: float) -> Iterable[Hashable]:
+        """Membros interessados em um evento no ponto (lat, lon)"""
+        yield from list(self._unscoped)
+        cell_members = self._cells.get((self._row(lat), self._col(lon)), ())
+        for member in list(cell_members) + list(self._wide):
+            region = self._regions.get(member)
+            if region is not None and region.contains(lat, lon):
+                yield member
+
+    def all(self) -> Iterable[Hashable]:
+        yield from list(self._unscoped)
+        yield from list(self._regions)
@@ -0,0 +1,138 @@
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from app.db import acquire_connection
+from app.utils.geo import calculate_distance
+
+# Configuração da coalescência de localizações vindas do mapa
+LOCATION_FLUSH_INTERVAL_SECONDS = float(os.getenv("LOCATION_FLUSH_INTERVAL_SECONDS", "2"))
+LOCATION_BROADCAST_MIN_INTERVAL_SECONDS = float(os.getenv("LOCATION_BROADCAST_MIN_INTERVAL_SECONDS", "5"))
+LOCATION_MIN_MOVEMENT_METERS = float(os.getenv("LOCATION_MIN_MOVEMENT_METERS", "25"))
+
+# Última posição de cada usuário ainda não gravada em profiles
+_pending_writes: Dict[int, Tuple[float, float]] = {}
+# Última posição divulgada: user_id -> (monotonic, lat, lon)
+_last_broadcast: Dict[int, Tuple[float, float, float]] = {}
+# Posições seguradas pelo limite de taxa, divulgadas no próximo tick
+_throttled: Dict[int, Tuple[float, float]] = {}
+
+_flusher_running = False
+
+Broadcaster = Callable[[int, float, float, bool], Awaitable[None]]
+_broadcaster: Optional[Broadcaster] = None
+
+def set_broadcaster(broadcaster: Broadcaster):
+    """Registra a função que divulga posições aos visualizadores do mapa"""
+    global _broadcaster
+    _broadcaster = broadcaster
+
+async def _flush_user_now(user_id: int, latitude: float, longitude: float):
+    async with acquire_connection() as conn:
+        await conn.execute("""
+            UPDATE profiles
+            SET latitude = $1, longitude = $2
+            WHERE user_id = $3
+              AND (latitude, longitude) IS DISTINCT FROM ($1, $2)
+        """, latitude, longitude, user_id)
+
+async def record_location(user_id: int, latitude: float, longitude: float):
+    """Guarda a posição mais recente do usuário e divulga respeitando o limite de taxa.
+
+    A gravação em profiles é feita em lote pelo flusher; sem ele (fora do
+    lifespan) a posição é gravada na hora.
+    """
+    if _flusher_running:
+        _pending_writes[user_id] = (latitude, longitude)
+    else:
+        await _flush_user_now(user_id, latitude, longitude)
+
+    now = time.monotonic()
+    last = _last_broadcast.get(user_id)
+    if last is not None:
+        last_at, last_lat, last_lon = last
+        moved_m = calculate_distance(last_lat, last_lon, latitude, longitude) * 1000
+        if moved_m < LOCATION_MIN_MOVEMENT_METERS:
+            # Movimento desprezível: nada a divulgar
+            _throttled.pop(user_id, None)
+            return
+        if now - last_at < LOCATION_BROADCAST_MIN_INTERVAL_SECONDS:
+            _throttled[user_id] = (latitude, longitude)
+            return
+
+    _throttled.pop(user_id, None)
+    _last_broadcast[user_id] = (now, latitude, longitude)
+    if _broadcaster is not None:
+        await _broadcaster(user_id, latitude, longitude, True)
+
+def forget_user(user_id: int):
+    """Descarta o estado de divulgação quando o usuário sai do mapa"""
+    _last_broadcast.pop(user_id, None)
+    _throttled.pop(user_id, None)
+
+async def flush_locations(conn) -> int:
+    """Grava as posições pendentes com um único UPDATE ... FROM UNNEST.
+
+    Linhas cuja posição não mudou ficam de fora (sem tupla morta nem triggers).
+    """
+    if not _pending_writes:
+        return 0
+    batch = dict(_pending_writes)
+    _pending_writes.clear()
+
+    user_ids = list(batch)
+    try:
+        await conn.execute("""
+            UPDATE profiles p
+            SET latitude = v.latitude, longitude = v.longitude
+            FROM UNNEST($1::int[], $2::float8[], $3::float8[]) AS v(user_id, latitude, longitude)
+            WHERE p.user_id = v.user_id
+              AND (p.latitude, p.longitude) IS DISTINCT FROM (v.latitude, v.longitude)
+        """, user_ids, [batch[u][0] for u in user_ids], [batch[u][1] for u in user_ids])
+    except Exception:
+        # Devolver ao buffer sem sobrescrever posições mais novas
+        for user_id, position in batch.items():
+            _pending_writes.setdefault(user_id, position)
+        raise
+    return len(batch)
+
+async def _broadcast_throttled():
+    """Divulga posições seguradas cujo intervalo mínimo já passou"""
+    if _broadcaster is None:
+        return
+    now = time.monotonic()
+    for user_id, (latitude, longitude) in list(_throttled.items()):
+        last = _last_broadcast.get(user_id)
+        if last is not None and now - last[0] < LOCATION_BROADCAST_MIN_INTERVAL_SECONDS:
+            continue
+        del _throttled[user_id]
+        _last_broadcast[user_id] = (now, latitude, longitude)
+        await _broadcaster(user_id, latitude, longitude, True)
+
+async def _tick():
+    try:
+        await _broadcast_throttled()
+    except Exception as e:
+        print(f"[WARN] Falha ao divulgar posições seguradas: {e}")
+    try:
+        async with acquire_connection() as conn:
+            await flush_locations(conn)
+    except Exception as e:
+        print(f"[WARN] Falha ao gravar lote de localizações: {e}")
+
+async def run_location_flusher():
+    """Grava e divulga periodicamente as posições coalescidas"""
+    global _flusher_running
+    _flusher_running = True
+    try:
+        while True:
+            await asyncio.sleep(LOCATION_FLUSH_INTERVAL_SECONDS)
+            await _tick()
+    finally:
+        _flusher_running = False
+        # Último lote no shutdown
+        try:
+            async with acquire_connection() as conn:
+                await flush_locations(conn)
+        except Exception as e:
+            print(f"[WARN] Falha ao gravar localizações pendentes no shutdown: {e}")
@@ -0,0 +1,134 @@
+import asyncio
+import os
+from collections import deque
+from datetime import datetime
+from typing import Callable, Deque, List, Optional, Tuple
+from app.db import acquire_connection
+
+# Persistência das mensagens do chat via WebSocket:
+#   "sync"         -> INSERT por mensagem antes do broadcast (padrão)
+#   "batched"      -> grava em lote e só faz broadcast depois do commit (flush-before-ack)
+#   "write_behind" -> broadcast imediato; o lote é gravado em até CHAT_FLUSH_INTERVAL_MS
+CHAT_PERSIST_MODE = os.getenv("CHAT_PERSIST_MODE", "sync")
+if CHAT_PERSIST_MODE not in ("sync", "batched", "write_behind"):
+    raise ValueError(
+        f"Invalid CHAT_PERSIST_MODE: {CHAT_PERSIST_MODE!r} (expected 'sync', 'batched' or 'write_behind')"
+    )
+CHAT_FLUSH_INTERVAL_MS = int(os.getenv("CHAT_FLUSH_INTERVAL_MS", "50"))
+CHAT_FLUSH_BATCH_SIZE = int(os.getenv("CHAT_FLUSH_BATCH_SIZE", "500"))
+MESSAGE_ID_BLOCK_SIZE = int(os.getenv("MESSAGE_ID_BLOCK_SIZE", "100"))
+
+MESSAGE_COLUMNS = ["message_id", "chat_id", "sender_id", "content", "sent_at"]
+
+# Registro (message_id, chat_id, sender_id, content, sent_at) + future do commit
+_pending: List[Tuple[tuple, asyncio.Future]] = []
+# IDs reservados da sequence de messages
+_reserved_ids: Deque[int] = deque()
+_id_lock = asyncio.Lock()
+_wake = asyncio.Event()
+_flusher_running = False
+
+def is_buffered() -> bool:
+    """Indica se as mensagens do WebSocket passam pelo buffer de escrita"""
+    return CHAT_PERSIST_MODE != "sync" and _flusher_running
+
+async def reserve_message_id() -> int:
+    """Reserva um message_id (em blocos, para não ir ao banco a cada mensagem)"""
+    async with _id_lock:
+        if not _reserved_ids:
+            async with acquire_connection() as conn:
+                rows = await conn.fetch("""
+                    SELECT nextval(pg_get_serial_sequence('messages', 'message_id')) AS id
+                    FROM generate_series(1, $1)
+                """, MESSAGE_ID_BLOCK_SIZE)
+            _reserved_ids.extend(sorted(r["id"] for r in rows))
+        return _reserved_ids.popleft()
+
+async def enqueue_message(chat_id: int, sender_id: int, content: str, sent_at: datetime):
+    """Coloca a mensagem no buffer; retorna (message_id, future resolvido no commit)"""
+    message_id = await reserve_message_id()
+    saved = asyncio.get_running_loop().create_future()
+    _pending.append(((message_id, chat_id, sender_id, content, sent_at), saved))
+    if len(_pending) >= CHAT_FLUSH_BATCH_SIZE:
+        _wake.set()
+    return message_id, saved
+
+def on_save_failure(saved: asyncio.Future, callback: Callable[[Exception], None]):
+    """Chama callback se a gravação da mensagem falhar (modo write_behind)"""
+    def _done(future: asyncio.Future):
+        if future.cancelled():
+            return
+        exc = future.exception()
+        if exc is not None:
+            callback(exc)
+    saved.add_done_callback(_done)
+
+def _resolve(saved: asyncio.Future, exc: Optional[Exception] = None):
+    if saved.done():
+        return
+    if exc is None:
+        saved.set_result(True)
+    else:
+        saved.set_exception(exc)
+
+async def flush_messages(conn) -> int:
+    """Grava o buffer com COPY; se o lote falhar, isola as mensagens inválidas linha a linha"""
+    if not _pending:
+        return 0
+    batch = _pending[:CHAT_FLUSH_BATCH_SIZE]
+    del _pending[:len(batch)]
+
+    try:
+        await conn.copy_records_to_table(
+            "messages", records=[record for record, _ in batch], columns=MESSAGE_COLUMNS
+        )
+    except Exception as e:
+        print(f"[ERROR] Falha ao gravar lote de {len(batch)} mensagens: {e}; tentando uma a uma")
+        saved_count = 0
+        for record, saved in batch:
+            try:
+                await conn.execute("""
+                    INSERT INTO messages (message_id, chat_id, sender_id, content, sent_at)
+                    VALUES ($1, $2, $3, $4, $5)
+                """, *record)
+                saved_count += 1
+                _resolve(saved)
+            except Exception as row_error:
+                print(f"[ERROR] Mensagem {record[0]} do chat {record[1]} não foi gravada: {row_error}")
+                _resolve(saved, row_error)
+        return saved_count
+
+    for _, saved in batch:
+        _resolve(saved)
+    return len(batch)
+
+async def _flush_all():
+    while _pending:
+        try:
+            async with acquire_connection() as conn:
+                await flush_messages(conn)
+        except Exception as e:
+            # Sem conexão: falha todas as mensagens pendentes em vez de segurá-las
+            print(f"[ERROR] Sem conexão para gravar mensagens do chat: {e}")
+            batch = _pending[:]
+            _pending.clear()
+            for _, saved in batch:
+                _resolve(saved, e)
+
+async def run_message_flusher():
+    """Grava as mensagens do buffer a cada CHAT_FLUSH_INTERVAL_MS (ou quando o lote enche)"""
+    global _flusher_running
+    if CHAT_PERSIST_MODE == "sync":
+        return
+    _flusher_running = True
+    try:
+        while True:
+            try:
+                await asyncio.wait_for(_wake.wait(), timeout=CHAT_FLUSH_INTERVAL_MS / 1000)
+            except asyncio.TimeoutError:
+                pass
+            _wake.clear()
+            await _flush_all()
+    finally:
+        _flusher_running = False
+        await _flush_all()
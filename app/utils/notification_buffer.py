@@ -0,0 +1,199 @@
+import asyncio
+import asyncpg
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from app.db import acquire_connection
+
+# Eventos repetidos (usuário, tipo, usuário relacionado) dentro da janela viram uma notificação só
+NOTIFICATION_COALESCE_WINDOW_SECONDS = float(os.getenv("NOTIFICATION_COALESCE_WINDOW_SECONDS", "3600"))
+# Mensagens: janela curta, só para rajadas do mesmo remetente
+NOTIFICATION_MESSAGE_COALESCE_WINDOW_SECONDS = float(os.getenv("NOTIFICATION_MESSAGE_COALESCE_WINDOW_SECONDS", "60"))
+# Intervalo do writer em lote (também é a janela em que rajadas viram resumo)
+NOTIFICATION_FLUSH_INTERVAL_SECONDS = float(os.getenv("NOTIFICATION_FLUSH_INTERVAL_SECONDS", "5"))
+NOTIFICATION_FLUSH_BATCH_SIZE = int(os.getenv("NOTIFICATION_FLUSH_BATCH_SIZE", "1000"))
+# Limite do buffer enquanto o banco está indisponível (as mais antigas são descartadas)
+NOTIFICATION_BUFFER_MAX_SIZE = int(os.getenv("NOTIFICATION_BUFFER_MAX_SIZE", "50000"))
+# A partir de quantos eventos do mesmo tipo no lote o usuário recebe um resumo
+NOTIFICATION_DIGEST_MIN_EVENTS = int(os.getenv("NOTIFICATION_DIGEST_MIN_EVENTS", "3"))
+
+# Janela de coalescência por tipo (só eventos ligados a outro usuário)
+COALESCE_WINDOWS = {
+    "view": NOTIFICATION_COALESCE_WINDOW_SECONDS,
+    "like": NOTIFICATION_COALESCE_WINDOW_SECONDS,
+    "message": NOTIFICATION_MESSAGE_COALESCE_WINDOW_SECONDS,
+}
+# Resumos de rajadas por tipo
+DIGEST_TEMPLATES = {
+    "view": "{count} pessoas visualizaram seu perfil 👁️",
+    "like": "{count} pessoas curtiram seu perfil ❤️",
+}
+
+# (user_id, type, content, related_user_id, created_at)
+Notification = Tuple[int, str, str, Optional[int], datetime]
+
+_pending: List[Notification] = []
+# Último evento registrado por chave: (user_id, type, related_user_id) -> epoch
+_recent: Dict[Tuple[int, str, int], float] = {}
+_flusher_running = False
+
+# Descarta no banco também os repetidos gravados por outros processos (idx_notifications_dedupe)
+INSERT_SQL = """
+    INSERT INTO notifications (user_id, type, content, related_user_id, created_at)
+    SELECT v.user_id, v.type, v.content, v.related_user_id, v.created_at
+    FROM UNNEST($1::int[], $2::varchar[], $3::text[], $4::int[], $5::timestamptz[], $6::float8[])
+         AS v(user_id, type, content, related_user_id, created_at, window_secs)
+    WHERE v.related_user_id IS NULL
+       OR v.window_secs = 0
+       OR NOT EXISTS (
+           SELECT 1 FROM notifications n
+           WHERE n.user_id = v.user_id
+             AND n.type = v.type
+             AND n.related_user_id = v.related_user_id
+             AND n.created_at > v.created_at - make_interval(secs => v.window_secs)
+       )
+"""
+
+def _is_duplicate(user_id: int, notif_type: str, related_user_id: Optional[int], now: float) -> bool:
+    window = COALESCE_WINDOWS.get(notif_type)
+    if related_user_id is None or window is None:
+        return False
+    key = (user_id, notif_type, related_user_id)
+    last = _recent.get(key)
+    if last is not None and now - last < window:
+        return True
+    _recent[key] = now
+    return False
+
+def _forget(record: Notification):
+    """Libera a chave de coalescência de uma notificação que não foi gravada"""
+    key = (record[0], record[1], record[3])
+    if _recent.get(key) == record[4].timestamp():
+        del _recent[key]
+
+def _trim():
+    overflow = len(_pending) - NOTIFICATION_BUFFER_MAX_SIZE
+    if overflow <= 0:
+        return
+    print(f"[ERROR] Buffer de notificações cheio; descartando as {overflow} mais antigas")
+    for record in _pending[:overflow]:
+        _forget(record)
+    del _pending[:overflow]
+
+async def _insert(conn, batch: List[Notification]):
+    columns = [list(c) for c in zip(*batch)]
+    windows = [COALESCE_WINDOWS.get(notif_type, 0.0) for notif_type in columns[1]]
+    await conn.execute(INSERT_SQL, *columns, windows)
+
+async def enqueue_notification(
+    conn, user_id: int, notif_type: str, content: str, related_user_id: Optional[int] = None
+) -> bool:
+    """Registra a notificação; retorna False se ela foi coalescida com uma recente.
+
+    A coalescência vale só para a linha gravada: o envio em tempo real é
+    responsabilidade de quem chama e acontece de qualquer forma.
+
+    Com o writer rodando a gravação vai para o lote; sem ele (fora do
+    lifespan) é gravada na hora com a conexão recebida.
+    """
+    created_at = datetime.fromtimestamp(time.time(), tz=timezone.utc)
+    if _is_duplicate(user_id, notif_type, related_user_id, created_at.timestamp()):
+        return False
+    record = (user_id, notif_type, content, related_user_id, created_at)
+    if _flusher_running:
+        _pending.append(record)
+        _trim()
+    else:
+        try:
+            await _insert(conn, [record])
+        except Exception:
+            _forget(record)
+            raise
+    return True
+
+def _apply_digests(batch: List[Notification]) -> List[Notification]:
+    """Troca rajadas do mesmo tipo para o mesmo usuário por uma notificação de resumo"""
+    groups: Dict[Tuple[int, str], List[Notification]] = {}
+    for record in batch:
+        if record[1] in DIGEST_TEMPLATES:
+            groups.setdefault((record[0], record[1]), []).append(record)
+
+    digested = set()
+    result: List[Notification] = []
+    for record in batch:
+        key = (record[0], record[1])
+        group = groups.get(key)
+        if group is None or len(group) < NOTIFICATION_DIGEST_MIN_EVENTS:
+            result.append(record)
+        elif key not in digested:
+            digested.add(key)
+            content = DIGEST_TEMPLATES[record[1]].format(count=len(group))
+            result.append((record[0], record[1], content, None, group[-1][4]))
+    return result
+
+def _prune_recent():
+    cutoff = time.time() - max(COALESCE_WINDOWS.values())
+    for key, seen in list(_recent.items()):
+        if seen < cutoff:
+            del _recent[key]
+
+async def flush_notifications(conn) -> int:
+    """Grava o lote com um único INSERT ... SELECT FROM UNNEST.
+
+    Erro do banco no lote: grava uma a uma (sem resumo) e descarta só as
+    inválidas. Falha de conexão (no lote ou no meio da gravação uma a uma):
+    o que ainda não foi gravado volta para o buffer.
+    """
+    if not _pending:
+        return 0
+    raw = _pending[:NOTIFICATION_FLUSH_BATCH_SIZE]
+    del _pending[:len(raw)]
+    batch = _apply_digests(raw)
+
+    try:
+        await _insert(conn, batch)
+    except asyncpg.PostgresError as e:
+        print(f"[ERROR] Falha ao gravar lote de {len(batch)} notificações: {e}; tentando uma a uma")
+        saved_count = 0
+        for index, record in enumerate(raw):
+            try:
+                await _insert(conn, [record])
+                saved_count += 1
+            except asyncpg.PostgresError as row_error:
+                print(f"[ERROR] Notificação para o usuário {record[0]} não foi gravada: {row_error}")
+                _forget(record)
+            except Exception:
+                # Conexão caiu no meio: o que ainda não foi gravado volta para o buffer
+                _pending[:0] = raw[index:]
+                _trim()
+                raise
+        return saved_count
+    except Exception:
+        _pending[:0] = raw
+        _trim()
+        raise
+    return len(batch)
+
+async def _flush_all():
+    while _pending:
+        try:
+            async with acquire_connection() as conn:
+                await flush_notifications(conn)
+        except Exception as e:
+            # Mantém o buffer e tenta de novo no próximo ciclo
+            print(f"[WARN] Falha ao gravar {len(_pending)} notificações; nova tentativa no próximo ciclo: {e}")
+            return
+
+async def run_notification_flusher():
+    """Grava as notificações do buffer a cada NOTIFICATION_FLUSH_INTERVAL_SECONDS"""
+    global _flusher_running
+    _flusher_running = True
+    try:
+        while True:
+            await asyncio.sleep(NOTIFICATION_FLUSH_INTERVAL_SECONDS)
+            await _flush_all()
+            _prune_recent()
+    finally:
+        _flusher_running = False
+        await _flush_all()
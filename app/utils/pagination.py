@@ -0,0 +1,32 @@
+import base64
+import binascii
+from datetime import datetime
+from typing import List, Tuple
+from fastapi import HTTPException, Response
+
+# Header com o cursor da próxima página (paginação keyset)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """Gera cursor opaco a partir de (timestamp, id) da última linha"""
+    raw = f"{timestamp.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decodifica cursor opaco em (timestamp, id)"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        timestamp, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def set_next_cursor(response: Response, rows: List[dict], limit: int, timestamp_key: str, id_key: str):
+    """Define o header X-Next-Cursor quando a página veio cheia"""
+    if not rows or len(rows) < limit:
+        return
+    last = rows[-1]
+    if last[timestamp_key] is None:
+        return
+    response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last[timestamp_key], last[id_key])
@@ -1,4 +1,19 @@
+import asyncio
 import bcrypt
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from fastapi import HTTPException
+
+# Custo do bcrypt (log2 das iterações)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Threads dedicadas ao bcrypt (a lib libera o GIL durante o hash)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Máximo de operações em execução + na fila antes de recusar com 503
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_pending = 0
 
 COMMON_PASSWORDS = {
     "password", "123456", "qwerty", "abc123", "senha", "reset", "login",
@@ -43,8 +58,47 @@ def validate_password(password: str):
 
 def hash_password(password: str) -> str:
     """Gera hash da senha usando bcrypt"""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
 
 def verify_password(password: str, hashed: str) -> bool:
     """Verifica se a senha corresponde ao hash"""
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt"
+        )
+    return _executor
+
+async def _run_bounded(func, *args):
+    """Executa o bcrypt fora do event loop, recusando quando a fila está cheia"""
+    global _pending
+    if _pending >= PASSWORD_HASH_MAX_PENDING:
+        raise HTTPException(
+            status_code=503,
+            detail="Server busy, please try again",
+            headers={"Retry-After": "1"},
+        )
+    _pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), func, *args)
+    finally:
+        _pending -= 1
+
+async def hash_password_async(password: str) -> str:
+    """hash_password sem bloquear o event loop"""
+    return await _run_bounded(hash_password, password)
+
+async def verify_password_async(password: str, hashed: str) -> bool:
+    """verify_password sem bloquear o event loop"""
+    return await _run_bounded(verify_password, password, hashed)
+
+def shutdown_password_executor():
+    """Encerra as threads do bcrypt (chamado no shutdown da aplicação)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,196 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+from app.db import acquire_connection
+
+# Janela em que a última atividade mantém o usuário online
+PRESENCE_TIMEOUT_SECONDS = int(os.getenv("PRESENCE_TIMEOUT_SECONDS", "180"))
+# Intervalo do job que grava last_seen e detecta quem ficou offline
+PRESENCE_FLUSH_INTERVAL_SECONDS = float(os.getenv("PRESENCE_FLUSH_INTERVAL_SECONDS", "10"))
+# Gravação preguiçosa: no máximo uma escrita de last_seen por usuário neste intervalo
+PRESENCE_PERSIST_MIN_INTERVAL_SECONDS = float(os.getenv("PRESENCE_PERSIST_MIN_INTERVAL_SECONDS", "60"))
+
+# Sessões WebSocket abertas neste processo: user_id -> quantidade
+_sessions: Dict[int, int] = {}
+# Última atividade conhecida neste processo: user_id -> epoch
+_last_seen: Dict[int, float] = {}
+# Último last_seen gravado em users: user_id -> epoch
+_persisted: Dict[int, float] = {}
+# Usuários anunciados como online por este processo (para emitir transições)
+_online: Set[int] = set()
+
+Listener = Callable[[int, bool], Awaitable[None]]
+_listener: Optional[Listener] = None
+
+def set_transition_listener(listener: Listener):
+    """Registra quem recebe as transições online/offline (ex.: broadcast do mapa)"""
+    global _listener
+    _listener = listener
+
+def _is_locally_online(user_id: int, now: Optional[float] = None) -> bool:
+    if user_id in _sessions:
+        return True
+    seen = _last_seen.get(user_id)
+    now = time.time() if now is None else now
+    return seen is not None and now - seen <= PRESENCE_TIMEOUT_SECONDS
+
+async def _fetch_last_seen(user_ids: List[int]) -> Dict[int, Optional[datetime]]:
+    """last_seen gravado em users (por qualquer processo)"""
+    async with acquire_connection() as conn:
+        rows = await conn.fetch(
+            "SELECT user_id, last_seen FROM users WHERE user_id = ANY($1::int[])", user_ids
+        )
+    return {r["user_id"]: r["last_seen"] for r in rows}
+
+async def _emit_transition(user_id: int, persisted: Optional[Dict[int, Optional[datetime]]] = None):
+    online = _is_locally_online(user_id)
+    if online == (user_id in _online):
+        return
+    if not online:
+        # A presença em memória é só deste processo: antes de anunciar offline no
+        # canal compartilhado, confere o last_seen gravado. Se outro processo ainda
+        # vê o usuário, ele segue em _online e o job tenta de novo no próximo ciclo.
+        if persisted is None:
+            try:
+                persisted = await _fetch_last_seen([user_id])
+            except Exception as e:
+                print(f"[WARN] Falha ao conferir last_seen do usuário {user_id}: {e}")
+                return
+        if is_online(user_id, persisted.get(user_id)):
+            return
+    if online:
+        _online.add(user_id)
+    else:
+        _online.discard(user_id)
+    if _listener is not None:
+        try:
+            await _listener(user_id, online)
+        except Exception as e:
+            print(f"[WARN] Falha ao notificar mudança de presença do usuário {user_id}: {e}")
+
+async def connect(user_id: int):
+    """Registra uma sessão WebSocket aberta pelo usuário"""
+    _sessions[user_id] = _sessions.get(user_id, 0) + 1
+    _last_seen[user_id] = time.time()
+    await _emit_transition(user_id)
+
+async def disconnect(user_id: int):
+    """Encerra uma sessão WebSocket (o usuário segue online até o timeout)"""
+    count = _sessions.get(user_id, 0) - 1
+    if count > 0:
+        _sessions[user_id] = count
+    else:
+        _sessions.pop(user_id, None)
+    _last_seen[user_id] = time.time()
+    await _emit_transition(user_id)
+
+async def heartbeat(user_id: int):
+    """Registra atividade do usuário (PUT /status/online)"""
+    _last_seen[user_id] = time.time()
+    await _emit_transition(user_id)
+
+async def go_offline(user_id: int):
+    """Saída explícita (PUT /status/online com is_online=false)"""
+    if user_id in _sessions:
+        return
+    seen = _last_seen.get(user_id)
+    if seen is not None:
+        # Mantém o last_seen, mas fora da janela de online
+        _last_seen[user_id] = min(seen, time.time() - PRESENCE_TIMEOUT_SECONDS - 1)
+    await _emit_transition(user_id)
+
+def _as_epoch(value: Optional[datetime]) -> Optional[float]:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+def is_online(user_id: int, persisted_last_seen: Optional[datetime] = None) -> bool:
+    """Fonte única de is_online: sessão/atividade neste processo ou last_seen gravado
+    (por qualquer processo) dentro de PRESENCE_TIMEOUT_SECONDS."""
+    now = time.time()
+    if _is_locally_online(user_id, now):
+        return True
+    persisted = _as_epoch(persisted_last_seen)
+    return persisted is not None and now - persisted <= PRESENCE_TIMEOUT_SECONDS
+
+def last_seen(user_id: int, persisted_last_seen: Optional[datetime] = None) -> Optional[datetime]:
+    """Última atividade conhecida (memória deste processo ou banco)"""
+    candidates = [_as_epoch(persisted_last_seen), _last_seen.get(user_id)]
+    if user_id in _sessions:
+        candidates.append(time.time())
+    epochs = [c for c in candidates if c is not None]
+    if not epochs:
+        return None
+    return datetime.fromtimestamp(max(epochs), tz=timezone.utc)
+
+def local_online_ids() -> List[int]:
+    """Usuários online segundo este processo (ainda que não gravados no banco)"""
+    now = time.time()
+    return [user_id for user_id in set(_sessions) | set(_last_seen) if _is_locally_online(user_id, now)]
+
+async def flush_presence(conn) -> int:
+    """Grava last_seen em lote (um UPDATE ... FROM UNNEST) para quem mudou o bastante"""
+    now = time.time()
+    for user_id in _sessions:
+        _last_seen[user_id] = now
+
+    # Online: no máximo uma escrita por intervalo; ao ficar offline, a última atividade
+    dirty = {
+        user_id: seen for user_id, seen in _last_seen.items()
+        if seen - _persisted.get(user_id, 0) >= PRESENCE_PERSIST_MIN_INTERVAL_SECONDS
+        or (not _is_locally_online(user_id, now) and seen > _persisted.get(user_id, 0))
+    }
+    if not dirty:
+        return 0
+
+    user_ids = list(dirty)
+    await conn.execute("""
+        UPDATE users u
+        SET last_seen = v.seen
+        FROM UNNEST($1::int[], $2::timestamptz[]) AS v(user_id, seen)
+        WHERE u.user_id = v.user_id
+          AND (u.last_seen IS NULL OR u.last_seen < v.seen)
+    """, user_ids, [datetime.fromtimestamp(dirty[u], tz=timezone.utc) for u in user_ids])
+    _persisted.update(dirty)
+    return len(dirty)
+
+async def _expire_sessions():
+    """Emite offline para quem passou do timeout e descarta estado antigo"""
+    now = time.time()
+    expired = [user_id for user_id in _online if not _is_locally_online(user_id, now)]
+    if expired:
+        try:
+            persisted = await _fetch_last_seen(expired)
+        except Exception as e:
+            print(f"[WARN] Falha ao conferir last_seen de {len(expired)} usuários: {e}")
+        else:
+            for user_id in expired:
+                await _emit_transition(user_id, persisted)
+    for user_id, seen in list(_last_seen.items()):
+        if user_id in _sessions or user_id in _online:
+            continue
+        if seen <= _persisted.get(user_id, 0):
+            del _last_seen[user_id]
+            _persisted.pop(user_id, None)
+
+async def run_presence_flusher():
+    """Job periódico do serviço de presença"""
+    try:
+        while True:
+            await asyncio.sleep(PRESENCE_FLUSH_INTERVAL_SECONDS)
+            try:
+                async with acquire_connection() as conn:
+                    await flush_presence(conn)
+            except Exception as e:
+                print(f"[WARN] Falha ao gravar last_seen em lote: {e}")
+            await _expire_sessions()
+    finally:
+        try:
+            async with acquire_connection() as conn:
+                await flush_presence(conn)
+        except Exception as e:
+            print(f"[WARN] Falha ao gravar last_seen pendente no shutdown: {e}")
@@ -0,0 +1,251 @@
+import asyncio
+import asyncpg
+import os
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from app.db import DATABASE_URL
+from app.utils.serialization import dumps
+
+# Backplane de pub/sub dos WebSockets: "postgres" (LISTEN/NOTIFY) ou "memory" (processo único)
+REALTIME_BACKEND = os.getenv("REALTIME_BACKEND", "postgres")
+if REALTIME_BACKEND not in ("postgres", "memory"):
+    raise ValueError(f"Invalid REALTIME_BACKEND: {REALTIME_BACKEND!r} (expected 'postgres' or 'memory')")
+
+# Limite do payload do NOTIFY no Postgres é 8000 bytes
+NOTIFY_MAX_PAYLOAD_BYTES = 7900
+
+# Fila de saída dos NOTIFY (enviados em lote por uma conexão própria)
+REALTIME_PUBLISH_QUEUE_SIZE = int(os.getenv("REALTIME_PUBLISH_QUEUE_SIZE", "10000"))
+REALTIME_PUBLISH_BATCH_SIZE = int(os.getenv("REALTIME_PUBLISH_BATCH_SIZE", "500"))
+
+NOTIFY_SQL = "SELECT pg_notify(c, p) FROM UNNEST($1::text[], $2::text[]) AS t(c, p)"
+
+# Identifica este processo para ignorar as próprias notificações
+PROCESS_ID = uuid.uuid4().hex
+
+# Entrega local por tipo de canal ("chat", "user", "map"): (key, texto JSON) -> None
+Handler = Callable[[Optional[int], str], Awaitable[None]]
+_handlers: Dict[str, Handler] = {}
+
+# Referências para tarefas de entrega (evita coleta pelo GC)
+_delivery_tasks: Set[asyncio.Task] = set()
+
+def channel_name(kind: str, key: Optional[int] = None) -> str:
+    """Canal do backplane: chat_<chat_id>, user_<user_id> ou map"""
+    return kind if key is None else f"{kind}_{key}"
+
+def _parse_channel(channel: str):
+    kind, _, key = channel.partition("_")
+    return kind, (int(key) if key else None)
+
+def register_handler(kind: str, handler: Handler):
+    """Registra a função que entrega mensagens aos sockets locais de um tipo de canal"""
+    _handlers[kind] = handler
+
+async def _deliver_local(channel: str, text: str):
+    kind, key = _parse_channel(channel)
+    handler = _handlers.get(kind)
+    if handler is not None:
+        await handler(key, text)
+
+class MemoryBackend:
+    """Entrega apenas aos sockets deste processo"""
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def subscribe(self, channel: str):
+        pass
+
+    async def unsubscribe(self, channel: str):
+        pass
+
+    async def publish(self, channel: str, text: str):
+        await _deliver_local(channel, text)
+
+    async def publish_many(self, items: List[Tuple[str, str]]):
+        for channel, text in items:
+            await _deliver_local(channel, text)
+
+class PostgresBackend(MemoryBackend):
+    """Fan-out entre processos via LISTEN/NOTIFY (um canal por chat/usuário)"""
+
+    def __init__(self):
+        self._conn: Optional[asyncpg.Connection] = None
+        self._lock = asyncio.Lock()
+        # canal -> número de sockets locais interessados
+        self._channels: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+        # NOTIFY pendentes: (canal, payload)
+        self._outbox: asyncio.Queue = asyncio.Queue(maxsize=REALTIME_PUBLISH_QUEUE_SIZE)
+        self._publisher_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+        self._publisher_task = asyncio.create_task(self._run_publisher())
+
+    async def stop(self):
+        tasks = [t for t in (self._task, self._publisher_task) if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._publisher_task = None
+
+    async def _run(self):
+        """Mantém a conexão de LISTEN aberta, reconectando se ela cair"""
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(DATABASE_URL)
+                lost = asyncio.Event()
+                conn.add_termination_listener(lambda _conn: lost.set())
+                async with self._lock:
+                    for channel in self._channels:
+                        await conn.add_listener(channel, self._on_notify)
+                    self._conn = conn
+                await lost.wait()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[WARN] Conexão LISTEN do backplane falhou: {e}")
+            finally:
+                self._conn = None
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+            await asyncio.sleep(1)
+
+    async def subscribe(self, channel: str):
+        async with self._lock:
+            self._channels[channel] = self._channels.get(channel, 0) + 1
+            if self._channels[channel] == 1 and self._conn is not None:
+                try:
+                    await self._conn.add_listener(channel, self._on_notify)
+                except Exception as e:
+                    # A reconexão refaz o LISTEN de todos os canais
+                    print(f"[WARN] Falha no LISTEN do canal {channel}: {e}")
+
+    async def unsubscribe(self, channel: str):
+        async with self._lock:
+            count = self._channels.get(channel, 0) - 1
+            if count > 0:
+                self._channels[channel] = count
+                return
+            self._channels.pop(channel, None)
+            if self._conn is not None:
+                try:
+                    await self._conn.remove_listener(channel, self._on_notify)
+                except Exception as e:
+                    print(f"[WARN] Falha no UNLISTEN do canal {channel}: {e}")
+
+    def _enqueue_notify(self, channel: str, text: str):
+        # "<origem>:<json>" repassa o texto já serializado sem decodificar
+        payload = f"{PROCESS_ID}:{text}"
+        if len(payload.encode("utf-8")) > NOTIFY_MAX_PAYLOAD_BYTES:
+            print(f"[WARN] Payload grande demais para NOTIFY no canal {channel}; entregue só localmente")
+            return
+        try:
+            self._outbox.put_nowait((channel, payload))
+        except asyncio.QueueFull:
+            print(f"[WARN] Fila de NOTIFY cheia; mensagem do canal {channel} entregue só localmente")
+
+    async def publish(self, channel: str, text: str):
+        # Sockets locais recebem direto; os outros processos via NOTIFY
+        await _deliver_local(channel, text)
+        self._enqueue_notify(channel, text)
+
+    async def publish_many(self, items: List[Tuple[str, str]]):
+        for channel, text in items:
+            await _deliver_local(channel, text)
+            self._enqueue_notify(channel, text)
+
+    async def _run_publisher(self):
+        """Envia os NOTIFY em lote por uma conexão própria, fora do pool das
+        requisições (que podem estar segurando todas as conexões do pool)"""
+        batch: List[Tuple[str, str]] = []
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(DATABASE_URL)
+                while True:
+                    if not batch:
+                        batch.append(await self._outbox.get())
+                        while len(batch) < REALTIME_PUBLISH_BATCH_SIZE and not self._outbox.empty():
+                            batch.append(self._outbox.get_nowait())
+                    try:
+                        await conn.execute(NOTIFY_SQL, [c for c, _ in batch], [p for _, p in batch])
+                    except asyncpg.PostgresError as e:
+                        # Erro do servidor (não da conexão): reenviar não adianta
+                        print(f"[WARN] Falha ao publicar lote de {len(batch)} mensagens: {e}")
+                    batch = []
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # O lote pendente é reenviado após reconectar
+                print(f"[WARN] Conexão de publicação do backplane falhou: {e}")
+            finally:
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+            await asyncio.sleep(1)
+
+    def _on_notify(self, connection, pid, channel, payload):
+        origin, sep, text = payload.partition(":")
+        if not sep:
+            print(f"[WARN] Payload inválido no canal {channel}")
+            return
+        if origin == PROCESS_ID:
+            return
+        task = asyncio.create_task(_deliver_local(channel, text))
+        _delivery_tasks.add(task)
+        task.add_done_callback(_delivery_tasks.discard)
+
+# Backplane ativo (None fora do lifespan: entrega só local)
+_backend: Optional[MemoryBackend] = None
+
+async def start_realtime():
+    """Inicia o backplane configurado em REALTIME_BACKEND"""
+    global _backend
+    _backend = PostgresBackend() if REALTIME_BACKEND == "postgres" else MemoryBackend()
+    await _backend.start()
+
+async def stop_realtime():
+    global _backend
+    if _backend is not None:
+        await _backend.stop()
+        _backend = None
+
+async def subscribe(kind: str, key: Optional[int] = None):
+    """Registra interesse de um socket local no canal"""
+    if _backend is not None:
+        await _backend.subscribe(channel_name(kind, key))
+
+async def unsubscribe(kind: str, key: Optional[int] = None):
+    if _backend is not None:
+        await _backend.unsubscribe(channel_name(kind, key))
+
+async def publish(kind: str, key: Optional[int], message: dict):
+    """Publica a mensagem para todos os sockets do canal, em qualquer processo.
+
+    A mensagem é serializada uma única vez e o mesmo texto vai para o NOTIFY
+    e para todos os sockets destinatários.
+    """
+    channel = channel_name(kind, key)
+    text = dumps(message)
+    if _backend is None:
+        await _deliver_local(channel, text)
+    else:
+        await _backend.publish(channel, text)
+
+async def publish_many(messages: List[Tuple[str, Optional[int], dict]]):
+    """Publica várias mensagens (kind, key, message) de uma vez"""
+    items = [(channel_name(kind, key), dumps(message)) for kind, key, message in messages]
+    if not items:
+        return
+    if _backend is None:
+        for channel, text in items:
+            await _deliver_local(channel, text)
+    else:
+        await _backend.publish_many(items)
@@ -0,0 +1,19 @@
+import json
+
+# orjson é opcional: bem mais rápido, mas a stdlib serve de fallback
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+def dumps(obj) -> str:
+    """Serializa para texto JSON (frame de WebSocket / payload de NOTIFY)"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    return json.dumps(obj, default=str, ensure_ascii=False, separators=(",", ":"))
+
+def loads(text):
+    """Decodifica texto JSON"""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
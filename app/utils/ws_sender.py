@@ -0,0 +1,91 @@
+import asyncio
+import os
+from typing import Callable, Optional, Set
+from fastapi import WebSocket
+
+# Configuração das filas de saída dos WebSockets
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+WS_SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "10"))
+
+# Código de fechamento "Try Again Later" para clientes lentos
+CLOSE_CODE_SLOW_CONSUMER = 1013
+
+# Referências para tarefas de fechamento (evita coleta pelo GC)
+_close_tasks: Set[asyncio.Task] = set()
+
+class SocketSender:
+    """Fila de saída limitada com uma tarefa escritora por WebSocket.
+
+    Quem faz broadcast só enfileira (sem await), então um cliente lento não
+    atrasa os demais. Se a fila enche, o socket é desconectado ou, com
+    drop_oldest, perde as mensagens mais antigas (eventos substituíveis, como
+    posições no mapa). Falhas ou timeouts de envio removem o socket.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        drop_oldest: bool = False,
+        on_evict: Optional[Callable[["SocketSender"], None]] = None,
+        maxsize: int = WS_SEND_QUEUE_SIZE,
+    ):
+        self.websocket = websocket
+        self.drop_oldest = drop_oldest
+        self.on_evict = on_evict
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.closed = False
+        self.dropped = 0
+        self._task = asyncio.create_task(self._writer())
+
+    def send(self, text: str) -> bool:
+        """Enfileira uma mensagem; retorna False se o socket foi descartado"""
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(text)
+        except asyncio.QueueFull:
+            if not self.drop_oldest:
+                self._evict("fila de envio cheia")
+                return False
+            self.queue.get_nowait()
+            self.queue.put_nowait(text)
+            self.dropped += 1
+        return True
+
+    async def _writer(self):
+        try:
+            while True:
+                text = await self.queue.get()
+                await asyncio.wait_for(self.websocket.send_text(text), timeout=WS_SEND_TIMEOUT_SECONDS)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self._evict("timeout no envio")
+        except Exception as e:
+            self._evict(f"falha no envio: {e}")
+
+    def _evict(self, reason: str):
+        """Descarta o socket: para a escrita, remove dos registros e fecha a conexão"""
+        if self.closed:
+            return
+        self.closed = True
+        print(f"[WARN] WebSocket descartado ({reason})")
+        if asyncio.current_task() is not self._task:
+            self._task.cancel()
+        if self.on_evict is not None:
+            self.on_evict(self)
+        task = asyncio.create_task(self._close_socket())
+        _close_tasks.add(task)
+        task.add_done_callback(_close_tasks.discard)
+
+    async def _close_socket(self):
+        try:
+            await self.websocket.close(code=CLOSE_CODE_SLOW_CONSUMER)
+        except Exception:
+            pass
+
+    async def close(self):
+        """Encerra a tarefa escritora (chamado quando o cliente desconecta)"""
+        self.closed = True
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
@@ -621,10 +621,8 @@ export const statusService = {
 
   // Obter status de múltiplos usuários
   getMultipleUsersStatus: async (userIds) => {
-    const userIdsString = Array.isArray(userIds) ? userIds.join(',') : userIds;
-    const response = await api.get('/status/batch', {
-      params: { user_ids: userIdsString }
-    });
+    const ids = Array.isArray(userIds) ? userIds : String(userIds).split(',').map(Number);
+    const response = await api.post('/status/batch', { user_ids: ids });
     return response.data;
   },
 
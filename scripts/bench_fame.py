@@ -0,0 +1,102 @@
+import asyncio
+import asyncpg
+import os
+import sys
+import time
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+DB_URL = os.getenv("DATABASE_URL", "postgresql://postgres:postgres@db:5432/tinder_clone")
+
+# Faixa de IDs reservada para o benchmark (removida ao final)
+HOT_USER_ID = 900000
+FAN_BASE_ID = 900001
+FANS = int(os.getenv("BENCH_FANS", "2000"))
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "32"))
+
+async def setup(conn):
+    """Criar usuário "celebridade" e fãs"""
+    await cleanup(conn)
+    await conn.execute("""
+        INSERT INTO users (user_id, name, email, username, password_hash, is_verified)
+        VALUES ($1, 'Bench Hot', 'bench_hot@bench.local', 'bench_hot', 'x', TRUE)
+    """, HOT_USER_ID)
+    await conn.executemany("""
+        INSERT INTO users (user_id, name, email, username, password_hash, is_verified)
+        VALUES ($1, $2, $3, $4, 'x', TRUE)
+    """, [
+        (FAN_BASE_ID + i, f"Bench Fan {i}", f"bench_fan_{i}@bench.local", f"bench_fan_{i}")
+        for i in range(FANS)
+    ])
+
+async def cleanup(conn):
+    """Remover dados do benchmark"""
+    await conn.execute("DELETE FROM fame_dirty WHERE user_id >= $1", HOT_USER_ID)
+    await conn.execute("DELETE FROM users WHERE user_id >= $1", HOT_USER_ID)
+
+async def run_mode(mode: str):
+    """Mede swipes/s com todos os fãs dando like no mesmo usuário"""
+    pool = await asyncpg.create_pool(
+        DB_URL,
+        min_size=CONCURRENCY,
+        max_size=CONCURRENCY,
+        server_settings={"matcha.fame_mode": mode},
+    )
+    try:
+        async with pool.acquire() as conn:
+            await conn.execute("DELETE FROM swipes WHERE swiped_id = $1", HOT_USER_ID)
+            await conn.execute("DELETE FROM fame_dirty WHERE user_id >= $1", HOT_USER_ID)
+
+        fan_ids = list(range(FAN_BASE_ID, FAN_BASE_ID + FANS))
+        chunks = [fan_ids[i::CONCURRENCY] for i in range(CONCURRENCY)]
+
+        async def worker(chunk):
+            async with pool.acquire() as conn:
+                for fan_id in chunk:
+                    await conn.execute("""
+                        INSERT INTO swipes (swiper_id, swiped_id, direction)
+                        VALUES ($1, $2, 'like')
+                    """, fan_id, HOT_USER_ID)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(chunk) for chunk in chunks))
+        elapsed = time.perf_counter() - start
+
+        flush_elapsed = None
+        if mode == "deferred":
+            from app.utils.fame import flush_fame_dirty
+            flush_start = time.perf_counter()
+            async with pool.acquire() as conn:
+                while await flush_fame_dirty(conn) > 0:
+                    pass
+            flush_elapsed = time.perf_counter() - flush_start
+
+        async with pool.acquire() as conn:
+            fame = await conn.fetchval("SELECT fame_rating FROM users WHERE user_id = $1", HOT_USER_ID)
+
+        print(f"📊 Modo {mode:<8} | {FANS} swipes em {elapsed:.2f}s "
+              f"| {FANS / elapsed:,.0f} swipes/s | fame final: {fame}")
+        if flush_elapsed is not None:
+            print(f"   ⏱️  Flush da fila fame_dirty: {flush_elapsed:.2f}s")
+    finally:
+        await pool.close()
+
+async def main():
+    """Compara o throughput de swipes em um usuário popular: sync vs deferred.
+
+    Os números dependem do hardware e de max_connections; use o resultado
+    deste script (e não uma estimativa) para decidir o FAME_MODE.
+    """
+    print(f"🏁 Benchmark de fame: {FANS} fãs, concorrência {CONCURRENCY}")
+    conn = await asyncpg.connect(DB_URL)
+    try:
+        await setup(conn)
+        await run_mode("sync")
+        await run_mode("deferred")
+    finally:
+        await cleanup(conn)
+        await conn.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,133 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.db import get_connection
+from .seed import reset_and_seed
+
+client = TestClient(app)
+
+def _run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+@pytest.fixture(autouse=True)
+def reset_chats():
+    """Cada teste começa do seed (chat 1 entre os usuários 1 e 2, sem mensagens)"""
+    _run(reset_and_seed())
+
+def _send(chat_id, sender_id, content):
+    response = client.post("/messages/", json={
+        "chat_id": chat_id, "sender_id": sender_id, "content": content
+    })
+    assert response.status_code == 200
+
+def _unread(user_id):
+    response = client.get(f"/chats/{user_id}/unread-count")
+    assert response.status_code == 200
+    return response.json()["unread_count"]
+
+def _chats(user_id):
+    response = client.get(f"/chats/{user_id}/with-profiles")
+    assert response.status_code == 200
+    return response.json()
+
+async def _message_ids(chat_id):
+    async for conn in get_connection():
+        rows = await conn.fetch(
+            "SELECT message_id FROM messages WHERE chat_id = $1 ORDER BY message_id", chat_id
+        )
+        return [r["message_id"] for r in rows]
+
+def test_unread_count_after_sending_messages():
+    """Teste de contagem de não lidas após envio de mensagens"""
+    _send(1, 1, "Oi!")
+    _send(1, 1, "Tudo bem?")
+
+    assert _unread(2) == 2
+    assert _unread(1) == 0
+
+    chat = _chats(2)[0]
+    assert chat["chat_id"] == 1
+    assert chat["unread_count"] == 2
+    assert chat["last_message"] == "Tudo bem?"
+
+def test_null_is_read_counts_as_unread():
+    """Teste de que mensagens com is_read NULL contam como não lidas"""
+    async def insert():
+        async for conn in get_connection():
+            await conn.execute("""
+                INSERT INTO messages (chat_id, sender_id, content, is_read)
+                VALUES (1, 1, 'Sem estado', NULL)
+            """)
+    _run(insert())
+
+    assert _unread(2) == 1
+
+def test_mark_single_message_read():
+    """Teste de leitura de uma mensagem"""
+    _send(1, 1, "Primeira")
+    _send(1, 1, "Segunda")
+    first_id = _run(_message_ids(1))[0]
+
+    response = client.put(f"/messages/{first_id}/read")
+    assert response.status_code == 200
+    assert _unread(2) == 1
+
+    # Marcar de novo não desconta duas vezes
+    client.put(f"/messages/{first_id}/read")
+    assert _unread(2) == 1
+
+def test_mark_all_messages_read():
+    """Teste de leitura de todas as mensagens do chat"""
+    _send(1, 1, "Oi!")
+    _send(1, 1, "Tudo bem?")
+    _send(1, 2, "Tudo ótimo")
+
+    response = client.put("/messages/chat/1/read-all?user_id=2")
+    assert response.status_code == 200
+
+    assert _unread(2) == 0
+    # As mensagens do próprio usuário 2 continuam não lidas para o usuário 1
+    assert _unread(1) == 1
+
+def test_delete_message_updates_counters():
+    """Teste de que apagar mensagem atualiza não lidas e última mensagem"""
+    _send(1, 1, "Primeira")
+    _send(1, 1, "Segunda")
+    last_id = _run(_message_ids(1))[-1]
+
+    response = client.delete(f"/messages/{last_id}")
+    assert response.status_code == 200
+
+    assert _unread(2) == 1
+    chat = _chats(2)[0]
+    assert chat["unread_count"] == 1
+    assert chat["last_message"] == "Primeira"
+
+def test_chats_with_profiles_ordered_by_last_message():
+    """Teste de ordenação dos chats pela mensagem mais recente"""
+    async def add_second_chat():
+        async for conn in get_connection():
+            await conn.execute("""
+                INSERT INTO profiles (user_id, age, gender, sexual_pref, latitude, longitude, avatar_url)
+                VALUES (99, 30, 'male', 'female', -23.58, -46.64, 'avatar99.jpg')
+            """)
+            match_id = await conn.fetchval("""
+                INSERT INTO matches (user1_id, user2_id) VALUES (1, 99) RETURNING match_id
+            """)
+            # chat_id explícito: o seed grava o chat 1 sem avançar a sequência
+            return await conn.fetchval("""
+                INSERT INTO chats (chat_id, match_id) VALUES (2, $1) RETURNING chat_id
+            """, match_id)
+    second_chat_id = _run(add_second_chat())
+
+    _send(second_chat_id, 99, "Olá do chat novo")
+    _send(1, 2, "Olá do chat antigo")
+    assert [c["chat_id"] for c in _chats(1)] == [1, second_chat_id]
+
+    _send(second_chat_id, 99, "De novo")
+    chats = _chats(1)
+    assert [c["chat_id"] for c in chats] == [second_chat_id, 1]
+    assert chats[0]["user_id"] == 99
+    assert chats[0]["last_message"] == "De novo"
+    assert _unread(1) == 3
@@ -0,0 +1,29 @@
+import asyncio
+from app.db import get_connection
+from app.utils import discover_feed
+
+def _run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+def test_read_feed_skips_candidates_swiped_after_refill():
+    """Teste de que um candidato reinserido por um refill concorrente não volta ao discover"""
+    async def run():
+        async for conn in get_connection():
+            await conn.execute("DELETE FROM discover_feed WHERE user_id = 1")
+            await conn.execute("DELETE FROM swipes WHERE swiper_id = 1")
+            await conn.execute(
+                "INSERT INTO swipes (swiper_id, swiped_id, direction) VALUES (1, 2, 'pass')"
+            )
+            # Linha gravada por um refill que calculou a fila antes do swipe
+            await conn.execute("""
+                INSERT INTO discover_feed (user_id, candidate_id, fame_rating, distance)
+                VALUES (1, 2, 0, 0)
+            """)
+            rows = await discover_feed.read_feed(conn, 1, 10)
+            await conn.execute("DELETE FROM discover_feed WHERE user_id = 1")
+            await conn.execute("DELETE FROM swipes WHERE swiper_id = 1")
+            return rows
+
+    rows = _run(run())
+
+    assert all(row["user_id"] != 2 for row in rows)
@@ -0,0 +1,45 @@
+import asyncio
+from app.db import get_connection
+from app.utils import location_updates
+
+def _run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+async def _fetch_position(conn, user_id):
+    return await conn.fetchrow(
+        "SELECT latitude, longitude FROM profiles WHERE user_id = $1", user_id
+    )
+
+def test_flush_locations_updates_profiles():
+    """Teste de gravação em lote das posições do mapa"""
+    async def run():
+        async for conn in get_connection():
+            location_updates._pending_writes[1] = (-22.90, -43.20)
+            location_updates._pending_writes[2] = (-22.95, -43.25)
+            saved = await location_updates.flush_locations(conn)
+            return saved, await _fetch_position(conn, 1), await _fetch_position(conn, 2)
+
+    saved, user1, user2 = _run(run())
+
+    assert saved == 2
+    assert not location_updates._pending_writes
+    assert (user1["latitude"], user1["longitude"]) == (-22.90, -43.20)
+    assert (user2["latitude"], user2["longitude"]) == (-22.95, -43.25)
+
+def test_flush_locations_skips_unchanged_position():
+    """Teste de que posição repetida não reescreve o perfil"""
+    async def run():
+        async for conn in get_connection():
+            location_updates._pending_writes[1] = (-21.00, -44.00)
+            await location_updates.flush_locations(conn)
+            xmin_before = await conn.fetchval("SELECT xmin::text FROM profiles WHERE user_id = 1")
+
+            location_updates._pending_writes[1] = (-21.00, -44.00)
+            await location_updates.flush_locations(conn)
+            xmin_after = await conn.fetchval("SELECT xmin::text FROM profiles WHERE user_id = 1")
+            return xmin_before, xmin_after, await _fetch_position(conn, 1)
+
+    xmin_before, xmin_after, user1 = _run(run())
+
+    assert xmin_before == xmin_after
+    assert (user1["latitude"], user1["longitude"]) == (-21.00, -44.00)
@@ -0,0 +1,142 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+
+import asyncpg
+import pytest
+
+from app.utils import notification_buffer
+
+@pytest.fixture(scope="module", autouse=True)
+def setup_test_data():
+    """Testes do buffer não usam o banco"""
+
+@pytest.fixture(autouse=True)
+def clean_buffer():
+    notification_buffer._pending.clear()
+    notification_buffer._recent.clear()
+    yield
+    notification_buffer._pending.clear()
+    notification_buffer._recent.clear()
+
+def _run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+def _record(user_id, notif_type, related_user_id, content="x"):
+    return (user_id, notif_type, content, related_user_id, datetime.now(timezone.utc))
+
+class FakeConnection:
+    """Conexão falsa: falha nos INSERTs indicados por `failures` (índice da chamada -> exceção)"""
+
+    def __init__(self, failures=None):
+        self.failures = failures or {}
+        self.calls = []
+        self.on_execute = None
+
+    async def execute(self, query, *args):
+        call = len(self.calls)
+        self.calls.append(args)
+        if self.on_execute:
+            self.on_execute(call)
+        if call in self.failures:
+            raise self.failures[call]
+
+def test_is_duplicate_within_window():
+    """Teste de coalescência do mesmo evento dentro da janela"""
+    now = time.time()
+
+    assert not notification_buffer._is_duplicate(1, "view", 2, now)
+    assert notification_buffer._is_duplicate(1, "view", 2, now + 1)
+    # Outro usuário relacionado ou outro tipo não coalesce
+    assert not notification_buffer._is_duplicate(1, "view", 3, now + 1)
+    assert not notification_buffer._is_duplicate(1, "like", 2, now + 1)
+
+def test_is_duplicate_after_window():
+    """Teste de que o evento volta a ser gravado depois da janela"""
+    now = time.time()
+    window = notification_buffer.COALESCE_WINDOWS["message"]
+
+    assert not notification_buffer._is_duplicate(1, "message", 2, now)
+    assert not notification_buffer._is_duplicate(1, "message", 2, now + window + 1)
+
+def test_is_duplicate_ignores_untracked_events():
+    """Teste de que eventos sem usuário relacionado ou fora das janelas nunca coalescem"""
+    now = time.time()
+
+    assert not notification_buffer._is_duplicate(1, "view", None, now)
+    assert not notification_buffer._is_duplicate(1, "view", None, now)
+    assert not notification_buffer._is_duplicate(1, "match", 2, now)
+    assert not notification_buffer._is_duplicate(1, "match", 2, now)
+
+def test_apply_digests_replaces_bursts():
+    """Teste de troca de rajada por notificação de resumo"""
+    burst = [_record(1, "like", related) for related in (2, 3, 4)]
+    other = _record(2, "like", 1)
+    batch = notification_buffer._apply_digests(burst + [other])
+
+    assert len(batch) == 2
+    digest = batch[0]
+    assert digest[0] == 1
+    assert digest[1] == "like"
+    assert digest[2] == notification_buffer.DIGEST_TEMPLATES["like"].format(count=3)
+    assert digest[3] is None
+    assert digest[4] == burst[-1][4]
+    assert batch[1] == other
+
+def test_apply_digests_keeps_small_groups_and_other_types():
+    """Teste de que grupos pequenos e tipos sem resumo passam intactos"""
+    batch = [
+        _record(1, "view", 2),
+        _record(1, "view", 3),
+        _record(1, "message", 2),
+        _record(1, "message", 3),
+        _record(1, "message", 4),
+    ]
+
+    assert notification_buffer._apply_digests(batch) == batch
+
+def test_flush_requeues_batch_on_connection_failure():
+    """Teste de que o lote volta para o buffer quando a conexão falha"""
+    records = [_record(1, "view", 2), _record(2, "view", 1)]
+    notification_buffer._pending.extend(records)
+    conn = FakeConnection({0: ConnectionResetError("conexão perdida")})
+
+    with pytest.raises(ConnectionResetError):
+        _run(notification_buffer.flush_notifications(conn))
+
+    assert notification_buffer._pending == records
+
+def test_flush_requeues_unwritten_rows_when_fallback_fails():
+    """Teste de que a queda da conexão na gravação uma a uma devolve só o que faltou gravar"""
+    records = [_record(1, "view", 2), _record(2, "view", 1), _record(1, "like", 3)]
+    later = _record(3, "view", 1)
+    notification_buffer._pending.extend(records)
+    conn = FakeConnection({
+        0: asyncpg.exceptions.DataError("lote inválido"),
+        # Evento que chega enquanto o lote está sendo gravado, depois a queda
+        2: ConnectionResetError("conexão perdida"),
+    })
+    conn.on_execute = lambda call: call == 1 and notification_buffer._pending.append(later)
+
+    with pytest.raises(ConnectionResetError):
+        _run(notification_buffer.flush_notifications(conn))
+
+    # Primeira linha gravada; a que falhou e as seguintes voltam antes das novas
+    assert notification_buffer._pending == records[1:] + [later]
+
+def test_flush_fallback_drops_only_invalid_rows():
+    """Teste de que erro do banco numa linha descarta só ela"""
+    records = [_record(1, "view", 2), _record(2, "view", 1)]
+    notification_buffer._pending.extend(records)
+    notification_buffer._recent[(2, "view", 1)] = records[1][4].timestamp()
+    conn = FakeConnection({
+        0: asyncpg.exceptions.DataError("lote inválido"),
+        2: asyncpg.exceptions.DataError("linha inválida"),
+    })
+
+    saved = _run(notification_buffer.flush_notifications(conn))
+
+    assert saved == 1
+    assert not notification_buffer._pending
+    # A chave da linha descartada é liberada para o próximo evento
+    assert (2, "view", 1) not in notification_buffer._recent
@@ -0,0 +1,56 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from app.utils import presence
+
+@pytest.fixture(scope="module", autouse=True)
+def setup_test_data():
+    """Testes de transição não usam o banco"""
+
+@pytest.fixture(autouse=True)
+def clean_presence():
+    yield
+    for state in (presence._sessions, presence._last_seen, presence._persisted, presence._online):
+        state.clear()
+    presence.set_transition_listener(None)
+
+def _run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+def _expired_user(user_id, monkeypatch, persisted_last_seen):
+    """Usuário anunciado online por este processo, já fora da janela local"""
+    presence._online.add(user_id)
+    presence._last_seen[user_id] = time.time() - presence.PRESENCE_TIMEOUT_SECONDS - 5
+
+    async def fake_fetch(user_ids):
+        return {u: persisted_last_seen for u in user_ids}
+
+    monkeypatch.setattr(presence, "_fetch_last_seen", fake_fetch)
+    events = []
+
+    async def listener(user_id, is_online):
+        events.append((user_id, is_online))
+
+    presence.set_transition_listener(listener)
+    return events
+
+def test_offline_suppressed_while_another_worker_sees_user(monkeypatch):
+    """Teste de que o offline não é anunciado se o last_seen gravado ainda está na janela"""
+    events = _expired_user(1, monkeypatch, datetime.now(timezone.utc))
+
+    _run(presence._expire_sessions())
+
+    assert events == []
+    assert 1 in presence._online
+
+def test_offline_emitted_when_persisted_last_seen_expired(monkeypatch):
+    """Teste de que o offline é anunciado quando nenhum processo vê o usuário"""
+    events = _expired_user(1, monkeypatch, None)
+
+    _run(presence._expire_sessions())
+
+    assert events == [(1, False)]
+    assert 1 not in presence._online
@@ -94,6 +94,20 @@ def test_update_profile_no_fields():
     assert response.status_code == 400
     assert "No fields to update" in response.json()["detail"]
 
+def test_discover_profiles_success():
+    """Teste de descobrir perfis a partir da fila de candidatos"""
+    response = client.get("/profiles/discover/1?limit=5")
+    assert response.status_code == 200
+    data = response.json()
+    assert isinstance(data, list)
+    assert all(profile["user_id"] != 1 for profile in data)
+
+def test_discover_profiles_without_profile():
+    """Teste de descobrir perfis sem perfil criado"""
+    response = client.get("/profiles/discover/99999")
+    assert response.status_code == 400
+    assert "Profile not found" in response.json()["detail"]
+
 def test_delete_profile_success():
     """Teste de deleção de perfil"""
     response = client.delete("/profiles/1")
@@ -30,6 +30,11 @@ def setup_test_data():
                 INSERT INTO users (user_id, name, email, password_hash, is_verified)
                 VALUES (102, 'User 2', 'user2@test.com', $1, TRUE)
             """, password_hash)
+            
+            await conn.execute("""
+                INSERT INTO users (user_id, name, email, password_hash, is_verified)
+                VALUES (103, 'User 3', 'user3@test.com', $1, TRUE)
+            """, password_hash)
     
     asyncio.get_event_loop().run_until_complete(seed())
 
@@ -102,3 +107,27 @@ def test_swipe_creates_match():
     assert response.status_code == 200
     assert "Match created!" in response.json()["message"]
     assert "match_id" in response.json()
+
+def test_swipe_batch_creates_match():
+    """Teste de swipes em lote com like mútuo no mesmo lote"""
+    response = client.post("/swipes/batch", json={
+        "swipes": [
+            {"swiper_id": 103, "swiped_id": 101, "direction": "dislike"},
+            {"swiper_id": 103, "swiped_id": 101, "direction": "like"},
+            {"swiper_id": 101, "swiped_id": 103, "direction": "like"}
+        ]
+    })
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert data["processed"] == 2
+    assert len(data["matches"]) == 1
+    assert data["matches"][0]["user1_id"] == 101
+    assert data["matches"][0]["user2_id"] == 103
+
+def test_swipe_batch_invalid_direction():
+    """Teste de swipes em lote com direção inválida"""
+    response = client.post("/swipes/batch", json={
+        "swipes": [{"swiper_id": 101, "swiped_id": 102, "direction": "superlike"}]
+    })
+    assert response.status_code == 422